@@ -0,0 +1,689 @@
+#!/usr/bin/env python3
+"""
+BookEditor - CLI unificada
+Un único punto de entrada con subcomandos (digital, detect, batch...)
+
+Las dependencias pesadas (cv2, numpy) solo se importan dentro del subcomando
+que las necesita: `--help` y el modo digital arrancan sin cargar OpenCV.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+from pathlib import Path
+
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp'}
+
+
+def add_canvas_arguments(parser):
+    """Opciones de lienzo comunes a todos los subcomandos que generan imágenes"""
+    parser.add_argument('--color', '-c', default='#FFFFFF',
+                        help='Color de fondo (nombre o hex). Default: white')
+    parser.add_argument('--size', '-s', nargs=2, type=int, metavar=('WIDTH', 'HEIGHT'),
+                        default=[1920, 1080], help='Tamaño del lienzo. Default: 1920 1080')
+
+
+def add_output_arguments(parser):
+    parser.add_argument('--renditions', type=parse_renditions, metavar='LISTA',
+                        help='Varias salidas con una sola detección: slide,square,thumb,cutout. '
+                             'Se guardan como <salida>_<rendition>.<ext>')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='No usar la caché de resultados en disco')
+
+
+def add_detection_arguments(parser):
+    """Opciones de detección de portadas físicas"""
+    parser.add_argument('--min-area', type=float, default=0.1,
+                        help='Área mínima (0.1 = 10%%). Default: 0.1')
+    parser.add_argument('--debug', action='store_true',
+                        help='Modo debug: muestra todos los candidatos y scores')
+    parser.add_argument('--debug-path', metavar='RUTA',
+                        help='Overlay de candidatos (reducido) e informe JSON en RUTA y RUTA.json; '
+                             'implica --debug. Default: <salida>_debug.jpg')
+    parser.add_argument('--strategies', type=parse_strategies, metavar='LISTA',
+                        help='Estrategias separadas por comas, p. ej. '
+                             'Canny_standard,Canny_sensitive,Lines. Default: las 4 clásicas')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='Ordenar y omitir estrategias según su historial de victorias '
+                             '(ver el comando strategies); un 10%% de las imágenes las ejecuta todas')
+    parser.add_argument('--dedupe', nargs='?', const='', metavar='INDICE',
+                        help='Índice de hashes perceptuales: las fotos casi idénticas a otra ya procesada '
+                             '(ráfagas, repeticiones) reutilizan su cuadrilátero verificado. '
+                             'Default: $BOOKEDITOR_PHASH_INDEX o <caché>/phash.sqlite')
+
+
+def add_rig_argument(parser):
+    parser.add_argument('--rig', metavar='RUTA',
+                        help='Calibración de banco fijo (book_cover.py calibrate): verifica sobre una '
+                             'miniatura y endereza sin detección; solo re-detecta si la verificación falla')
+
+
+def parse_renditions(value):
+    from book_cover_render import parse_renditions as parse
+
+    try:
+        return parse(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_strategies(value):
+    # Sin importar cv2 aquí: los nombres se validan en check_strategies()
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def check_strategies(strategies):
+    """True si todas las estrategias existen (requiere el núcleo de detección)"""
+    if not strategies:
+        return True
+    from book_cover_detect import ALL_STRATEGIES
+
+    unknown = [name for name in strategies or [] if name not in ALL_STRATEGIES]
+    if unknown:
+        print(f"❌ Estrategia desconocida: {', '.join(unknown)}")
+        print(f"   Disponibles: {', '.join(ALL_STRATEGIES)}")
+        return False
+    return True
+
+
+def iter_images(paths):
+    """Expande archivos y carpetas en la lista de imágenes a procesar"""
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            for child in sorted(path.iterdir()):
+                if child.is_file() and child.suffix.lower() in IMAGE_EXTENSIONS:
+                    yield child
+        else:
+            yield path
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        from book_cover_cache import default_cache
+
+        _cache = default_cache() or False
+    return _cache or None
+
+
+_dedupe = None
+
+
+def get_dedupe(args):
+    """PHashIndex de --dedupe (uno por proceso), o None sin la opción"""
+    global _dedupe
+    if getattr(args, 'dedupe', None) is None:
+        return None
+    if _dedupe is None:
+        from book_cover_phash import PHashIndex
+
+        _dedupe = PHashIndex(args.dedupe or None)
+    return _dedupe
+
+
+def output_paths(output_path, renditions):
+    """Archivos que genera un comando: la salida, o una por rendition"""
+    if not renditions:
+        return {'output': Path(output_path)}
+    from book_cover_render import FORMAT_INFO, RENDITIONS, rendition_path
+
+    return {name: rendition_path(output_path, name, FORMAT_INFO[RENDITIONS[name]['format']][0])
+            for name in renditions}
+
+
+def run_cached(mode, input_path, output_path, args, run):
+    """
+    Ejecuta run() salvo que la caché en disco ya tenga sus salidas
+
+    La clave es el contenido de la entrada + modo + todos los parámetros que
+    afectan a la salida (incluida la extensión). --debug y --no-cache la
+    saltan.
+    """
+    cache = None if (getattr(args, 'no_cache', False) or getattr(args, 'debug', False)
+                     or getattr(args, 'debug_path', None)) else get_cache()
+    if cache is None or not Path(input_path).is_file():
+        return run()
+
+    from book_cover_decode import MAX_MEGAPIXELS
+    from book_cover_singleflight import request_key
+
+    outputs = output_paths(output_path, args.renditions)
+    rig = getattr(args, 'rig', None)
+    key = request_key(Path(input_path).read_bytes(), mode, args.color.upper(), tuple(args.size),
+                      getattr(args, 'min_area', None), getattr(args, 'strategies', None),
+                      args.renditions, Path(output_path).suffix.lower(),
+                      Path(rig).read_text() if rig else None, getattr(args, 'adaptive', False),
+                      getattr(args, 'dedupe', None) is not None, MAX_MEGAPIXELS)
+
+    cached = cache.get(key)
+    if cached is not None:
+        blobs, _ = cached
+        for name, path in outputs.items():
+            tmp_path = path.with_name(f".{path.name}.tmp")
+            tmp_path.write_bytes(blobs[name])
+            os.replace(tmp_path, path)
+        print(f"♻️  {Path(input_path).name}: resultado en caché → {', '.join(str(p) for p in outputs.values())}")
+        return None
+
+    result = run()
+    if all(path.is_file() for path in outputs.values()):
+        cache.put(key, {name: path.read_bytes() for name, path in outputs.items()})
+    return result
+
+
+def cmd_digital(args):
+    def run():
+        from book_cover_simple import process_digital_cover
+
+        process_digital_cover(args.input, args.output, args.color, tuple(args.size), renditions=args.renditions)
+
+    run_cached('digital', args.input, args.output, args, run)
+    return 0
+
+
+def load_rig(path):
+    """Calibración del banco fijo, o None si no se pudo leer (ya avisado)"""
+    from book_cover_rig import RigCalibration
+
+    try:
+        return RigCalibration.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ No se pudo leer la calibración '{path}': {e}")
+        return None
+
+
+def cmd_calibrate(args):
+    if not check_strategies(args.strategies):
+        return 2
+    from book_cover_rig import calibrate, parse_quad
+
+    try:
+        quad = parse_quad(args.quad) if args.quad else None
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+    rig = calibrate(args.input, args.rig, quad, args.min_area, args.strategies)
+    return 0 if rig else 1
+
+
+def cmd_detect(args):
+    if not check_strategies(args.strategies):
+        return 2
+
+    if args.rig:
+        rig = load_rig(args.rig)
+        if rig is None:
+            return 2
+        from book_cover_rig import process_rig_cover
+
+        run_cached('detect', args.input, args.output, args,
+                   lambda: process_rig_cover(args.input, args.output, rig, args.color, tuple(args.size),
+                                             args.min_area, args.strategies, args.renditions))
+        return 0
+
+    # Con un acierto de caché no se llega a importar OpenCV
+    def run():
+        from book_cover_cli_v2 import process_cover
+
+        process_cover(args.input, args.output, args.color, tuple(args.size), args.min_area, args.debug,
+                      strategies=args.strategies, renditions=args.renditions, debug_path=args.debug_path,
+                      adaptive=args.adaptive, dedupe=get_dedupe(args))
+
+    run_cached('detect', args.input, args.output, args, run)
+    return 0
+
+
+def batch_debug_path(args, output_path):
+    """En lote, --debug-path es un directorio: un overlay por imagen"""
+    if not args.debug_path:
+        return None
+    directory = Path(args.debug_path)
+    directory.mkdir(parents=True, exist_ok=True)
+    return str(directory / f"{Path(output_path).stem}_debug.jpg")
+
+
+def classify_and_run(input_path, output_path, args, debug_path=None):
+    """Modo auto: clasifica la imagen y elige la ruta digital o la de detección"""
+    from book_cover_classify import classify_file
+
+    result = classify_file(str(input_path))
+    kind = result['kind'] if result else 'unknown'
+    signals = ', '.join(result['signals']) if result else 'no se pudo leer la cabecera'
+    print(f"🧭 Clasificación: {kind} (score {result['score'] if result else 0:+.1f}; {signals})")
+
+    if kind == 'digital':
+        from book_cover_simple import process_digital_cover
+
+        process_digital_cover(str(input_path), str(output_path), args.color, tuple(args.size),
+                              renditions=args.renditions)
+    else:
+        from book_cover_cli_v2 import process_cover
+
+        process_cover(str(input_path), str(output_path), args.color, tuple(args.size),
+                      args.min_area, args.debug, strategies=args.strategies, renditions=args.renditions,
+                      debug_path=debug_path, adaptive=args.adaptive, dedupe=get_dedupe(args))
+
+
+def cmd_auto(args):
+    if not check_strategies(args.strategies):
+        return 2
+    run_cached('auto', args.input, args.output, args,
+               lambda: classify_and_run(args.input, args.output, args, args.debug_path))
+    return 0
+
+
+def cmd_batch(args):
+    from book_cover_threads import configure
+
+    configure(1, 'batch')
+    if args.rig:
+        if args.mode != 'detect':
+            print("❌ --rig solo se puede usar con --mode detect")
+            return 2
+        if not check_strategies(args.strategies):
+            return 2
+        rig = load_rig(args.rig)
+        if rig is None:
+            return 2
+        from book_cover_rig import process_rig_cover
+
+        def run(input_path, output_path):
+            process_rig_cover(input_path, output_path, rig, args.color, tuple(args.size),
+                              args.min_area, args.strategies, args.renditions)
+    elif args.mode == 'auto':
+        if not check_strategies(args.strategies):
+            return 2
+
+        def run(input_path, output_path):
+            classify_and_run(input_path, output_path, args, batch_debug_path(args, output_path))
+    elif args.mode == 'digital':
+        from book_cover_simple import process_digital_cover
+
+        def run(input_path, output_path):
+            process_digital_cover(str(input_path), str(output_path), args.color, tuple(args.size),
+                                  renditions=args.renditions)
+    else:
+        from book_cover_cli_v2 import process_cover
+
+        if not check_strategies(args.strategies):
+            return 2
+
+        def run(input_path, output_path):
+            process_cover(str(input_path), str(output_path), args.color, tuple(args.size),
+                          args.min_area, args.debug, strategies=args.strategies,
+                          renditions=args.renditions, debug_path=batch_debug_path(args, output_path),
+                          adaptive=args.adaptive, dedupe=get_dedupe(args))
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    images = list(iter_images(args.inputs))
+    if not images:
+        print("❌ No se encontraron imágenes para procesar")
+        return 1
+
+    failed = []
+    for i, input_path in enumerate(images, 1):
+        output_path = output_dir / f"{args.prefix}{input_path.stem}.{args.format}"
+        print(f"\n[{i}/{len(images)}] {input_path}")
+        # Las funciones de procesamiento terminan con sys.exit(1) al fallar;
+        # en lote se registra el fallo y se continúa con la siguiente imagen
+        try:
+            run_cached(args.mode, input_path, output_path, args, lambda: run(input_path, output_path))
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                failed.append(input_path)
+
+    print(f"\n📊 Procesadas: {len(images) - len(failed)}/{len(images)}")
+    if args.rig:
+        stats = rig.stats()
+        print(f"🎯 Banco: {stats['verified']} con la homografía guardada, "
+              f"{stats['redetected']} re-detectadas, {stats['failed']} sin portada")
+    if _dedupe is not None:
+        stats = _dedupe.stats()
+        print(f"♻️  Duplicados: {stats['reused']} con el cuadrilátero de una foto casi idéntica, "
+              f"{stats['detected']} detectadas ({stats['images']} fotos en {stats['path']})")
+    if failed:
+        print("❌ Fallaron:")
+        for path in failed:
+            print(f"   • {path}")
+        return 1
+    return 0
+
+
+def cmd_watch(args):
+    from book_cover_watch import FolderWatcher
+
+    watcher = FolderWatcher(args.input_dir, args.output_dir, workers=args.workers,
+                            color=args.color, canvas_size=args.size, min_area=args.min_area,
+                            settle=args.settle, poll_interval=args.poll_interval,
+                            output_format=args.format, use_inotify=not args.poll)
+    return watcher.run()
+
+
+def cmd_manifest(args):
+    from book_cover_manifest import ManifestRunner
+
+    runner = ManifestRunner(args.manifest, checkpoint=args.checkpoint, workers=args.workers,
+                            retries=args.retries, mode=args.mode, color=args.color,
+                            canvas_size=args.size, min_area=args.min_area, use_cache=not args.no_cache)
+    return runner.run()
+
+
+def cmd_strategies(args):
+    from book_cover_telemetry import CLOSE_MARGIN, STRATEGY_STATS
+
+    if args.reset:
+        STRATEGY_STATS.reset()
+        print(f"🗑️  Estadísticas borradas: {STRATEGY_STATS.path}")
+        return 0
+
+    summary = STRATEGY_STATS.summary()
+    print(f"📊 Estrategias: {summary['images']} detecciones ({summary['path']})")
+    if not summary['strategies']:
+        print("   Sin datos todavía: se registran en cada detección")
+        return 0
+
+    def percent(value):
+        return '-' if value is None else f"{value:.1%}"
+
+    print(f"\n{'Estrategia':<18}{'Ejecuciones':>12}{'Victorias':>11}{'Bastaría':>10}{'Decisivas':>11}"
+          f"{'Distancia':>11}  Adaptativo")
+    for name, row in sorted(summary['strategies'].items(), key=lambda item: -(item[1]['win_rate'] or 0)):
+        gap = '-' if row['avg_gap'] is None else f"{row['avg_gap']:.3f}"
+        print(f"{name:<18}{row['runs']:>12}{percent(row['win_rate']):>11}{percent(row['near_win_rate']):>10}"
+              f"{percent(row['decisive_rate']):>11}"
+              f"{gap:>11}  {'se omite' if row['prunable'] else 'se ejecuta'}")
+    print(f"\nBastaría: su mejor candidato quedó a menos de {CLOSE_MARGIN} de score del ganador. "
+          f"Decisivas: ganó sin otra estrategia tan cerca. Distancia: score medio por debajo del ganador.")
+    return 0
+
+
+def cmd_duplicates(args):
+    import json
+
+    from book_cover_phash import PHashIndex, find_duplicates
+
+    paths = list(iter_images(args.inputs))
+    if not paths:
+        print("❌ No se encontraron imágenes")
+        return 1
+
+    index = None if args.no_index else PHashIndex(args.index)
+    try:
+        report = find_duplicates(paths, args.threshold, index, args.workers)
+    finally:
+        if index is not None:
+            index.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return 0
+
+    for i, group in enumerate(report['groups'], 1):
+        print(f"\n🗂️  Grupo {i} ({len(group)} fotos)")
+        for member in group:
+            print(f"   • {member['path']}" + (f"  (distancia {member['distance']})" if member['distance'] else ''))
+    for path in report['unreadable']:
+        print(f"⚠️  No se pudo leer: {path}")
+    print(f"\n📊 {report['images']} imágenes ({report['hashed']} hasheadas, {report['from_index']} del índice) "
+          f"en {report['hash_seconds']:.2f} s; agrupadas en {report['group_seconds']:.2f} s")
+    print(f"   {len(report['groups'])} grupos de duplicados (distancia <= {report['threshold']}), "
+          f"{report['redundant']} fotos redundantes")
+    return 0
+
+
+def cmd_daemon(args):
+    from book_cover_daemon import serve
+
+    return serve(args.socket, args.workers)
+
+
+def cmd_client(args):
+    from book_cover_daemon import DAEMON_COMMANDS, run_client
+
+    if not args.argv or args.argv[0] not in DAEMON_COMMANDS:
+        print(f"❌ El cliente acepta: {', '.join(DAEMON_COMMANDS)}")
+        return 2
+    # Validar localmente para que los errores de uso no viajen al daemon
+    build_parser().parse_args(args.argv)
+    return run_client(args.argv, args.socket)
+
+
+def cmd_bench(args):
+    if args.benchmark == 'render':
+        from book_cover_bench import bench_render
+
+        if not args.dataset:
+            print("❌ bench render necesita --dataset (imágenes o carpeta de fotos)")
+            return 2
+        return bench_render([args.dataset], runs=args.runs, canvas_size=tuple(args.size))
+
+    if args.benchmark == 'crop':
+        from book_cover_bench import bench_crop
+
+        return bench_crop()
+
+    if args.benchmark == 'classify':
+        from book_cover_bench import bench_classify
+
+        if not args.dataset:
+            print("❌ bench classify necesita --dataset (carpeta con digital/ y photo/)")
+            return 2
+        return bench_classify(args.dataset)
+
+    from book_cover_bench import bench_startup
+
+    return bench_startup(runs=args.runs, limit_ms=args.limit_ms)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='book_cover.py',
+        description='📚 BookEditor - Procesador de portadas de libros',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Ejemplos:
+  # Portada digital (sin detección, no carga OpenCV)
+  python3 book_cover.py digital portada.jpg resultado.png --color blue
+
+  # Foto de portada física (detección multi-estrategia)
+  python3 book_cover.py detect foto.jpg resultado.png --min-area 0.05
+
+  # No sé si es digital o foto: clasificar y elegir la ruta automáticamente
+  python3 book_cover.py auto imagen.jpg resultado.png
+
+  # Procesar una carpeta completa en un solo proceso
+  python3 book_cover.py batch fotos/ --output-dir procesadas/ --color blue
+
+  # Banco de escaneo fijo: calibrar una vez y reutilizar el cuadrilátero
+  python3 book_cover.py calibrate referencia.jpg --rig banco.json
+  python3 book_cover.py batch fotos/ --output-dir procesadas/ --rig banco.json
+
+  # Sesión con ráfagas: reutilizar el cuadrilátero de las fotos casi idénticas
+  python3 book_cover.py batch fotos/ --output-dir procesadas/ --dedupe
+  python3 book_cover.py duplicates fotos/
+
+  # Migración masiva desde un CSV/JSONL: reanudable (checkpoint SQLite)
+  python3 book_cover.py manifest catalogo.csv --workers 8
+
+  # Vigilar una carpeta compartida y procesar lo que vaya llegando
+  python3 book_cover.py watch entrada/ salida/ --workers 4
+
+  # Daemon con workers precargados + cliente ligero para scripts
+  python3 book_cover.py daemon &
+  python3 book_cover.py client detect foto.jpg resultado.png
+
+  # Medir el arranque / la precisión del clasificador / la composición
+  python3 book_cover.py bench
+  python3 book_cover.py bench classify --dataset etiquetadas/
+  python3 book_cover.py bench render --dataset fotos/
+  python3 book_cover.py bench crop
+        """
+    )
+    subparsers = parser.add_subparsers(dest='command', metavar='COMANDO')
+    subparsers.required = True
+
+    digital = subparsers.add_parser('digital', help='Portada digital: escala y centra sin detección')
+    digital.add_argument('input', help='Imagen de portada digital')
+    digital.add_argument('output', help='Archivo de salida')
+    add_canvas_arguments(digital)
+    add_output_arguments(digital)
+    digital.set_defaults(func=cmd_digital)
+
+    detect = subparsers.add_parser('detect', help='Foto de portada física: detecta, recorta y centra')
+    detect.add_argument('input', help='Foto de la portada')
+    detect.add_argument('output', help='Archivo de salida')
+    add_canvas_arguments(detect)
+    add_output_arguments(detect)
+    add_detection_arguments(detect)
+    add_rig_argument(detect)
+    detect.set_defaults(func=cmd_detect)
+
+    auto = subparsers.add_parser('auto', help='Clasifica la imagen (digital o foto) y la procesa')
+    auto.add_argument('input', help='Imagen de entrada')
+    auto.add_argument('output', help='Archivo de salida')
+    add_canvas_arguments(auto)
+    add_output_arguments(auto)
+    add_detection_arguments(auto)
+    auto.set_defaults(func=cmd_auto)
+
+    batch = subparsers.add_parser('batch', help='Procesa varias imágenes o carpetas en un solo proceso')
+    batch.add_argument('inputs', nargs='+', help='Imágenes o carpetas de entrada')
+    batch.add_argument('--output-dir', '-o', required=True, help='Carpeta de salida')
+    batch.add_argument('--mode', choices=['detect', 'digital', 'auto'], default='detect',
+                       help='Tipo de portada (auto = clasificar cada imagen). Default: detect')
+    batch.add_argument('--prefix', default='procesado_',
+                       help='Prefijo de los archivos de salida. Default: procesado_')
+    batch.add_argument('--format', default='png', help='Extensión de salida. Default: png')
+    add_canvas_arguments(batch)
+    add_output_arguments(batch)
+    add_detection_arguments(batch)
+    add_rig_argument(batch)
+    batch.set_defaults(func=cmd_batch)
+
+    calibrate = subparsers.add_parser('calibrate',
+                                      help='Banco fijo: guarda el cuadrilátero de la portada para reutilizarlo')
+    calibrate.add_argument('input', help='Foto de referencia tomada en el banco')
+    calibrate.add_argument('--rig', required=True, metavar='RUTA', help='Archivo de calibración (JSON)')
+    calibrate.add_argument('--quad', metavar='X1,Y1,...,X4,Y4',
+                           help='Esquinas de la portada a mano (sin detección)')
+    calibrate.add_argument('--min-area', type=float, default=0.1,
+                           help='Área mínima (0.1 = 10%%). Default: 0.1')
+    calibrate.add_argument('--strategies', type=parse_strategies, metavar='LISTA',
+                           help='Estrategias separadas por comas. Default: las 4 clásicas')
+    calibrate.set_defaults(func=cmd_calibrate)
+
+    watch = subparsers.add_parser('watch', help='Vigila una carpeta y procesa las fotos que van llegando')
+    watch.add_argument('input_dir', help='Carpeta vigilada')
+    watch.add_argument('output_dir', help='Carpeta de resultados')
+    watch.add_argument('--workers', '-w', type=int, help='Procesos worker. Default: nº de CPUs')
+    watch.add_argument('--settle', type=float, default=2.0,
+                       help='Segundos sin cambios para dar un archivo por completo. Default: 2')
+    watch.add_argument('--poll', action='store_true', help='Forzar sondeo en lugar de inotify')
+    watch.add_argument('--poll-interval', type=float, default=1.0,
+                       help='Intervalo de sondeo en segundos. Default: 1')
+    watch.add_argument('--format', default='png', help='Extensión de salida. Default: png')
+    add_canvas_arguments(watch)
+    watch.add_argument('--min-area', type=float, default=0.1,
+                       help='Área mínima (0.1 = 10%%). Default: 0.1')
+    watch.set_defaults(func=cmd_watch)
+
+    manifest = subparsers.add_parser('manifest',
+                                     help='Procesa las filas de un manifiesto CSV/JSONL (reanudable)')
+    manifest.add_argument('manifest', help='CSV con cabecera (input,output[,color,width,height,min_area,mode]) '
+                                           'o JSONL con las mismas claves (o size: "WxH")')
+    manifest.add_argument('--checkpoint', metavar='RUTA',
+                          help='Checkpoint SQLite. Default: <manifiesto>.checkpoint.sqlite')
+    manifest.add_argument('--workers', '-w', type=int, help='Procesos worker. Default: nº de CPUs')
+    manifest.add_argument('--retries', type=int, default=2,
+                          help='Reintentos por fila, con espera exponencial. Default: 2')
+    manifest.add_argument('--mode', choices=['detect', 'auto', 'digital'], default='detect',
+                          help='Modo para las filas sin columna mode. Default: detect')
+    add_canvas_arguments(manifest)
+    manifest.add_argument('--min-area', type=float, default=0.1,
+                          help='Área mínima para las filas sin min_area. Default: 0.1')
+    manifest.add_argument('--no-cache', action='store_true',
+                          help='No usar la caché de resultados en disco')
+    manifest.set_defaults(func=cmd_manifest)
+
+    strategies = subparsers.add_parser('strategies',
+                                       help='Tasa de victorias de cada estrategia de detección')
+    strategies.add_argument('--reset', action='store_true', help='Borrar las estadísticas acumuladas')
+    strategies.set_defaults(func=cmd_strategies)
+
+    duplicates = subparsers.add_parser('duplicates',
+                                       help='Agrupa las fotos casi idénticas (hash perceptual)')
+    duplicates.add_argument('inputs', nargs='+', help='Imágenes o carpetas')
+    duplicates.add_argument('--threshold', '-t', type=int, default=6,
+                            help='Distancia de Hamming máxima entre hashes de 64 bits. Default: 6')
+    duplicates.add_argument('--index', metavar='RUTA',
+                            help='Índice donde guardar los hashes para la próxima vez. '
+                                 'Default: $BOOKEDITOR_PHASH_INDEX o <caché>/phash.sqlite')
+    duplicates.add_argument('--no-index', action='store_true', help='Hashear todo sin leer ni guardar el índice')
+    duplicates.add_argument('--workers', '-w', type=int, help='Procesos para hashear. Default: nº de CPUs')
+    duplicates.add_argument('--json', action='store_true', help='Informe en JSON')
+    duplicates.set_defaults(func=cmd_duplicates)
+
+    daemon = subparsers.add_parser('daemon', help='Arranca un daemon local con workers precargados')
+    daemon.add_argument('--socket', help='Ruta del socket Unix. Default: $BOOKEDITOR_SOCKET')
+    daemon.add_argument('--workers', '-w', type=int, help='Procesos worker. Default: nº de CPUs')
+    daemon.set_defaults(func=cmd_daemon)
+
+    client = subparsers.add_parser('client', help='Envía un comando al daemon (o lo ejecuta localmente)')
+    client.add_argument('--socket', help='Ruta del socket Unix. Default: $BOOKEDITOR_SOCKET')
+    client.add_argument('argv', nargs=argparse.REMAINDER,
+                        help='Comando y argumentos, igual que en la CLI (digital/detect/batch)')
+    client.set_defaults(func=cmd_client)
+
+    bench = subparsers.add_parser('bench', help='Benchmarks: arranque, clasificador, composición o recorte')
+    bench.add_argument('benchmark', nargs='?', choices=['startup', 'classify', 'render', 'crop'], default='startup',
+                       help='Benchmark a ejecutar. Default: startup')
+    bench.add_argument('--dataset', help='classify: carpeta con subcarpetas digital/ y photo/; '
+                                         'render: imagen o carpeta de fotos')
+    bench.add_argument('--size', '-s', nargs=2, type=int, metavar=('WIDTH', 'HEIGHT'),
+                       default=[1920, 1080], help='render: tamaño del lienzo. Default: 1920 1080')
+    bench.add_argument('--runs', type=int, default=5, help='Repeticiones por medida. Default: 5')
+    bench.add_argument('--limit-ms', type=float, default=300.0,
+                       help='Falla si `--help` tarda más (mediana, ms). Default: 300')
+    bench.set_defaults(func=cmd_bench)
+
+    return parser
+
+
+def run_captured(argv, cwd=None):
+    """
+    Ejecuta la CLI en este proceso capturando su salida
+
+    Returns:
+        (código de salida, texto impreso por stdout y stderr)
+    """
+    output = io.StringIO()
+    previous_cwd = os.getcwd()
+    try:
+        if cwd:
+            os.chdir(cwd)
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            try:
+                code = main(argv) or 0
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    finally:
+        os.chdir(previous_cwd)
+    return code, output.getvalue()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Control de admisión para el pipeline de visión del servicio web
+
+Como mucho `max_concurrent` detecciones a la vez y `max_queue` peticiones
+esperando turno. Si la cola está llena la petición se rechaza enseguida
+(503 + Retry-After) en lugar de aceptarla y ralentizar a todas las demás.
+
+Límites por defecto:
+    • concurrencia: núcleos disponibles (afinidad y cuota de CPU del
+      cgroup), recortado por el presupuesto de memoria (memoria disponible
+      / memoria estimada por trabajo)
+    • cola: 4 peticiones por hueco de concurrencia
+
+Variables de entorno: BOOKEDITOR_MAX_CONCURRENT, BOOKEDITOR_MAX_QUEUE
+"""
+
+import collections
+import math
+import os
+import threading
+import time
+
+from book_cover_threads import available_cpus
+
+
+# Memoria de pico estimada por trabajo: imagen decodificada, gris, copias y
+# lienzo para una foto típica de móvil (12-50 MP)
+JOB_MEMORY_MB = 400
+QUEUE_PER_SLOT = 4
+# Tiempo máximo esperando turno antes de rendirse con 503
+MAX_WAIT = 30.0
+
+
+class Overloaded(Exception):
+    """No hay hueco en la cola (o se agotó la espera); reintentar más tarde"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def available_memory_mb():
+    """Límite de memoria del cgroup (contenedores) o MemAvailable del sistema; None si no se sabe"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:  # "max" o 2^63 = sin límite
+            return int(value) // (1024 * 1024)
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+def default_limits():
+    """
+    (max_concurrent, max_queue) según CPU, memoria y variables de entorno
+    """
+    concurrent = available_cpus()
+    memory = available_memory_mb()
+    if memory is not None:
+        concurrent = min(concurrent, max(1, memory // JOB_MEMORY_MB))
+
+    concurrent = int(os.environ.get('BOOKEDITOR_MAX_CONCURRENT', concurrent))
+    queue = int(os.environ.get('BOOKEDITOR_MAX_QUEUE', concurrent * QUEUE_PER_SLOT))
+    return max(1, concurrent), max(0, queue)
+
+
+class AdmissionController:
+    """
+    Semáforo con cola acotada y estimación de espera
+
+    Los huecos se entregan en orden de llegada: release() pasa el hueco
+    directamente al primero de la cola, así que una petición nueva no puede
+    adelantar a las que ya esperan.
+    """
+
+    def __init__(self, max_concurrent=None, max_queue=None, max_wait=MAX_WAIT):
+        default_concurrent, default_queue = default_limits()
+        self.max_concurrent = max_concurrent or default_concurrent
+        self.max_queue = default_queue if max_queue is None else max_queue
+        self.max_wait = max_wait
+
+        self._lock = threading.Lock()
+        # Un Event por petición en espera, en orden de llegada
+        self._waiters = collections.deque()
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        # Media móvil del tiempo de servicio, para estimar la espera
+        self.avg_service = 1.0
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def estimated_wait(self, position=None):
+        """Segundos estimados hasta conseguir turno en la posición dada de la cola"""
+        if position is None:
+            position = self.waiting
+        if self.active < self.max_concurrent and position == 0:
+            return 0.0
+        return (position + 1) * self.avg_service / self.max_concurrent
+
+    def _retry_after(self):
+        return max(1, math.ceil(self.estimated_wait()))
+
+    def acquire(self):
+        with self._lock:
+            if self.active < self.max_concurrent and not self._waiters:
+                self.active += 1
+                self.admitted += 1
+                return
+            if len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise Overloaded('Servidor ocupado: cola llena', self._retry_after())
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+
+        if waiter.wait(self.max_wait):
+            return  # release() nos pasó su hueco (active ya lo cuenta)
+
+        with self._lock:
+            if waiter.is_set():
+                return  # el hueco llegó justo al agotarse la espera
+            self._waiters.remove(waiter)
+            self.rejected += 1
+            raise Overloaded('Servidor ocupado: tiempo de espera agotado', self._retry_after())
+
+    def release(self, elapsed=None):
+        with self._lock:
+            if elapsed is not None:
+                self.avg_service = 0.8 * self.avg_service + 0.2 * elapsed
+            if self._waiters:
+                # El hueco pasa al primero de la cola sin quedar libre
+                self._waiters.popleft().set()
+                self.admitted += 1
+            else:
+                self.active -= 1
+
+    def run(self, fn):
+        """Ejecuta fn() cuando haya hueco; lanza Overloaded si no lo hay"""
+        self.acquire()
+        start = time.monotonic()
+        try:
+            return fn()
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active': self.active,
+                'queued': self.waiting,
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'avg_service_seconds': round(self.avg_service, 3),
+                'estimated_wait_seconds': round(self.estimated_wait(), 2),
+            }
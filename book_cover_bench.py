@@ -0,0 +1,296 @@
+"""
+Benchmarks de BookEditor
+Se ejecutan desde la CLI unificada: python3 book_cover.py bench
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+CLI_PATH = Path(__file__).resolve().parent / 'book_cover.py'
+
+# Módulos que no deben cargarse solo por importar la CLI o pedir ayuda
+HEAVY_MODULES = ('cv2', 'numpy', 'PIL')
+
+# Tiempo máximo de `book_cover.py --help` (bench y tests/test_startup.py)
+STARTUP_LIMIT_MS = 300.0
+
+
+def time_command(cmd, runs):
+    """Ejecuta un comando `runs` veces y devuelve los tiempos en ms"""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def heavy_modules_loaded():
+    """Devuelve los módulos pesados que carga `import book_cover` + parseo de argumentos"""
+    code = (
+        "import sys; import book_cover; "
+        "book_cover.build_parser().parse_args(['digital', 'a.jpg', 'b.png']); "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, '-c', code], cwd=str(CLI_PATH.parent),
+                            capture_output=True, text=True, check=False)
+    return [m for m in result.stdout.strip().split(',') if m]
+
+
+def bench_startup(runs=5, limit_ms=STARTUP_LIMIT_MS):
+    """
+    Mide el arranque de la CLI y falla si supera el límite
+
+    Returns:
+        0 si el arranque está dentro del presupuesto, 1 si no
+    """
+    print(f"⏱️  Arranque de la CLI ({runs} repeticiones)")
+
+    baseline = time_command([sys.executable, '-c', 'pass'], runs)
+    help_times = time_command([sys.executable, str(CLI_PATH), '--help'], runs)
+    digital_help = time_command([sys.executable, str(CLI_PATH), 'digital', '--help'], runs)
+
+    baseline_ms = statistics.median(baseline)
+    help_ms = statistics.median(help_times)
+    digital_ms = statistics.median(digital_help)
+
+    print(f"   Intérprete vacío:     {baseline_ms:7.1f} ms")
+    print(f"   book_cover --help:    {help_ms:7.1f} ms (+{help_ms - baseline_ms:.1f} ms)")
+    print(f"   digital --help:       {digital_ms:7.1f} ms (+{digital_ms - baseline_ms:.1f} ms)")
+
+    ok = True
+
+    loaded = heavy_modules_loaded()
+    if loaded:
+        print(f"❌ La CLI importa módulos pesados al arrancar: {', '.join(loaded)}")
+        ok = False
+
+    if help_ms > limit_ms:
+        print(f"❌ Arranque por encima del límite: {help_ms:.1f} ms > {limit_ms:.1f} ms")
+        ok = False
+
+    if ok:
+        print(f"✅ Arranque dentro del presupuesto ({limit_ms:.0f} ms)")
+    return 0 if ok else 1
+
+
+def bench_classify(dataset_dir):
+    """
+    Precisión y coste del pre-clasificador digital/foto
+
+    `dataset_dir` debe contener las subcarpetas digital/ y photo/ con imágenes
+    etiquetadas. Se informa de la matriz de confusión, la precisión sobre las
+    imágenes en las que decide, la cobertura (cuántas decide) y el tiempo medio.
+
+    Returns:
+        0 si no hay ninguna decisión errónea, 1 si la hay
+    """
+    from book_cover import iter_images
+    from book_cover_classify import classify_file
+
+    dataset = Path(dataset_dir)
+    confusion = {label: {'digital': 0, 'photo': 0, 'unknown': 0} for label in ('digital', 'photo')}
+    errors = []
+    times = []
+
+    for label in ('digital', 'photo'):
+        folder = dataset / label
+        if not folder.is_dir():
+            print(f"⚠️  Falta la carpeta {folder}")
+            continue
+        for path in iter_images([folder]):
+            start = time.perf_counter()
+            result = classify_file(str(path))
+            times.append((time.perf_counter() - start) * 1000)
+            kind = result['kind'] if result else 'unknown'
+            confusion[label][kind] += 1
+            if kind not in (label, 'unknown'):
+                errors.append((path, label, result))
+
+    total = sum(sum(row.values()) for row in confusion.values())
+    if not total:
+        print("❌ No se encontraron imágenes etiquetadas")
+        return 1
+
+    decided = sum(row['digital'] + row['photo'] for row in confusion.values())
+    correct = confusion['digital']['digital'] + confusion['photo']['photo']
+
+    print(f"🧭 Clasificador digital/foto ({total} imágenes)")
+    print(f"   {'real / decisión':<16}{'digital':>9}{'photo':>9}{'unknown':>9}")
+    for label, row in confusion.items():
+        print(f"   {label:<16}{row['digital']:>9}{row['photo']:>9}{row['unknown']:>9}")
+    print(f"   Cobertura:  {decided / total:.1%} (imágenes que se saltan o van directas a detección)")
+    if decided:
+        print(f"   Precisión:  {correct / decided:.1%} sobre las decididas")
+    print(f"   Tiempo:     {statistics.mean(times):.1f} ms de media, "
+          f"{statistics.median(times):.1f} ms mediana")
+
+    for path, label, result in errors:
+        print(f"   ❌ {path}: {label} clasificada como {result['kind']} ({', '.join(result['signals'])})")
+    return 1 if errors else 0
+
+
+def _detected_cover(path):
+    """Decodifica y recorta la portada (o la imagen entera si no se detecta)"""
+    import cv2
+
+    from book_cover_detect import ContourSet, prepare_image, warp_quad
+
+    img = cv2.imread(str(path), cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    best, _ = ContourSet(prepare_image(img)).run_all().sweep(0.1, score_on='approx')
+    return warp_quad(img, best['approx']) if best else img
+
+
+def bench_render(paths, runs=5, canvas_size=(1920, 1080)):
+    """
+    Ruta PIL (LANCZOS + PNG de Pillow) frente a la ruta NumPy (INTER_AREA +
+    cv2.imencode) para la composición del lienzo
+
+    Se mide desde la portada ya recortada (array BGR) hasta los bytes PNG, y
+    se compara el resultado decodificado de ambas rutas (PSNR y diferencia
+    máxima por píxel).
+
+    Returns:
+        0 (informativo)
+    """
+    import cv2
+    import numpy as np
+    from PIL import Image
+
+    from book_cover import iter_images
+    from book_cover_render import compose, compose_array, encode, encode_array
+
+    color = (255, 255, 255)
+
+    def pil_path(cover_bgr):
+        cover_img = Image.fromarray(cv2.cvtColor(cover_bgr, cv2.COLOR_BGR2RGB))
+        return encode(compose(cover_img, canvas_size, color), 'PNG')
+
+    def numpy_path(cover_bgr):
+        return encode_array(compose_array(cover_bgr, canvas_size, color), 'PNG')
+
+    rows = []
+    for path in iter_images(paths):
+        cover = _detected_cover(path)
+        if cover is None:
+            print(f"⚠️  No se pudo leer {path}")
+            continue
+        timings, outputs = {}, {}
+        for name, fn in (('pil', pil_path), ('numpy', numpy_path)):
+            times = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                outputs[name] = fn(cover)
+                times.append((time.perf_counter() - start) * 1000)
+            timings[name] = statistics.median(times)
+
+        decoded = [cv2.imdecode(np.frombuffer(outputs[name], np.uint8), cv2.IMREAD_COLOR).astype(np.float32)
+                   for name in ('pil', 'numpy')]
+        mse = float(np.mean((decoded[0] - decoded[1]) ** 2))
+        psnr = float('inf') if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+        max_diff = int(np.abs(decoded[0] - decoded[1]).max())
+        rows.append((path, cover.shape, timings, psnr, max_diff,
+                     len(outputs['pil']), len(outputs['numpy'])))
+
+    if not rows:
+        print("❌ No se encontraron imágenes")
+        return 1
+
+    print(f"🖼️  Composición {canvas_size[0]}x{canvas_size[1]}: PIL vs NumPy ({runs} repeticiones, mediana)")
+    print(f"   {'imagen':<28}{'portada':>12}{'PIL ms':>9}{'NumPy ms':>10}{'PSNR dB':>9}{'máx':>5}{'KB PIL/NumPy':>15}")
+    for path, shape, timings, psnr, max_diff, pil_size, numpy_size in rows:
+        print(f"   {Path(path).name[:27]:<28}{shape[1]:>6}x{shape[0]:<5}{timings['pil']:>9.1f}"
+              f"{timings['numpy']:>10.1f}{psnr:>9.1f}{max_diff:>5}"
+              f"{pil_size // 1024:>8}/{numpy_size // 1024:<6}")
+
+    pil_total = sum(row[2]['pil'] for row in rows)
+    numpy_total = sum(row[2]['numpy'] for row in rows)
+    print(f"   Rendimiento: PIL {1000 * len(rows) / pil_total:.1f} img/s, "
+          f"NumPy {1000 * len(rows) / numpy_total:.1f} img/s (x{pil_total / numpy_total:.2f})")
+    return 0
+
+
+def _margin_bounds_loop(content, ratio):
+    """Referencia fila a fila de book_cover_pipeline.margin_bounds()"""
+    height, width = content.shape
+    rows = [int(row.sum()) for row in content]
+    cols = [int(col.sum()) for col in content.T]
+
+    def first(counts, limit):
+        total = 0
+        for i, count in enumerate(counts):
+            total += count
+            if total > limit:
+                return i
+        return len(counts)
+
+    top = first(rows, ratio * width)
+    bottom = height - first(rows[::-1], ratio * width)
+    left = first(cols, ratio * height)
+    right = width - first(cols[::-1], ratio * height)
+    if sum(rows) == 0 or top >= bottom or left >= right:
+        return None
+    return top, bottom, left, right
+
+
+def bench_crop():
+    """
+    Regresión del recorte de márgenes (auto_crop_margins) con cajas sintéticas
+
+    Compara margin_bounds() con el bucle de referencia sobre máscaras
+    aleatorias y comprueba que una caja de contenido sobre un margen liso se
+    recorta exactamente (imágenes que no se reducen) o sin perder contenido y
+    con holgura de un paso de la reducción (las grandes).
+
+    Returns:
+        0 si todo coincide, 1 si no
+    """
+    import numpy as np
+
+    from book_cover_pipeline import AUTO_CROP_MAX_SIDE, MARGIN_CONTENT_RATIO, auto_crop_margins, margin_bounds
+
+    errors = []
+    rng = np.random.default_rng(0)
+    for i in range(200):
+        height, width = rng.integers(8, 120, size=2)
+        content = np.zeros((height, width), dtype=bool)
+        top, left = rng.integers(0, height), rng.integers(0, width)
+        bottom, right = rng.integers(top, height + 1), rng.integers(left, width + 1)
+        content[top:bottom, left:right] = True
+        content ^= rng.random((height, width)) < 0.01
+        expected = _margin_bounds_loop(content, MARGIN_CONTENT_RATIO)
+        got = margin_bounds(content)
+        if got != expected:
+            errors.append(f"máscara {i} ({width}x{height}): {got} != {expected}")
+
+    # (lienzo, caja, margen) con portadas de textura aleatoria
+    cases = [((400, 300), (200, 200), (255, 255, 255)), ((300, 400), (120, 250), (0, 0, 0)),
+             ((500, 500), (499, 300), (40, 90, 200)), ((1600, 1200), (900, 700), (255, 255, 255)),
+             ((8000, 6000), (6000, 4000), (255, 255, 255))]
+    for (width, height), (box_w, box_h), color in cases:
+        img = np.empty((height, width, 3), dtype=np.uint8)
+        img[:] = color
+        x, y = (width - box_w) // 3, (height - box_h) // 2
+        img[y:y + box_h, x:x + box_w] = rng.integers(0, 256, size=(box_h, box_w, 3), dtype=np.uint8)
+        img[y:y + box_h, x:x + box_w, 0] = 255 - np.uint8(color[0] // 2)  # lejos del margen en todo punto
+        cropped = auto_crop_margins(img)
+        got = (cropped.shape[1], cropped.shape[0])
+        slack = 0 if max(width, height) <= AUTO_CROP_MAX_SIDE else 2 * -(-max(width, height) // AUTO_CROP_MAX_SIDE)
+        ok = box_w <= got[0] <= box_w + 2 * slack and box_h <= got[1] <= box_h + 2 * slack
+        print(f"   {'✅' if ok else '❌'} {width}x{height}, caja {box_w}x{box_h} → {got[0]}x{got[1]}")
+        if not ok:
+            errors.append(f"caja {box_w}x{box_h} en {width}x{height}: recorte {got[0]}x{got[1]}")
+
+    if errors:
+        print("❌ Recorte de márgenes:")
+        for error in errors:
+            print(f"   • {error}")
+        return 1
+    print("✅ Recorte de márgenes: 200 máscaras iguales a la referencia y cajas completas")
+    return 0
@@ -0,0 +1,349 @@
+"""
+Caché persistente de resultados en disco
+
+Sobrevive a los reinicios (Railway/Render) y se comparte entre procesos. La
+clave es el hash del archivo de entrada + todos los parámetros de salida; el
+directorio de la caché incluye además la versión del código de detección y
+composición, así que cualquier cambio en ese código invalida lo anterior.
+
+    <raíz>/v-<versión>/<ab>/<clave>.entry
+
+Las claves se calculan con book_cover_singleflight.request_key().
+
+Cada entrada es un único archivo (cabecera JSON + blobs) escrito a un
+temporal y renombrado, así que un lector nunca ve una entrada a medias. La
+fecha de modificación hace de "último uso": al superar el tamaño máximo se
+borran las entradas usadas hace más tiempo.
+
+Los directorios de otras versiones nunca se borran de golpe: otro proceso
+con otro código (despliegue escalonado, la CLI de otra copia) puede estar
+usándolos. El tamaño máximo de esta caché cubre todos los v-*, así que las
+entradas de otras versiones, sin uso, son las primeras en expulsarse; además
+al arrancar se borran las que llevan más de STALE_VERSION_DAYS sin usarse.
+
+Junto a los v-* viven los almacenes de la web, cada uno con su propio LRU:
+
+    <raíz>/results/   resultados publicados (ResultStore)
+    <raíz>/debug/     informes de depuración
+
+BOOKEDITOR_CACHE_MAX_MB es el total de los tres (ver cache_budget()): el
+índice de pHash y las estadísticas de estrategias, también en la raíz, no
+cuentan (son pequeños).
+
+Configuración: BOOKEDITOR_CACHE_DIR (por defecto ~/.cache/bookeditor) y
+BOOKEDITOR_CACHE_MAX_MB (por defecto 512; 0 desactiva la caché).
+"""
+
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+
+
+# Archivos cuyo contenido define la versión del resultado
+PIPELINE_MODULES = (
+    'book_cover_detect.py',
+    'book_cover_classify.py',
+    'book_cover_render.py',
+    'book_cover_cli_v2.py',
+    'book_cover_simple.py',
+    'book_cover_web.py',
+    'book_cover_pipeline.py',
+    'book_cover_decode.py',
+    'book_cover_rig.py',
+    'book_cover_phash.py',
+    'book_cover_telemetry.py',
+)
+
+# Cambiar si cambia el formato de las entradas
+CACHE_FORMAT = 1
+
+DEFAULT_MAX_MB = 512
+
+# Entradas de otras versiones del código sin usar en este tiempo se borran al
+# arrancar aunque quepan (un proceso con esa versión las renueva al usarlas)
+STALE_VERSION_DAYS = 7
+
+# Informes de depuración de la web (entrada + informe): pocos y de paso, así
+# que se llevan DEBUG_SHARE del total sin pasar de DEBUG_MAX_MB; el resto se
+# reparte a partes iguales entre la caché por versión y los resultados publicados
+DEBUG_MAX_MB = 64
+DEBUG_SHARE = 0.125
+
+_MAGIC = b'BKC1'
+_HEADER = struct.Struct('>4sI')
+
+_version = None
+
+
+def code_version():
+    """Hash corto del código del pipeline (se calcula una vez por proceso)"""
+    global _version
+    if _version is None:
+        digest = hashlib.sha256(str(CACHE_FORMAT).encode())
+        base = Path(__file__).resolve().parent
+        for name in PIPELINE_MODULES:
+            try:
+                digest.update((base / name).read_bytes())
+            except FileNotFoundError:
+                digest.update(name.encode())
+        _version = digest.hexdigest()[:12]
+    return _version
+
+
+def default_cache_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.environ.get('BOOKEDITOR_CACHE_DIR') or os.path.join(cache_home, 'bookeditor')
+
+
+class ResultCache:
+    """
+    Caché LRU en disco con tamaño máximo
+
+    Args:
+        root: Directorio raíz
+        max_bytes: Tamaño máximo; al superarlo se baja al 90% borrando las
+            entradas usadas hace más tiempo
+        versioned: Separar (e invalidar) por versión del código. Los
+            almacenes direccionados por contenido no lo necesitan.
+    """
+
+    def __init__(self, root, max_bytes, versioned=True):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.version = code_version() if versioned else None
+        self.dir = self.root / f'v-{self.version}' if versioned else self.root
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+        if versioned:
+            self._prune_other_versions()
+
+        self._size = sum(path.stat().st_size for path in self._entries())
+        if self._size > self.max_bytes:
+            self.evict()  # el máximo configurado puede haber bajado
+
+    def _entries(self):
+        # Con versiones el máximo cubre todas: las de otro código, sin uso, salen antes
+        return self.root.glob('v-*/*/*.entry') if self.version else self.dir.glob('*/*.entry')
+
+    def _prune_other_versions(self):
+        """
+        Borra las entradas de otras versiones sin usar en STALE_VERSION_DAYS
+
+        Entrada a entrada y directorios solo si quedan vacíos: lo que otro
+        proceso esté usando sigue ahí, y put() recrea un directorio borrado.
+        """
+        cutoff = time.time() - STALE_VERSION_DAYS * 86400
+        for old in self.root.glob('v-*'):
+            if old == self.dir:
+                continue
+            for path in old.glob('*/*.entry'):
+                try:
+                    if path.stat().st_mtime < cutoff:
+                        path.unlink()
+                except FileNotFoundError:
+                    pass
+            for directory in [*old.iterdir(), old]:
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    pass  # no vacío (o ya no existe)
+
+    def _path(self, key):
+        return self.dir / key[:2] / f'{key}.entry'
+
+    def get(self, key):
+        """
+        Returns:
+            (dict nombre -> bytes, metadatos) o None si no está
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                magic, header_length = _HEADER.unpack(f.read(_HEADER.size))
+                if magic != _MAGIC:
+                    raise ValueError('entrada no válida')
+                header = json.loads(f.read(header_length))
+                blobs = {name: f.read(length) for name, length in header['blobs']}
+            os.utime(path)  # último uso, para la expulsión LRU
+        except (OSError, ValueError, KeyError, struct.error):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return blobs, header['meta']
+
+    def contains(self, key):
+        """Si la entrada existe (cuenta como uso, pero no la lee)"""
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            return False
+        return True
+
+    def put(self, key, blobs, meta=None):
+        """Guarda una entrada (escritura atómica) y expulsa si hace falta"""
+        header = json.dumps({
+            'meta': meta or {},
+            'blobs': [[name, len(data)] for name, data in blobs.items()],
+        }).encode('utf-8')
+
+        path = self._path(key)
+        tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        for attempt in range(2):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(_HEADER.pack(_MAGIC, len(header)))
+                    f.write(header)
+                    for data in blobs.values():
+                        f.write(data)
+                size = tmp_path.stat().st_size
+                os.replace(tmp_path, path)
+                break
+            except FileNotFoundError:
+                # Otro proceso borró el directorio vacío entre mkdir y open
+                if attempt:
+                    raise
+
+        with self._lock:
+            self._size += size
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self):
+        """Borra las entradas menos usadas hasta quedar en el 90% del máximo"""
+        entries = []
+        for path in self._entries():
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+
+        with self._lock:
+            self._size = total
+            self.evicted += evicted
+
+    def stats(self):
+        with self._lock:
+            return {
+                'dir': str(self.dir),
+                'version': self.version,
+                'size_mb': round(self._size / (1024 * 1024), 1),
+                'max_mb': round(self.max_bytes / (1024 * 1024), 1),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evicted': self.evicted,
+            }
+
+
+def cache_budget():
+    """
+    Reparto de BOOKEDITOR_CACHE_MAX_MB entre los almacenes, en bytes
+
+    Returns:
+        {'versioned': ..., 'results': ..., 'debug': ...}, o None si la caché
+        está desactivada
+    """
+    max_mb = float(os.environ.get('BOOKEDITOR_CACHE_MAX_MB', DEFAULT_MAX_MB))
+    if max_mb <= 0:
+        return None
+    total = int(max_mb * 1024 * 1024)
+    debug = min(DEBUG_MAX_MB * 1024 * 1024, int(total * DEBUG_SHARE))
+    versioned = (total - debug) // 2
+    return {'versioned': versioned, 'results': total - debug - versioned, 'debug': debug}
+
+
+def default_cache():
+    """Caché con la configuración del entorno, o None si está desactivada"""
+    budget = cache_budget()
+    if budget is None:
+        return None
+    try:
+        return ResultCache(default_cache_dir(), budget['versioned'])
+    except OSError:
+        return None  # directorio no escribible: se trabaja sin caché
+
+
+class ResultStore:
+    """
+    Resultados direccionados por contenido: /results/<sha256>.<ext>
+
+    El nombre es el hash de los propios bytes, así que una URL siempre
+    devuelve lo mismo (ETag fuerte, caché inmutable) y publicar dos veces el
+    mismo resultado no duplica nada. No depende de la versión del código.
+    """
+
+    def __init__(self, root, max_bytes):
+        self._cache = ResultCache(root, max_bytes, versioned=False)
+
+    def publish(self, data, extension, mimetype, download_name):
+        """Guarda el resultado y devuelve su hash"""
+        digest = hashlib.sha256(data).hexdigest()
+        if not self._cache.contains(digest):
+            self._cache.put(digest, {'data': data}, {
+                'extension': extension,
+                'mimetype': mimetype,
+                'download_name': download_name,
+            })
+        return digest
+
+    def get(self, digest):
+        """
+        Returns:
+            (bytes, metadatos) o None si no está (o ya se expulsó)
+        """
+        entry = self._cache.get(digest)
+        if entry is None:
+            return None
+        blobs, meta = entry
+        return blobs['data'], meta
+
+    def stats(self):
+        return self._cache.stats()
+
+
+def default_result_store():
+    """Almacén de resultados en <caché>/results, o None si la caché está desactivada"""
+    budget = cache_budget()
+    if budget is None:
+        return None
+    try:
+        return ResultStore(os.path.join(default_cache_dir(), 'results'), budget['results'])
+    except OSError:
+        return None
+
+
+def default_debug_store():
+    """Almacén de informes de depuración en <caché>/debug (None si la caché está desactivada o no se puede crear)"""
+    budget = cache_budget()
+    if budget is None:
+        return None
+    try:
+        return ResultCache(os.path.join(default_cache_dir(), 'debug'), budget['debug'], versioned=False)
+    except OSError:
+        return None
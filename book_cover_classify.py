@@ -0,0 +1,180 @@
+"""
+Pre-clasificador rápido: ¿portada digital o foto de una portada física?
+
+Trabaja sobre una miniatura (lado mayor <= 256 px) y los metadatos del archivo,
+así que cuesta unos pocos milisegundos. Solo decide cuando las señales son
+claras; en caso de duda devuelve 'unknown' y se ejecuta la detección completa,
+que ya cae al recorte de márgenes si no encuentra portada.
+
+Señales (positivo = foto, negativo = digital):
+  • EXIF con marca/modelo de cámara                     +3
+  • Formato sin pérdida (PNG, WEBP, GIF)                -1
+  • Resolución: >= 6 MP +1, < 1.5 MP -1
+  • Proporción exacta de sensor (4:3, 3:2, 16:9)        +0.5
+  • Banda exterior lisa pero con textura (mesa, tela)   +1
+  • Banda exterior de color sólido (margen digital)     -1
+  • Contenido que llega hasta los cuatro bordes         -1
+
+'digital' exige además una señal de contenido a favor (margen sólido o
+contenido hasta los bordes): formato y tamaño solos también los tiene un PNG
+pequeño exportado de una foto, sin EXIF, y saltarse la detección lo dejaría
+con la mesa alrededor.
+"""
+
+import io
+import warnings
+
+import cv2
+import numpy as np
+
+from book_cover_decode import sniff_format
+
+
+THUMBNAIL_SIDE = 256
+BAND_RATIO = 0.06           # grosor de la banda exterior
+DECISION_THRESHOLD = 2.0    # |score| mínimo para decidir
+
+CAMERA_RATIOS = (4 / 3, 3 / 2, 16 / 9)
+
+EXIF_MAKE = 271
+EXIF_MODEL = 272
+
+
+def inspect_header(image_data):
+    """
+    Lee solo la cabecera con Pillow (no decodifica píxeles)
+
+    Returns:
+        (marca y modelo de cámara o None, (ancho, alto) o None)
+    """
+    from PIL import Image
+
+    try:
+        # Solo cabecera: el aviso de Pillow por tamaño no aplica (el
+        # presupuesto de píxeles lo controla book_cover_decode)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            header = Image.open(io.BytesIO(image_data))
+        exif = header.getexif()
+    except Exception:
+        return None, None
+    make = str(exif.get(EXIF_MAKE, '')).strip('\x00 ')
+    model = str(exif.get(EXIF_MODEL, '')).strip('\x00 ')
+    camera = f"{make} {model}".strip() or None
+    return camera, header.size
+
+
+def make_thumbnail(img):
+    h, w = img.shape[:2]
+    scale = THUMBNAIL_SIDE / max(h, w)
+    if scale >= 1.0:
+        return img
+    return cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))),
+                      interpolation=cv2.INTER_AREA)
+
+
+def border_signals(thumb):
+    """
+    Estadísticas de la banda exterior frente al interior de la miniatura
+
+    Returns:
+        (score, lista de señales activadas)
+    """
+    h, w = thumb.shape[:2]
+    band = max(2, int(min(h, w) * BAND_RATIO))
+    gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+    gradient = cv2.magnitude(cv2.Sobel(gray, cv2.CV_32F, 1, 0), cv2.Sobel(gray, cv2.CV_32F, 0, 1))
+
+    mask = np.zeros((h, w), bool)
+    mask[:band, :] = mask[-band:, :] = True
+    mask[:, :band] = mask[:, -band:] = True
+
+    band_pixels = thumb[mask].astype(np.float32)
+    band_std = float(band_pixels.std(axis=0).max())
+    band_edges = float((gradient[mask] > 60).mean())
+    inner_edges = float((gradient[~mask] > 60).mean()) if (~mask).any() else 0.0
+
+    # Estructura en cada uno de los cuatro lados de la banda
+    sides = (gradient[:band, :], gradient[-band:, :], gradient[:, :band], gradient[:, -band:])
+    busy_sides = sum(1 for side in sides if (side > 60).mean() > 0.04)
+
+    score, signals = 0.0, []
+    if band_std < 1.5:
+        score -= 1.0
+        signals.append('margen de color sólido')
+    elif band_edges < 0.02 and inner_edges > 2.5 * max(band_edges, 0.005):
+        score += 1.0
+        signals.append('fondo liso con textura alrededor de un objeto')
+    if busy_sides == 4:
+        score -= 1.0
+        signals.append('contenido hasta los cuatro bordes')
+    return score, signals
+
+
+def classify_cover(img, image_data=None, full_size=None):
+    """
+    Clasifica una imagen como portada digital o foto de portada física
+
+    Args:
+        img: Imagen BGR (completa o ya reducida)
+        image_data: Bytes del archivo original, para EXIF y formato (opcional)
+        full_size: (ancho, alto) reales si `img` está reducida
+
+    Returns:
+        dict con kind ('digital' | 'photo' | 'unknown'), score y signals
+    """
+    score, signals = 0.0, []
+
+    if image_data is not None:
+        camera, header_size = inspect_header(image_data)
+        full_size = full_size or header_size
+        if camera:
+            score += 3.0
+            signals.append(f'EXIF de cámara ({camera})')
+        if sniff_format(image_data) in ('png', 'webp', 'gif'):
+            score -= 1.0
+            signals.append('formato sin pérdida')
+
+    w, h = full_size or (img.shape[1], img.shape[0])
+    megapixels = (h * w) / 1e6
+    if megapixels >= 6:
+        score += 1.0
+        signals.append(f'{megapixels:.1f} MP')
+    elif megapixels < 1.5:
+        score -= 1.0
+        signals.append(f'{megapixels:.1f} MP')
+
+    ratio = max(h, w) / min(h, w)
+    if any(abs(ratio - camera_ratio) < 0.01 for camera_ratio in CAMERA_RATIOS):
+        score += 0.5
+        signals.append(f'proporción de sensor ({ratio:.3f})')
+
+    border_score, border = border_signals(make_thumbnail(img))
+    score += border_score
+    signals.extend(border)
+
+    if score >= DECISION_THRESHOLD:
+        kind = 'photo'
+    elif score <= -DECISION_THRESHOLD and border_score < 0:
+        kind = 'digital'
+    else:
+        kind = 'unknown'
+    return {'kind': kind, 'score': score, 'signals': signals}
+
+
+def classify_file(path):
+    """
+    Clasifica un archivo decodificando solo a resolución reducida
+
+    Returns:
+        El dict de classify_cover(), o None si no se puede leer
+    """
+    with open(path, 'rb') as f:
+        image_data = f.read()
+
+    # JPEG se decodifica directamente a 1/4, mucho más barato; el tamaño real
+    # sale de la cabecera dentro de classify_cover()
+    reduced = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_REDUCED_COLOR_4)
+    if reduced is None:
+        return None
+    return classify_cover(reduced, image_data)
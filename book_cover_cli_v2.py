@@ -5,188 +5,122 @@ Versión 2: Múltiples estrategias de detección para máxima precisión
 """
 
 import cv2
-import numpy as np
 from PIL import Image
 import argparse
+import json
 import sys
 from pathlib import Path
 
+from book_cover_detect import (DEFAULT_STRATEGIES, FALLBACK_STRATEGY, ContourSet,  # noqa: F401
+                               order_points, prepare_image, render_overlay, score_contour, warp_quad)
+from book_cover_render import (fit_cover, parse_color, paste_centered, save_canvas_strips, save_renditions,
+                                use_strips)
+from book_cover_telemetry import STRATEGY_STATS
 
-def order_points(pts):
-    """Ordena puntos en: top-left, top-right, bottom-right, bottom-left"""
-    rect = np.zeros((4, 2), dtype="float32")
-    s = pts.sum(axis=1)
-    rect[0] = pts[np.argmin(s)]
-    rect[2] = pts[np.argmax(s)]
-    diff = np.diff(pts, axis=1)
-    rect[1] = pts[np.argmin(diff)]
-    rect[3] = pts[np.argmax(diff)]
-    return rect
 
+STRATEGY_LABELS = {
+    'Canny_standard': 'Detección de bordes Canny',
+    'Canny_sensitive': 'Canny sensible',
+    'Canny_auto': 'Canny con umbral automático (mediana)',
+    'Adaptive_thresh': 'Umbralización adaptativa',
+    'Otsu_thresh': 'Umbralización Otsu',
+    'Lines': 'Segmentos de línea',
+}
+
+
+def default_debug_path(path):
+    """foto.jpg -> foto_debug.jpg (un archivo por imagen: sin choques en paralelo)"""
+    path = Path(path)
+    return str(path.with_name(f"{path.stem}_debug.jpg"))
 
-def score_contour(contour, total_area, img_width, img_height):
-    """
-    Calcula un score para determinar qué tan probable es que sea una portada
-    Mayor score = más probable que sea la portada
-    """
-    area = cv2.contourArea(contour)
-    area_ratio = area / total_area
-
-    # Calcular bounding rect
-    x, y, w, h = cv2.boundingRect(contour)
-    aspect_ratio = h / w if w > 0 else 0
-
-    # Calcular posición relativa (centrado es mejor)
-    center_x = x + w/2
-    center_y = y + h/2
-    img_center_x = img_width / 2
-    img_center_y = img_height / 2
-
-    # Distancia al centro (normalizada)
-    center_dist = np.sqrt((center_x - img_center_x)**2 + (center_y - img_center_y)**2)
-    max_dist = np.sqrt(img_center_x**2 + img_center_y**2)
-    center_score = 1 - (center_dist / max_dist)
-
-    # Score por área (más grande es mejor, pero con límite)
-    # Penalizar contornos muy grandes (>95%) que probablemente sean el fondo
-    if area_ratio > 0.95:
-        area_score = 0.3  # Penalización fuerte para fondos
-    elif area_ratio > 0.85:
-        area_score = 0.6  # Penalización media
-    else:
-        area_score = min(area_ratio / 0.5, 1.0)  # Óptimo: 50% de la imagen
-
-    # Score por aspecto (libros típicos: 1.3-1.6)
-    aspect_score = 0
-    if 1.2 <= aspect_ratio <= 1.8:  # Libro vertical
-        aspect_score = 1.0
-    elif 0.55 <= aspect_ratio <= 0.85:  # Libro horizontal
-        aspect_score = 0.9
-    elif 1.0 <= aspect_ratio <= 2.0:  # Cerca de libro
-        aspect_score = 0.7
-    else:
-        aspect_score = 0.3
-
-    # Score por complejidad del contorno (más simple = mejor para libros)
-    peri = cv2.arcLength(contour, True)
-    complexity = peri / (2 * (w + h)) if (w + h) > 0 else 999
-    complexity_score = 1.0 if complexity < 1.1 else (0.5 if complexity < 1.3 else 0.2)
-
-    # Score total ponderado
-    total_score = (
-        area_score * 0.35 +           # 35% área
-        aspect_score * 0.30 +         # 30% aspecto
-        center_score * 0.20 +         # 20% posición
-        complexity_score * 0.15       # 15% complejidad
-    )
 
-    return total_score, {
-        'area_ratio': area_ratio,
-        'aspect_ratio': aspect_ratio,
-        'area_score': area_score,
-        'aspect_score': aspect_score,
-        'center_score': center_score,
-        'complexity_score': complexity_score,
-        'total_score': total_score
-    }
+def save_debug(img, report, debug_path):
+    """Guarda el overlay reducido en `debug_path` y el informe en <debug_path>.json"""
+    cv2.imwrite(debug_path, render_overlay(img, report))
+    report_path = Path(debug_path).with_suffix('.json')
+    report_path.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"\n📸 Debug guardado: {debug_path} (informe: {report_path})")
+    print(f"   Rojo grueso: Seleccionado | Naranja: Otros candidatos")
 
 
-def detect_book_cover_multi_strategy(image_path, min_area_ratio=0.1, debug=False):
+def detect_book_cover_multi_strategy(image_path, min_area_ratio=0.1, debug=False, strategies=None,
+                                     debug_path=None, adaptive=False, dedupe=None):
     """
     Detecta portada usando múltiples estrategias y elige la mejor
+
+    Args:
+        strategies: Estrategias a ejecutar, en orden. Default: DEFAULT_STRATEGIES
+        debug_path: Dónde guardar el overlay de depuración (con debug).
+            Default: <imagen>_debug.jpg junto a la entrada
+        adaptive: Sin `strategies`, ordenar y podar según el historial de
+            victorias (book_cover_telemetry)
+        dedupe: PHashIndex (book_cover_phash): reutiliza el cuadrilátero de
+            una foto casi idéntica ya procesada y anota el de esta
     """
     img = cv2.imread(image_path)
     if img is None:
         print(f"❌ Error: No se pudo leer la imagen '{image_path}'")
         return None
 
-    original = img.copy()
     height, width = img.shape[:2]
-    total_area = height * width
 
     print(f"📐 Imagen: {width}x{height} px")
 
-    if debug:
-        debug_img = original.copy()
-
-    # ESTRATEGIA 1: Detección de bordes estándar con Canny
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-
-    candidates = []
-
-    print("🔍 Estrategia 1: Detección de bordes Canny...")
-    edges1 = cv2.Canny(blurred, 30, 100)
-    kernel = np.ones((5, 5), np.uint8)
-    dilated1 = cv2.dilate(edges1, kernel, iterations=2)
-    contours1, _ = cv2.findContours(dilated1, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    for contour in sorted(contours1, key=cv2.contourArea, reverse=True)[:10]:
-        peri = cv2.arcLength(contour, True)
-        approx = cv2.approxPolyDP(contour, 0.02 * peri, True)
-        if len(approx) == 4:
-            area = cv2.contourArea(contour)
-            if area / total_area > min_area_ratio:
-                candidates.append(('Canny_standard', approx, contour))
-
-    # ESTRATEGIA 2: Detección con Canny más sensible
-    print("🔍 Estrategia 2: Canny sensible...")
-    edges2 = cv2.Canny(blurred, 50, 150)
-    dilated2 = cv2.dilate(edges2, kernel, iterations=3)
-    contours2, _ = cv2.findContours(dilated2, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    for contour in sorted(contours2, key=cv2.contourArea, reverse=True)[:10]:
-        peri = cv2.arcLength(contour, True)
-        approx = cv2.approxPolyDP(contour, 0.02 * peri, True)
-        if len(approx) == 4:
-            area = cv2.contourArea(contour)
-            if area / total_area > min_area_ratio:
-                candidates.append(('Canny_sensitive', approx, contour))
-
-    # ESTRATEGIA 3: Umbralización adaptativa
-    print("🔍 Estrategia 3: Umbralización adaptativa...")
-    thresh = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                   cv2.THRESH_BINARY_INV, 11, 2)
-    dilated3 = cv2.dilate(thresh, kernel, iterations=2)
-    contours3, _ = cv2.findContours(dilated3, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    for contour in sorted(contours3, key=cv2.contourArea, reverse=True)[:10]:
-        peri = cv2.arcLength(contour, True)
-        approx = cv2.approxPolyDP(contour, 0.02 * peri, True)
-        if len(approx) == 4:
-            area = cv2.contourArea(contour)
-            if area / total_area > min_area_ratio:
-                candidates.append(('Adaptive_thresh', approx, contour))
-
-    # ESTRATEGIA 4: Umbralización de Otsu
-    print("🔍 Estrategia 4: Umbralización Otsu...")
-    _, thresh_otsu = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-    dilated4 = cv2.dilate(thresh_otsu, kernel, iterations=2)
-    contours4, _ = cv2.findContours(dilated4, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    for contour in sorted(contours4, key=cv2.contourArea, reverse=True)[:10]:
-        peri = cv2.arcLength(contour, True)
-        approx = cv2.approxPolyDP(contour, 0.02 * peri, True)
-        if len(approx) == 4:
-            area = cv2.contourArea(contour)
-            if area / total_area > min_area_ratio:
-                candidates.append(('Otsu_thresh', approx, contour))
+    image_hash = None
+    # Con --debug se quiere ver la detección: no se reutiliza nada
+    if dedupe is not None and not debug:
+        image_hash, quad, match = dedupe.reuse(img)
+        if quad is not None:
+            print(f"♻️  Casi idéntica a {Path(match['path']).name} (distancia {match['distance']}): "
+                  f"cuadrilátero reutilizado y verificado, sin detección")
+            dedupe.remember(image_path, image_hash, (width, height), quad)
+            warped = warp_quad(img, quad)
+            print(f"📏 Dimensiones detectadas: {warped.shape[1]}x{warped.shape[0]} px")
+            return Image.fromarray(cv2.cvtColor(warped, cv2.COLOR_BGR2RGB))
+
+    full = True
+    if adaptive and not strategies:
+        strategies, full = STRATEGY_STATS.plan(DEFAULT_STRATEGIES)
+        print(f"🧠 Modo adaptativo: {', '.join(strategies)}")
+    # Las estrategias elegidas a mano no cuentan como ejecución completa
+    full = full and (not strategies or set(DEFAULT_STRATEGIES) <= set(strategies))
+
+    contour_set = ContourSet(prepare_image(img))
+    for i, strategy in enumerate(strategies or DEFAULT_STRATEGIES, 1):
+        print(f"🔍 Estrategia {i}: {STRATEGY_LABELS[strategy]}...")
+        contour_set.run(strategy)
+
+    candidates = contour_set.candidates(min_area_ratio)
+
+    if not candidates and FALLBACK_STRATEGY not in contour_set.strategies:
+        print(f"🔍 Estrategia de rescate: {STRATEGY_LABELS[FALLBACK_STRATEGY]}...")
+        contour_set.run(FALLBACK_STRATEGY)
+        candidates = contour_set.candidates(min_area_ratio)
 
     print(f"📋 Total de candidatos encontrados: {len(candidates)}")
 
     if not candidates:
         print("❌ No se encontraron contornos rectangulares")
+        # Los contornos ya están calculados: probar umbrales menores es inmediato
+        best, ratio = contour_set.sweep(min_area_ratio)
+        STRATEGY_STATS.record(contour_set.strategies, {}, None, full)
+        if best is not None:
+            print(f"💡 Con --min-area {ratio} se detectaría un candidato ({best['method']})")
+        if debug:
+            save_debug(img, contour_set.report(ratio or min_area_ratio, best),
+                       debug_path or default_debug_path(image_path))
+        if image_hash is not None:
+            dedupe.remember(image_path, image_hash, (width, height))
         return None
 
     # Evaluar todos los candidatos con el sistema de scoring
     best_score = 0
-    best_contour = None
-    best_method = ""
-    best_details = {}
+    best_candidate = None
 
     print("\n🎯 Evaluando candidatos:")
-    for i, (method, approx, contour) in enumerate(candidates):
-        score, details = score_contour(contour, total_area, width, height)
+    for i, candidate in enumerate(candidates):
+        method, approx = candidate['method'], candidate['approx']
+        score, details = candidate['score'], candidate['details']
 
         print(f"  Candidato {i+1} ({method}):")
         print(f"    Área: {details['area_ratio']:.1%}, Aspecto: {details['aspect_ratio']:.2f}")
@@ -196,67 +130,55 @@ def detect_book_cover_multi_strategy(image_path, min_area_ratio=0.1, debug=False
 
         if score > best_score:
             best_score = score
-            best_contour = approx
-            best_method = method
-            best_details = details
+            best_candidate = candidate
             print(f"    ✅ NUEVO MEJOR CANDIDATO")
 
-        # Dibujar en debug
-        if debug:
-            color = (0, 255, 0) if score == best_score else (255, 165, 0)
-            cv2.drawContours(debug_img, [approx], -1, color, 2)
-            x, y, w, h = cv2.boundingRect(approx)
-            cv2.putText(debug_img, f"#{i+1} {score:.2f}", (x, y-10),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+    STRATEGY_STATS.record(contour_set.strategies, contour_set.best_scores(min_area_ratio),
+                          best_candidate['method'] if best_candidate else None, full)
 
-    if best_contour is None:
+    # El overlay se dibuja al final, reducido, y solo con --debug
+    if debug:
+        save_debug(img, contour_set.report(min_area_ratio, best_candidate),
+                   debug_path or default_debug_path(image_path))
+
+    if best_candidate is None:
         print("❌ No se encontró un candidato adecuado")
         return None
 
+    best_contour = best_candidate['approx']
+    best_method = best_candidate['method']
+    best_details = best_candidate['details']
+
     print(f"\n✅ Portada detectada con método: {best_method}")
     print(f"   Score: {best_score:.3f}")
     print(f"   Área: {best_details['area_ratio']:.1%}")
     print(f"   Aspecto: {best_details['aspect_ratio']:.2f}")
 
-    # Guardar debug
-    if debug:
-        cv2.drawContours(debug_img, [best_contour], -1, (0, 0, 255), 5)
-        debug_path = str(Path(image_path).parent / 'debug_deteccion_v2.jpg')
-        cv2.imwrite(debug_path, debug_img)
-        print(f"\n📸 Debug guardado: {debug_path}")
-        print(f"   Verde: Mejor candidato | Naranja: Otros | Rojo grueso: Seleccionado")
+    if image_hash is not None:
+        dedupe.remember(image_path, image_hash, (width, height), best_contour)
 
     # Extraer y enderezar la portada
-    pts = best_contour.reshape(4, 2)
-    rect = order_points(pts)
+    warped = warp_quad(img, best_contour)
+    print(f"📏 Dimensiones detectadas: {warped.shape[1]}x{warped.shape[0]} px")
 
-    (tl, tr, br, bl) = rect
-    widthA = np.linalg.norm(br - bl)
-    widthB = np.linalg.norm(tr - tl)
-    maxWidth = max(int(widthA), int(widthB))
-
-    heightA = np.linalg.norm(tr - br)
-    heightB = np.linalg.norm(tl - bl)
-    maxHeight = max(int(heightA), int(heightB))
-
-    print(f"📏 Dimensiones detectadas: {maxWidth}x{maxHeight} px")
+    warped_rgb = cv2.cvtColor(warped, cv2.COLOR_BGR2RGB)
+    return Image.fromarray(warped_rgb)
 
-    dst = np.array([
-        [0, 0],
-        [maxWidth - 1, 0],
-        [maxWidth - 1, maxHeight - 1],
-        [0, maxHeight - 1]
-    ], dtype="float32")
 
-    M = cv2.getPerspectiveTransform(rect, dst)
-    warped = cv2.warpPerspective(original, M, (maxWidth, maxHeight))
+def process_cover(input_path, output_path, bg_color="#FFFFFF", canvas_size=(1920, 1080), min_area=0.1, debug=False,
+                  strategies=None, renditions=None, debug_path=None, adaptive=False, dedupe=None):
+    """
+    Detecta portada, la recorta y la coloca en un lienzo
 
-    warped_rgb = cv2.cvtColor(warped, cv2.COLOR_BGR2RGB)
-    return Image.fromarray(warped_rgb)
+    Con `renditions` (p. ej. ['slide', 'thumb']) se generan todas a partir de
+    la misma detección, como salida_slide.png, salida_thumb.jpg...
 
+    Con `debug` (o `debug_path`) se guarda el overlay de candidatos reducido
+    y el informe JSON; por defecto como <salida>_debug.jpg / .json.
 
-def process_cover(input_path, output_path, bg_color="#FFFFFF", canvas_size=(1920, 1080), min_area=0.1, debug=False):
-    """Detecta portada, la recorta y la coloca en un lienzo"""
+    Con `dedupe` (PHashIndex) las fotos casi idénticas a otra ya procesada
+    reutilizan su cuadrilátero (ver book_cover_phash).
+    """
 
     print(f"📖 Procesando: {Path(input_path).name}\n")
 
@@ -265,7 +187,11 @@ def process_cover(input_path, output_path, bg_color="#FFFFFF", canvas_size=(1920
         sys.exit(1)
 
     try:
-        cover_img = detect_book_cover_multi_strategy(input_path, min_area_ratio=min_area, debug=debug)
+        if debug or debug_path:
+            debug, debug_path = True, debug_path or default_debug_path(output_path)
+        cover_img = detect_book_cover_multi_strategy(input_path, min_area_ratio=min_area, debug=debug,
+                                                     strategies=strategies, debug_path=debug_path,
+                                                     adaptive=adaptive, dedupe=dedupe)
 
         if cover_img is None:
             print("\n❌ No se pudo detectar la portada")
@@ -275,54 +201,7 @@ def process_cover(input_path, output_path, bg_color="#FFFFFF", canvas_size=(1920
             print("   • Usa --debug para ver qué está detectando")
             sys.exit(1)
 
-        # Convertir color de fondo
-        try:
-            if bg_color.startswith('#'):
-                hex_color = bg_color.lstrip('#')
-                rgb_color = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-            else:
-                color_map = {
-                    'white': (255, 255, 255), 'black': (0, 0, 0),
-                    'red': (255, 87, 34), 'blue': (33, 150, 243),
-                    'green': (76, 175, 80), 'yellow': (255, 193, 7),
-                }
-                rgb_color = color_map.get(bg_color.lower(), (255, 255, 255))
-        except:
-            rgb_color = (255, 255, 255)
-
-        # Crear lienzo
-        print(f"\n🎨 Creando lienzo {canvas_size[0]}x{canvas_size[1]} con color {bg_color}...")
-        canvas = Image.new('RGB', canvas_size, rgb_color)
-
-        # Escalar portada al 80% del alto del lienzo
-        canvas_width, canvas_height = canvas.size
-        cover_width, cover_height = cover_img.size
-
-        target_height = int(canvas_height * 0.8)
-        scale_ratio = target_height / cover_height
-        new_width = int(cover_width * scale_ratio)
-        new_height = target_height
-
-        if new_width > canvas_width * 0.9:
-            target_width = int(canvas_width * 0.9)
-            scale_ratio = target_width / cover_width
-            new_width = target_width
-            new_height = int(cover_height * scale_ratio)
-
-        print(f"📐 Escalando de {cover_width}x{cover_height} a {new_width}x{new_height} ({int(scale_ratio*100)}%)")
-        cover_img = cover_img.resize((new_width, new_height), Image.LANCZOS)
-
-        # Centrar
-        x = (canvas_width - new_width) // 2
-        y = (canvas_height - new_height) // 2
-        canvas.paste(cover_img, (x, y))
-
-        # Guardar
-        canvas.save(output_path, quality=95)
-
-        print(f"\n✅ ¡Completado! Guardado en: {output_path}")
-        print(f"   Lienzo: {canvas_size[0]}x{canvas_size[1]} px")
-        print(f"   Portada: {new_width}x{new_height} px (escalada al 80%)")
+        save_cover(cover_img, output_path, bg_color, canvas_size, renditions)
 
     except Exception as e:
         print(f"\n❌ Error: {str(e)}")
@@ -331,6 +210,48 @@ def process_cover(input_path, output_path, bg_color="#FFFFFF", canvas_size=(1920
         sys.exit(1)
 
 
+def save_cover(cover_img, output_path, bg_color="#FFFFFF", canvas_size=(1920, 1080), renditions=None):
+    """Coloca la portada ya recortada (PIL) en el lienzo y guarda la salida o las renditions"""
+    rgb_color = parse_color(bg_color)
+
+    if renditions:
+        print(f"\n🖼️  Generando renditions: {', '.join(renditions)}")
+        for name, path, rendition in save_renditions(cover_img, output_path, renditions, rgb_color,
+                                                     canvas_size):
+            width, height = rendition['size']
+            print(f"   • {name}: {path} ({width}x{height} px)")
+        print("\n✅ ¡Completado!")
+        return
+
+    # Lienzo de impresión: nunca entero en memoria
+    if use_strips(canvas_size) and Path(output_path).suffix.lower() == '.png':
+        print(f"\n🧱 Lienzo {canvas_size[0]}x{canvas_size[1]}: composición y codificación por franjas...")
+        new_width, new_height = save_canvas_strips(cover_img, output_path, canvas_size, rgb_color)
+        print(f"\n✅ ¡Completado! Guardado en: {output_path}")
+        print(f"   Portada: {new_width}x{new_height} px")
+        return
+
+    # Crear lienzo
+    print(f"\n🎨 Creando lienzo {canvas_size[0]}x{canvas_size[1]} con color {bg_color}...")
+
+    # Escalar portada al 80% del alto del lienzo (90% del ancho como máximo)
+    cover_width, cover_height = cover_img.size
+    new_width, new_height, scale_ratio = fit_cover(cover_img.size, canvas_size)
+
+    print(f"📐 Escalando de {cover_width}x{cover_height} a {new_width}x{new_height} ({int(scale_ratio*100)}%)")
+    cover_img = cover_img.resize((new_width, new_height), Image.LANCZOS)
+
+    # Centrar
+    canvas = paste_centered(cover_img, canvas_size, rgb_color)
+
+    # Guardar
+    canvas.save(output_path, quality=95)
+
+    print(f"\n✅ ¡Completado! Guardado en: {output_path}")
+    print(f"   Lienzo: {canvas_size[0]}x{canvas_size[1]} px")
+    print(f"   Portada: {new_width}x{new_height} px (escalada al 80%)")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='🚀 DETECTOR MEJORADO de portadas - Múltiples estrategias de detección',
@@ -363,10 +284,14 @@ Mejoras en V2:
                        help='Área mínima (0.1 = 10%%). Default: 0.1')
     parser.add_argument('--debug', action='store_true',
                        help='Modo debug: muestra todos los candidatos y scores')
+    parser.add_argument('--debug-path', metavar='RUTA',
+                       help='Dónde guardar el overlay de depuración (implica --debug). '
+                            'Default: <salida>_debug.jpg')
 
     args = parser.parse_args()
 
-    process_cover(args.input, args.output, args.color, tuple(args.size), args.min_area, args.debug)
+    process_cover(args.input, args.output, args.color, tuple(args.size), args.min_area, args.debug,
+                  debug_path=args.debug_path)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,237 @@
+"""
+Daemon local de BookEditor
+Mantiene un pool de procesos con OpenCV ya cargado escuchando en un socket
+Unix, para que los scripts de shell no paguen el arranque del intérprete y
+la importación de cv2 en cada imagen.
+
+Protocolo: una línea JSON por conexión
+    petición:  {"argv": ["detect", "foto.jpg", "out.png"], "cwd": "/ruta"}
+    respuesta: {"code": 0, "output": "..."}
+
+Un trabajo que pasa de JOB_TIMEOUT segundos (BOOKEDITOR_DAEMON_TIMEOUT) se
+da por fallido: el worker se mata con SIGALRM, también si está bloqueado en
+código nativo, y el pool lo sustituye. Un worker que muere (crash nativo,
+OOM killer) tampoco deja colgada la conexión.
+"""
+
+import json
+import math
+import multiprocessing
+import os
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+
+
+# Subcomandos que el daemon acepta ejecutar
+DAEMON_COMMANDS = ('digital', 'detect', 'auto', 'batch')
+
+# Tiempo máximo por trabajo (un batch de una carpeta grande puede necesitar más)
+JOB_TIMEOUT = float(os.environ.get('BOOKEDITOR_DAEMON_TIMEOUT', 600))
+
+# Margen del proceso principal y del cliente sobre JOB_TIMEOUT: el worker
+# muere antes y la respuesta de error llega a tiempo
+REPLY_GRACE = 10.0
+
+# Espera máxima del cliente para conectar y enviar la petición
+CONNECT_TIMEOUT = 5.0
+
+
+def default_socket_path():
+    """Ruta del socket: $BOOKEDITOR_SOCKET, o por usuario en el directorio de runtime"""
+    path = os.environ.get('BOOKEDITOR_SOCKET')
+    if path:
+        return path
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(runtime_dir, f'bookeditor-{os.getuid()}.sock')
+
+
+def _warm_worker():
+    """Inicializador del pool: carga las dependencias pesadas una sola vez"""
+    import book_cover_cli_v2  # noqa: F401  (cv2, numpy, PIL)
+    import book_cover_simple  # noqa: F401
+    from book_cover_threads import apply_worker_threads
+
+    apply_worker_threads()
+
+
+def _run_job(argv, cwd):
+    from book_cover import run_captured
+
+    return run_captured(argv, cwd=cwd)
+
+
+def _job(argv, cwd, timeout):
+    """_run_job() con alarma: SIGALRM con la acción por defecto termina el worker"""
+    signal.signal(signal.SIGALRM, signal.SIG_DFL)
+    signal.alarm(max(1, math.ceil(timeout)))
+    try:
+        return _run_job(argv, cwd)
+    finally:
+        signal.alarm(0)
+
+
+def _recv_line(sock):
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        if chunk.endswith(b'\n'):
+            break
+    return b''.join(chunks)
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            self._reply({'code': 2, 'output': '❌ Petición no válida\n'})
+            return
+
+        if request.get('ping'):
+            self._reply({'code': 0, 'workers': self.server.workers, 'jobs': self.server.jobs})
+            return
+
+        argv = request.get('argv') or []
+        if not argv or argv[0] not in DAEMON_COMMANDS:
+            self._reply({'code': 2, 'output': f"❌ Comando no admitido por el daemon: {argv[:1]}\n"})
+            return
+
+        # apply() esperaría para siempre si el worker muere: el pool lo
+        # sustituye, pero el trabajo se pierde sin respuesta
+        job = self.server.pool.apply_async(_job, (argv, request.get('cwd'), self.server.job_timeout))
+        try:
+            code, output = job.get(self.server.job_timeout + REPLY_GRACE)
+        except multiprocessing.TimeoutError:
+            code, output = 1, (f"❌ El trabajo no terminó en {self.server.job_timeout:.0f}s "
+                               f"(o el worker murió): {' '.join(argv)}\n")
+        except Exception as e:
+            code, output = 1, f"❌ Error en el worker: {type(e).__name__}: {e}\n"
+        with self.server.lock:
+            self.server.jobs += 1
+        self._reply({'code': code, 'output': output})
+
+    def _reply(self, payload):
+        self.wfile.write(json.dumps(payload).encode('utf-8') + b'\n')
+
+
+class CoverDaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, workers, job_timeout=JOB_TIMEOUT):
+        self.workers = workers
+        self.job_timeout = job_timeout
+        self.jobs = 0
+        self.lock = threading.Lock()
+        self.pool = multiprocessing.Pool(processes=workers, initializer=_warm_worker,
+                                         maxtasksperchild=500)
+        # El socket nace ya con 0600: con chmod() después de bind() habría un
+        # instante en que otros usuarios podrían conectarse
+        umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, _JobHandler)
+        finally:
+            os.umask(umask)
+
+
+def daemon_running(socket_path):
+    """True si hay un daemon escuchando en el socket"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(1.0)
+            sock.connect(socket_path)
+            sock.sendall(b'{"ping": true}\n')
+            return bool(_recv_line(sock))
+    except OSError:
+        return False
+
+
+def serve(socket_path=None, workers=None):
+    """Arranca el daemon y atiende peticiones hasta Ctrl+C / SIGTERM"""
+    socket_path = socket_path or default_socket_path()
+    from book_cover_threads import available_cpus, configure
+
+    workers = workers or available_cpus()
+
+    if os.path.exists(socket_path):
+        if daemon_running(socket_path):
+            print(f"❌ Ya hay un daemon escuchando en {socket_path}")
+            return 1
+        os.unlink(socket_path)  # socket huérfano de una ejecución anterior
+
+    configure(workers, 'daemon')
+    server = CoverDaemonServer(socket_path, workers)
+
+    print(f"🚀 Daemon de BookEditor escuchando en {socket_path}")
+    print(f"   Workers: {workers}")
+    print("⏹️  Presiona Ctrl+C para detener")
+
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.pool.terminate()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        print("\n👋 Daemon detenido")
+    return 0
+
+
+def submit(argv, socket_path=None, timeout=JOB_TIMEOUT + 2 * REPLY_GRACE):
+    """
+    Envía un trabajo al daemon
+
+    Args:
+        timeout: Espera máxima por la respuesta, en segundos
+
+    Returns:
+        (code, output), o None si no hay daemon disponible
+    """
+    socket_path = socket_path or default_socket_path()
+    request = {'argv': list(argv), 'cwd': os.getcwd()}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(socket_path)
+            sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        except OSError:
+            return None  # sin daemon (o no acepta): se procesa localmente
+
+        # Enviado: el daemon puede estar procesándolo, no se repite en local
+        try:
+            sock.settimeout(timeout)
+            response = _recv_line(sock)
+        except socket.timeout:
+            return 1, f"❌ El daemon no respondió en {timeout:.0f}s\n"
+        except (ConnectionResetError, BrokenPipeError):
+            return 1, "❌ El daemon cerró la conexión sin responder\n"
+
+    if not response:
+        return 1, "❌ El daemon cerró la conexión sin responder\n"
+    reply = json.loads(response)
+    return reply['code'], reply.get('output', '')
+
+
+def run_client(argv, socket_path=None):
+    """Ejecuta `argv` en el daemon o, si no está corriendo, en este mismo proceso"""
+    result = submit(argv, socket_path)
+    if result is None:
+        from book_cover import main
+        try:
+            return main(argv) or 0
+        except SystemExit as e:
+            return e.code if isinstance(e.code, int) else 1
+
+    code, output = result
+    sys.stdout.write(output)
+    return code
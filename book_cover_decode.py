@@ -0,0 +1,167 @@
+"""
+Decodificación con presupuesto de píxeles
+
+Un PNG de 16 MB muy comprimible puede ocupar gigapíxeles al decodificarlo.
+Antes de decodificar se leen las dimensiones de la cabecera (JPEG: marcador
+SOF, PNG: IHDR, el resto con Pillow sin cargar píxeles) y se aplica el
+presupuesto de megapíxeles:
+
+    • dentro del presupuesto: decodificación normal
+    • JPEG por encima: se decodifica directamente a 1/2, 1/4 o 1/8 (escalado
+      DCT del decodificador, sin pasar por la imagen completa)
+    • resto de formatos, o JPEG que ni a 1/8 cabe: se rechaza (ImageTooLarge)
+
+Leer la cabecera cuesta microsegundos: se puede hacer en cada petición. El
+módulo no carga OpenCV hasta decodificar (book_cover_simple solo usa Pillow).
+
+Variable de entorno: BOOKEDITOR_MAX_MEGAPIXELS (50 por defecto; 0 = sin límite)
+"""
+
+import math
+import os
+import struct
+import warnings
+
+
+MAX_MEGAPIXELS = float(os.environ.get('BOOKEDITOR_MAX_MEGAPIXELS', 50))
+
+# Reducciones que el decodificador JPEG hace durante la DCT (1/2, 1/4, 1/8)
+REDUCTIONS = (2, 4, 8)
+MAX_REDUCTION = REDUCTIONS[-1]
+
+# Marcadores SOF (inicio de frame) con las dimensiones; C4, C8 y CC son otra cosa
+_JPEG_SOF = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+class ImageTooLarge(ValueError):
+    """La imagen supera el presupuesto de píxeles y no se puede reducir al decodificar"""
+
+
+def sniff_format(image_data):
+    """Formato a partir de la firma del archivo: 'jpeg', 'png', 'webp', 'gif' o None"""
+    if image_data[:3] == b'\xff\xd8\xff':
+        return 'jpeg'
+    if image_data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    if image_data[:4] == b'RIFF' and image_data[8:12] == b'WEBP':
+        return 'webp'
+    if image_data[:4] == b'GIF8':
+        return 'gif'
+    return None
+
+
+def _jpeg_size(image_data):
+    i = 2
+    while i + 9 <= len(image_data):
+        if image_data[i] != 0xFF:
+            return None
+        marker = image_data[i + 1]
+        if marker == 0xFF:  # relleno
+            i += 1
+            continue
+        if marker in _JPEG_SOF:
+            height, width = struct.unpack('>HH', image_data[i + 5:i + 9])
+            return width, height
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # sin longitud
+            i += 2
+            continue
+        i += 2 + struct.unpack('>H', image_data[i + 2:i + 4])[0]
+    return None
+
+
+def header_size(image_data):
+    """(ancho, alto) de la cabecera sin decodificar píxeles, o None si no se entiende"""
+    kind = sniff_format(image_data)
+    if kind == 'jpeg':
+        return _jpeg_size(image_data)
+    if kind == 'png':
+        return struct.unpack('>II', image_data[16:24]) if len(image_data) >= 24 else None
+
+    import io
+    from PIL import Image
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            return Image.open(io.BytesIO(image_data)).size
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e))
+    except Exception:
+        return None
+
+
+def reduction_factor(size, kind, max_megapixels=None):
+    """
+    Factor de reducción (1, 2, 4 u 8) para que `size` quepa en el presupuesto
+
+    Raises:
+        ImageTooLarge: No cabe ni reduciendo (o el formato no se puede reducir)
+    """
+    budget = MAX_MEGAPIXELS if max_megapixels is None else max_megapixels
+    megapixels = size[0] * size[1] / 1e6
+    if not budget or megapixels <= budget:
+        return 1
+    if kind == 'jpeg':
+        for factor in REDUCTIONS:
+            if megapixels / (factor * factor) <= budget:
+                return factor
+    raise ImageTooLarge(f"Imagen demasiado grande: {size[0]}x{size[1]} ({megapixels:.0f} MP, "
+                        f"máximo {budget:g} MP)")
+
+
+def check_pixel_budget(image_data, max_megapixels=None):
+    """Factor con el que se decodificará `image_data` (ImageTooLarge si no cabe)"""
+    size = header_size(image_data)
+    if size is None:
+        return 1  # cabecera desconocida: decide cv2 (que tiene su propio límite)
+    return reduction_factor(size, sniff_format(image_data), max_megapixels)
+
+
+def decode_image(image_data, max_megapixels=None):
+    """
+    cv2.imdecode() dentro del presupuesto de píxeles
+
+    Returns:
+        (array BGR, factor de reducción aplicado)
+
+    Raises:
+        ImageTooLarge: Supera el presupuesto y no se puede reducir
+        ValueError: No se pudo leer la imagen
+    """
+    import cv2
+    import numpy as np
+
+    factor = check_pixel_budget(image_data, max_megapixels)
+    flags = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+             4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+    img = cv2.imdecode(np.frombuffer(image_data, np.uint8), flags[factor])
+    if img is None:
+        raise ValueError("No se pudo leer la imagen")
+    return img, factor
+
+
+def open_image(path, max_megapixels=None):
+    """
+    Image.open() de Pillow con el mismo presupuesto
+
+    Pillow rechaza por sí mismo (DecompressionBombError) lo que ni reducido a
+    1/8 cabría; los JPEG grandes se cargan reducidos con draft().
+
+    Returns:
+        (imagen PIL sin cargar aún, factor de reducción)
+    """
+    from PIL import Image
+
+    budget = MAX_MEGAPIXELS if max_megapixels is None else max_megapixels
+    Image.MAX_IMAGE_PIXELS = int(budget * 1e6 * MAX_REDUCTION ** 2) if budget else None
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            img = Image.open(path)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e))
+
+    factor = reduction_factor(img.size, 'jpeg' if img.format == 'JPEG' else img.format, budget)
+    if factor > 1:
+        img.draft('RGB', (math.ceil(img.size[0] / factor), math.ceil(img.size[1] / factor)))
+    return img, factor
@@ -0,0 +1,652 @@
+"""
+Núcleo de detección de portadas compartido por la CLI v2 y la web
+
+Cada estrategia (Canny, umbralizaciones...) se ejecuta una sola vez y sus
+contornos se guardan con el área y el polígono aproximado ya calculados.
+Cambiar el área mínima solo vuelve a filtrar esa lista: no repite Canny,
+dilate ni findContours.
+"""
+
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+# Contornos más grandes que se conservan por estrategia
+TOP_CONTOURS = 10
+
+DEFAULT_STRATEGIES = ('Canny_standard', 'Canny_sensitive', 'Adaptive_thresh', 'Otsu_thresh')
+
+# Estrategias opcionales: se activan pasándolas explícitamente
+EXTRA_STRATEGIES = ('Canny_auto', 'Lines')
+
+# Estrategia de rescate cuando las de contornos no encuentran nada
+FALLBACK_STRATEGY = 'Lines'
+
+# Umbrales de área que se prueban automáticamente (por debajo del pedido)
+# antes de dar la imagen por "sin portada"
+MIN_AREA_SWEEP = (0.3, 0.2, 0.1, 0.05, 0.03)
+
+# Lado máximo de la imagen de depuración (se dibuja sobre una copia reducida)
+DEBUG_MAX_SIDE = 1024
+
+_KERNEL = np.ones((5, 5), np.uint8)
+
+
+def order_points(pts):
+    """Ordena puntos en: top-left, top-right, bottom-right, bottom-left"""
+    rect = np.zeros((4, 2), dtype="float32")
+    s = pts.sum(axis=1)
+    rect[0] = pts[np.argmin(s)]
+    rect[2] = pts[np.argmax(s)]
+    diff = np.diff(pts, axis=1)
+    rect[1] = pts[np.argmin(diff)]
+    rect[3] = pts[np.argmax(diff)]
+    return rect
+
+
+def score_contour(contour, total_area, img_width, img_height):
+    """
+    Calcula un score para determinar qué tan probable es que sea una portada
+    Mayor score = más probable que sea la portada
+    """
+    area = cv2.contourArea(contour)
+    area_ratio = area / total_area
+
+    # Calcular bounding rect
+    x, y, w, h = cv2.boundingRect(contour)
+    aspect_ratio = h / w if w > 0 else 0
+
+    # Calcular posición relativa (centrado es mejor)
+    center_x = x + w/2
+    center_y = y + h/2
+    img_center_x = img_width / 2
+    img_center_y = img_height / 2
+
+    # Distancia al centro (normalizada)
+    center_dist = np.sqrt((center_x - img_center_x)**2 + (center_y - img_center_y)**2)
+    max_dist = np.sqrt(img_center_x**2 + img_center_y**2)
+    center_score = 1 - (center_dist / max_dist)
+
+    # Score por área (más grande es mejor, pero con límite)
+    # Penalizar contornos muy grandes (>95%) que probablemente sean el fondo
+    if area_ratio > 0.95:
+        area_score = 0.3  # Penalización fuerte para fondos
+    elif area_ratio > 0.85:
+        area_score = 0.6  # Penalización media
+    else:
+        area_score = min(area_ratio / 0.5, 1.0)  # Óptimo: 50% de la imagen
+
+    # Score por aspecto (libros típicos: 1.3-1.6)
+    aspect_score = 0
+    if 1.2 <= aspect_ratio <= 1.8:  # Libro vertical
+        aspect_score = 1.0
+    elif 0.55 <= aspect_ratio <= 0.85:  # Libro horizontal
+        aspect_score = 0.9
+    elif 1.0 <= aspect_ratio <= 2.0:  # Cerca de libro
+        aspect_score = 0.7
+    else:
+        aspect_score = 0.3
+
+    # Score por complejidad del contorno (más simple = mejor para libros)
+    peri = cv2.arcLength(contour, True)
+    complexity = peri / (2 * (w + h)) if (w + h) > 0 else 999
+    complexity_score = 1.0 if complexity < 1.1 else (0.5 if complexity < 1.3 else 0.2)
+
+    # Score total ponderado
+    total_score = (
+        area_score * 0.35 +           # 35% área
+        aspect_score * 0.30 +         # 30% aspecto
+        center_score * 0.20 +         # 20% posición
+        complexity_score * 0.15       # 15% complejidad
+    )
+
+    return total_score, {
+        'area_ratio': area_ratio,
+        'aspect_ratio': aspect_ratio,
+        'area_score': area_score,
+        'aspect_score': aspect_score,
+        'center_score': center_score,
+        'complexity_score': complexity_score,
+        'total_score': total_score
+    }
+
+
+def prepare_image(img):
+    """Escala de grises + desenfoque: la entrada común de todas las estrategias"""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return cv2.GaussianBlur(gray, (5, 5), 0)
+
+
+# Cada estrategia devuelve (imagen binaria, iteraciones de dilatación).
+# Las estrategias Canny comparten los gradientes Sobel de ContourSet: cada
+# par de umbrales solo paga la supresión de no-máximos y la histéresis.
+
+def _canny_standard(contour_set):
+    dx, dy = contour_set.gradients()
+    return cv2.Canny(dx, dy, 30, 100), 2
+
+
+def _canny_sensitive(contour_set):
+    dx, dy = contour_set.gradients()
+    return cv2.Canny(dx, dy, 50, 150), 3
+
+
+def _canny_auto(contour_set, sigma=0.33):
+    """Umbrales derivados de la mediana de intensidad de la imagen"""
+    median = float(np.median(contour_set.blurred))
+    lower = int(max(0, (1.0 - sigma) * median))
+    upper = int(min(255, (1.0 + sigma) * median))
+    dx, dy = contour_set.gradients()
+    return cv2.Canny(dx, dy, lower, upper), 2
+
+
+def _adaptive_thresh(contour_set):
+    thresh = cv2.adaptiveThreshold(contour_set.blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                   cv2.THRESH_BINARY_INV, 11, 2)
+    return thresh, 2
+
+
+def _otsu_thresh(contour_set):
+    _, thresh = cv2.threshold(contour_set.blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return thresh, 2
+
+
+# -- Estrategia por segmentos de línea ----------------------------------------
+# En lugar de contornos cerrados busca segmentos rectos en un mapa de bordes de
+# baja resolución y construye cuadriláteros cruzando dos líneas horizontales con
+# dos verticales. Los bordes del encuadre cuentan como líneas virtuales, así
+# que recupera portadas que tocan el borde de la foto o cuyo contorno se corta
+# por una sombra.
+
+LINES_MAX_SIDE = 512          # resolución de trabajo
+LINES_PER_FAMILY = 6          # líneas más largas por familia (+ bordes del encuadre)
+LINES_MIN_SUPPORT = 0.65      # fracción del lado que debe coincidir con bordes
+LINES_THETA_STEPS = 360       # medio grado: con uno, los lados girados ~0.5° caen entre
+                              # dos celdas del acumulador y HoughLinesP los pierde
+LINES_FRAME_STRETCH = 0.2     # tramo de los lados contiguos a un borde del encuadre que se verifica
+
+# Lados contiguos a cada lado (top, right, bottom, left) como
+# (lado, esquina sobre él, esquina opuesta), con las esquinas en el orden del quad
+_FRAME_NEIGHBOURS = (
+    ((3, 0, 3), (1, 1, 2)),
+    ((0, 1, 0), (2, 2, 3)),
+    ((1, 2, 1), (3, 3, 0)),
+    ((2, 3, 2), (0, 0, 1)),
+)
+
+
+def _line_through(x1, y1, x2, y2):
+    """Recta a·x + b·y = c que pasa por dos puntos, como (a, b, c)"""
+    x1, y1, x2, y2 = float(x1), float(y1), float(x2), float(y2)
+    a, b = y2 - y1, x1 - x2
+    return a, b, a * x1 + b * y1
+
+
+def _intersect(l1, l2):
+    det = l1[0] * l2[1] - l2[0] * l1[1]
+    if abs(det) < 1e-9:
+        return None
+    return (l1[2] * l2[1] - l2[2] * l1[1]) / det, (l1[0] * l2[2] - l2[0] * l1[2]) / det
+
+
+def _pick_lines(segments, span):
+    """
+    Elige las líneas más largas de una familia, descartando casi duplicados
+
+    Args:
+        segments: Lista de (longitud, posición media, recta); la posición es
+                  la y media para horizontales y la x media para verticales
+        span: Alto o ancho de la imagen, para la tolerancia de duplicados
+
+    Los segmentos casi colineales con una línea ya elegida (la misma arista
+    cortada por un objeto o una sombra) se descartan.
+    """
+    picked = []
+    for segment in sorted(segments, key=lambda item: item[0], reverse=True):
+        if any(abs(segment[1] - other[1]) <= span * 0.02 for other in picked):
+            continue
+        if len(picked) < LINES_PER_FAMILY:
+            picked.append(segment)
+    return picked
+
+
+def _side_support(edges, p1, p2, samples=24):
+    """Fracción de puntos del segmento p1-p2 que caen sobre un borde"""
+    h, w = edges.shape[:2]
+    t = np.linspace(0.05, 0.95, samples)
+    xs = np.clip(np.round(p1[0] + (p2[0] - p1[0]) * t).astype(int), 0, w - 1)
+    ys = np.clip(np.round(p1[1] + (p2[1] - p1[1]) * t).astype(int), 0, h - 1)
+    return float(np.count_nonzero(edges[ys, xs])) / samples
+
+
+def _reaches_frame(edges, corner, other):
+    """
+    True si el lado corner→other tiene bordes hasta la esquina sobre el encuadre
+
+    Se mide en el mapa de bordes y no con la extensión de los segmentos:
+    HoughLinesP corta los lados algo inclinados en trozos que se quedan
+    decenas de píxeles antes del marco aunque el borde llegue hasta él.
+    """
+    end = corner + (other - corner) * LINES_FRAME_STRETCH
+    return _side_support(edges, corner, end, samples=12) >= LINES_MIN_SUPPORT
+
+
+def _line_quads(contour_set):
+    """Cuadriláteros (en coordenadas de la imagen completa) a partir de segmentos"""
+    blurred = contour_set.blurred
+    height, width = blurred.shape[:2]
+    scale = min(1.0, LINES_MAX_SIDE / max(height, width))
+    # La imagen ya está desenfocada: INTER_LINEAR basta y es más barato que INTER_AREA
+    small = cv2.resize(blurred, (max(1, int(width * scale)), max(1, int(height * scale))),
+                       interpolation=cv2.INTER_LINEAR) if scale < 1.0 else blurred
+    sh, sw = small.shape[:2]
+
+    edges = cv2.Canny(small, 50, 150)
+    min_length = min(sh, sw) * 0.15
+    segments = cv2.HoughLinesP(edges, 1, np.pi / LINES_THETA_STEPS, threshold=40,
+                               minLineLength=min_length, maxLineGap=10)
+
+    horizontal, vertical = [], []
+    for x1, y1, x2, y2 in (segments.reshape(-1, 4) if segments is not None else []):
+        angle = abs(np.degrees(np.arctan2(y2 - y1, x2 - x1))) % 180
+        length = float(np.hypot(x2 - x1, y2 - y1))
+        line = _line_through(x1, y1, x2, y2)
+        if angle < 25 or angle > 155:
+            horizontal.append((length, (y1 + y2) / 2.0, line))
+        elif 65 < angle < 115:
+            vertical.append((length, (x1 + x2) / 2.0, line))
+
+    horizontal = _pick_lines(horizontal, sh)
+    vertical = _pick_lines(vertical, sw)
+
+    # Bordes del encuadre como líneas virtuales (marcadas con longitud None)
+    horizontal += [(None, 0.0, _line_through(0, 0, sw - 1, 0)),
+                   (None, sh - 1.0, _line_through(0, sh - 1, sw - 1, sh - 1))]
+    vertical += [(None, 0.0, _line_through(0, 0, 0, sh - 1)),
+                 (None, sw - 1.0, _line_through(sw - 1, 0, sw - 1, sh - 1))]
+
+    support_edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    # Junto al encuadre la recta está extrapolada: se admite algo más de desvío
+    frame_edges = cv2.dilate(edges, np.ones((5, 5), np.uint8))
+    small_area = float(sh * sw)
+    hypotheses = []
+
+    by_position = lambda item: item[1]  # noqa: E731
+    tolerance = 0.02 * max(sh, sw)
+
+    for i, line_a in enumerate(horizontal):
+        for line_b in horizontal[i + 1:]:
+            if abs(line_a[1] - line_b[1]) < sh * 0.2:
+                continue
+            top, bottom = sorted((line_a, line_b), key=by_position)
+            for j, line_c in enumerate(vertical):
+                for line_d in vertical[j + 1:]:
+                    if abs(line_c[1] - line_d[1]) < sw * 0.2:
+                        continue
+                    left, right = sorted((line_c, line_d), key=by_position)
+
+                    corners = [_intersect(top[2], left[2]), _intersect(top[2], right[2]),
+                               _intersect(bottom[2], right[2]), _intersect(bottom[2], left[2])]
+                    if any(c is None for c in corners):
+                        continue
+                    quad = np.array(corners, dtype=np.float32)
+                    if (quad[:, 0].min() < -tolerance or quad[:, 1].min() < -tolerance or
+                            quad[:, 0].max() > sw - 1 + tolerance or quad[:, 1].max() > sh - 1 + tolerance):
+                        continue
+                    quad[:, 0] = np.clip(quad[:, 0], 0, sw - 1)
+                    quad[:, 1] = np.clip(quad[:, 1], 0, sh - 1)
+                    if not cv2.isContourConvex(quad.reshape(-1, 1, 2)):
+                        continue
+                    if cv2.contourArea(quad) / small_area < 0.02:
+                        continue
+
+                    # Los lados reales deben apoyarse en bordes; los virtuales no
+                    sides = [(top[0], quad[0], quad[1]), (right[0], quad[1], quad[2]),
+                             (bottom[0], quad[2], quad[3]), (left[0], quad[3], quad[0])]
+                    real_sides = [(p1, p2) for length, p1, p2 in sides if length is not None]
+                    if len(real_sides) < 2:
+                        continue
+                    if any(_side_support(support_edges, p1, p2) < LINES_MIN_SUPPORT
+                           for p1, p2 in real_sides):
+                        continue
+
+                    # Un borde del encuadre solo cierra la portada si los lados
+                    # reales contiguos llegan hasta él (la portada sale de la foto)
+                    if any(sides[side][0] is None and sides[neighbour][0] is not None and
+                           not _reaches_frame(frame_edges, quad[corner], quad[other])
+                           for side, neighbours in enumerate(_FRAME_NEIGHBOURS)
+                           for neighbour, corner, other in neighbours):
+                        continue
+
+                    score, _ = score_contour(quad.reshape(-1, 1, 2), small_area, sw, sh)
+                    hypotheses.append((score, quad))
+
+    hypotheses.sort(key=lambda item: item[0], reverse=True)
+    return [np.round(quad / scale).astype(np.int32).reshape(4, 1, 2)
+            for _, quad in hypotheses[:TOP_CONTOURS]]
+
+
+# Estrategias que producen cuadriláteros directamente, sin findContours
+QUAD_STRATEGIES = {
+    'Lines': _line_quads,
+}
+
+
+STRATEGY_FUNCS = {
+    'Canny_standard': _canny_standard,
+    'Canny_sensitive': _canny_sensitive,
+    'Canny_auto': _canny_auto,
+    'Adaptive_thresh': _adaptive_thresh,
+    'Otsu_thresh': _otsu_thresh,
+}
+
+ALL_STRATEGIES = tuple(STRATEGY_FUNCS) + tuple(QUAD_STRATEGIES)
+
+
+class StrategyCosts:
+    """
+    Coste medido de cada etapa en segundos por megapíxel (media móvil)
+
+    Los valores iniciales se midieron en un portátil; cada ejecución real los
+    va ajustando a la máquina. 'prepare' es gris + desenfoque.
+    """
+
+    INITIAL = {
+        'prepare': 0.0025,
+        'Canny_standard': 0.006,   # incluye los gradientes Sobel compartidos
+        'Canny_sensitive': 0.002,
+        'Canny_auto': 0.0025,
+        'Adaptive_thresh': 0.0055,
+        'Otsu_thresh': 0.002,
+        'Lines': 0.001,
+    }
+    ALPHA = 0.2
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.per_mp = dict(self.INITIAL)
+
+    def observe(self, stage, seconds, megapixels):
+        if megapixels <= 0:
+            return
+        with self._lock:
+            previous = self.per_mp.get(stage, seconds / megapixels)
+            self.per_mp[stage] = (1 - self.ALPHA) * previous + self.ALPHA * seconds / megapixels
+
+    def estimate(self, stages, megapixels):
+        """Segundos estimados para ejecutar `stages` sobre una imagen de `megapixels`"""
+        with self._lock:
+            return sum(self.per_mp.get(stage, 0.005) for stage in stages) * megapixels
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.per_mp)
+
+    def restore(self, snapshot):
+        """Vuelve a un snapshot(): descarta mediciones no representativas (calentamiento)"""
+        with self._lock:
+            self.per_mp = dict(snapshot)
+
+
+# Compartido por todo el proceso
+STRATEGY_COSTS = StrategyCosts()
+
+
+class ContourSet:
+    """
+    Contornos rectangulares de todas las estrategias ejecutadas sobre una imagen
+
+    Guarda, por estrategia, los TOP_CONTOURS contornos más grandes que se
+    aproximan a un cuadrilátero, con su área precalculada. Los scores se
+    calculan la primera vez que se piden y se reutilizan, así que
+    candidates()/best() con otro área mínima cuestan microsegundos.
+    """
+
+    def __init__(self, blurred):
+        self.blurred = blurred
+        self.height, self.width = blurred.shape[:2]
+        self.total_area = self.height * self.width
+        self.megapixels = self.total_area / 1e6
+        self.strategies = []
+        self.skipped = []
+        self.entries = []
+        self._gradients = None
+
+    def gradients(self):
+        """
+        Sobel dx/dy de la imagen desenfocada, calculados una sola vez
+
+        Con BORDER_REPLICATE, como cv2.Canny(imagen, ...) internamente: los
+        bordes coinciden píxel a píxel también junto al marco.
+        """
+        if self._gradients is None:
+            dx = cv2.Sobel(self.blurred, cv2.CV_16S, 1, 0, ksize=3, borderType=cv2.BORDER_REPLICATE)
+            dy = cv2.Sobel(self.blurred, cv2.CV_16S, 0, 1, ksize=3, borderType=cv2.BORDER_REPLICATE)
+            self._gradients = (dx, dy)
+        return self._gradients
+
+    def run(self, strategy):
+        """Ejecuta una estrategia (una sola vez) y guarda sus cuadriláteros"""
+        if strategy in self.strategies:
+            return
+        start = time.perf_counter()
+        self._run(strategy)
+        STRATEGY_COSTS.observe(strategy, time.perf_counter() - start, self.megapixels)
+
+    def _run(self, strategy):
+        if strategy in QUAD_STRATEGIES:
+            for quad in QUAD_STRATEGIES[strategy](self):
+                self.entries.append({
+                    'method': strategy,
+                    'approx': quad,
+                    'contour': quad,
+                    'area_ratio': cv2.contourArea(quad) / self.total_area,
+                    'scores': {},
+                })
+            self.strategies.append(strategy)
+            return
+
+        binary, iterations = STRATEGY_FUNCS[strategy](self)
+        dilated = cv2.dilate(binary, _KERNEL, iterations=iterations)
+        contours, _ = cv2.findContours(dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        with_area = sorted(((cv2.contourArea(c), c) for c in contours),
+                           key=lambda item: item[0], reverse=True)
+        for area, contour in with_area[:TOP_CONTOURS]:
+            peri = cv2.arcLength(contour, True)
+            approx = cv2.approxPolyDP(contour, 0.02 * peri, True)
+            if len(approx) == 4:
+                self.entries.append({
+                    'method': strategy,
+                    'approx': approx,
+                    'contour': contour,
+                    'area_ratio': area / self.total_area,
+                    'scores': {},
+                })
+        self.strategies.append(strategy)
+
+    def run_all(self, strategies=DEFAULT_STRATEGIES, deadline=None):
+        """
+        Ejecuta las estrategias en orden de prioridad
+
+        Con `deadline` (time.monotonic()) se omiten las que, según el coste
+        medido, ya no caben en el tiempo restante; quedan en self.skipped. La
+        primera siempre se ejecuta para tener al menos un resultado.
+        """
+        for strategy in strategies:
+            if (deadline is not None and self.strategies
+                    and time.monotonic() + STRATEGY_COSTS.estimate([strategy], self.megapixels) > deadline):
+                self.skipped.append(strategy)
+                continue
+            self.run(strategy)
+        return self
+
+    def _score(self, entry, score_on):
+        if score_on not in entry['scores']:
+            shape = entry['approx'].reshape(-1, 1, 2) if score_on == 'approx' else entry['contour']
+            entry['scores'][score_on] = score_contour(shape, self.total_area, self.width, self.height)
+        return entry['scores'][score_on]
+
+    def candidates(self, min_area_ratio, score_on='contour'):
+        """
+        Candidatos que superan el área mínima, en orden de estrategia
+
+        Args:
+            min_area_ratio: Área mínima como ratio del área total
+            score_on: 'contour' puntúa el contorno completo (CLI v2),
+                      'approx' el polígono aproximado (web)
+
+        Returns:
+            Lista de dicts con method, approx, contour, score y details
+        """
+        result = []
+        for entry in self.entries:
+            if entry['area_ratio'] > min_area_ratio:
+                score, details = self._score(entry, score_on)
+                result.append({
+                    'method': entry['method'],
+                    'approx': entry['approx'],
+                    'contour': entry['contour'],
+                    'score': score,
+                    'details': details,
+                })
+        return result
+
+    def best(self, min_area_ratio, score_on='contour'):
+        """Mejor candidato (primero en caso de empate) o None"""
+        best = None
+        for candidate in self.candidates(min_area_ratio, score_on):
+            if candidate['score'] > (best['score'] if best else 0):
+                best = candidate
+        return best
+
+    def sweep(self, min_area_ratio, score_on='contour', thresholds=MIN_AREA_SWEEP):
+        """
+        Prueba el área mínima pedida y, si no hay candidato, umbrales menores
+
+        Returns:
+            (candidato, umbral con el que se encontró) o (None, None)
+        """
+        for ratio in [min_area_ratio] + [t for t in thresholds if t < min_area_ratio]:
+            best = self.best(ratio, score_on)
+            if best is not None:
+                return best, ratio
+        return None, None
+
+    def best_scores(self, min_area_ratio, score_on='contour'):
+        """Mejor score de cada estrategia (las que no dieron candidato no aparecen)"""
+        scores = {}
+        for candidate in self.candidates(min_area_ratio, score_on):
+            scores[candidate['method']] = max(scores.get(candidate['method'], 0.0), float(candidate['score']))
+        return scores
+
+    def report(self, min_area_ratio, chosen=None, score_on='contour', scale=1.0):
+        """
+        Informe de la detección, serializable a JSON
+
+        Args:
+            chosen: Candidato elegido (de best()/sweep()) o None
+            scale: Escala de la imagen analizada respecto al original; las
+                coordenadas del informe van en píxeles del original
+
+        Returns:
+            dict con image_size, strategies, skipped, min_area, candidates
+            (method, area_ratio, score, details, quad, chosen) y chosen
+            (índice en candidates o None)
+        """
+        candidates = []
+        chosen_index = None
+        for candidate in self.candidates(min_area_ratio, score_on):
+            is_chosen = chosen is not None and candidate['approx'] is chosen['approx']
+            if is_chosen:
+                chosen_index = len(candidates)
+            candidates.append({
+                'method': candidate['method'],
+                'area_ratio': round(float(candidate['details']['area_ratio']), 4),
+                'score': round(float(candidate['score']), 4),
+                'details': {key: round(float(value), 4) for key, value in candidate['details'].items()},
+                'quad': quad_points(candidate['approx'], scale),
+                'chosen': is_chosen,
+            })
+        return {
+            'image_size': [round(self.width / scale), round(self.height / scale)],
+            'strategies': list(self.strategies),
+            'skipped': list(self.skipped),
+            'min_area': min_area_ratio,
+            'candidates': candidates,
+            'chosen': chosen_index,
+        }
+
+
+def quad_points(quad, scale=1.0):
+    """Puntos de un cuadrilátero como lista [[x, y], ...] (para JSON)"""
+    return [[round(float(x) / scale, 1), round(float(y) / scale, 1)] for x, y in quad.reshape(-1, 2)]
+
+
+def render_overlay(img, report, max_side=DEBUG_MAX_SIDE):
+    """
+    Dibuja los candidatos de un informe sobre una copia reducida de la imagen
+
+    Solo se llama cuando alguien pide la imagen de depuración: la detección
+    normal nunca dibuja ni codifica nada. `img` puede venir ya reducida (p. ej.
+    decodificada con IMREAD_REDUCED_*); las coordenadas se reescalan.
+
+    Rojo grueso: candidato elegido | Naranja: el resto
+    """
+    height, width = img.shape[:2]
+    scale = min(1.0, max_side / max(height, width))
+    if scale < 1.0:
+        img = cv2.resize(img, (max(1, round(width * scale)), max(1, round(height * scale))),
+                         interpolation=cv2.INTER_AREA)
+    else:
+        img = img.copy()
+
+    factor = img.shape[1] / report['image_size'][0]
+    # El elegido se dibuja el último para que quede encima
+    numbered = sorted(enumerate(report['candidates'], 1), key=lambda item: item[1]['chosen'])
+    for i, candidate in numbered:
+        points = np.round(np.array(candidate['quad']) * factor).astype(np.int32)
+        color = (0, 0, 255) if candidate['chosen'] else (0, 165, 255)
+        cv2.polylines(img, [points], True, color, 3 if candidate['chosen'] else 1)
+        x, y = points.min(axis=0)
+        cv2.putText(img, f"#{i} {candidate['score']:.2f}", (int(x) + 2, max(int(y) - 5, 12)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 1, cv2.LINE_AA)
+    return img
+
+
+def warp_quad(img, quad):
+    """Extrae y endereza el cuadrilátero `quad` (4 puntos) de la imagen"""
+    M, size = quad_homography(quad)
+    return cv2.warpPerspective(img, M, size)
+
+
+def quad_homography(quad):
+    """
+    Homografía que lleva `quad` a un rectángulo de su mismo tamaño
+
+    Returns:
+        (matriz 3x3, (ancho, alto) de la portada enderezada)
+    """
+    rect = order_points(quad.reshape(4, 2).astype(np.float32))
+
+    (tl, tr, br, bl) = rect
+    widthA = np.linalg.norm(br - bl)
+    widthB = np.linalg.norm(tr - tl)
+    maxWidth = max(int(widthA), int(widthB))
+
+    heightA = np.linalg.norm(tr - br)
+    heightB = np.linalg.norm(tl - bl)
+    maxHeight = max(int(heightA), int(heightB))
+
+    dst = np.array([
+        [0, 0],
+        [maxWidth - 1, 0],
+        [maxWidth - 1, maxHeight - 1],
+        [0, maxHeight - 1]
+    ], dtype="float32")
+
+    M = cv2.getPerspectiveTransform(rect, dst)
+    return M, (maxWidth, maxHeight)
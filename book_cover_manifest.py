@@ -0,0 +1,370 @@
+"""
+Procesamiento masivo desde un manifiesto (CSV o JSONL) con reanudación
+
+Pensado para migraciones de catálogo con cientos de miles de fotos. Cada fila
+indica entrada, salida y, opcionalmente, color, tamaño del lienzo, área
+mínima y modo:
+
+    input,output,color,width,height
+    fotos/0001.jpg,salida/0001.png,#2196F3,1920,1080
+
+    {"input": "fotos/0002.jpg", "output": "salida/0002.png", "size": "1280x720"}
+
+Las rutas relativas se resuelven desde la carpeta del manifiesto. Las filas
+se procesan en un pool de procesos (como el modo watch) y cada resultado se
+anota en un checkpoint SQLite (<manifiesto>.checkpoint.sqlite): al relanzar,
+las filas terminadas se saltan. Un fallo se reintenta con espera exponencial;
+si se agotan los reintentos queda como fallida (con el motivo) y se vuelve a
+intentar en la siguiente ejecución.
+"""
+
+import concurrent.futures
+import csv
+import hashlib
+import heapq
+import json
+import os
+import signal
+import sqlite3
+import time
+from pathlib import Path
+
+from book_cover import run_captured
+from book_cover_threads import apply_worker_threads, available_cpus, configure
+
+
+MODES = ('detect', 'auto', 'digital')
+
+# Espera antes del reintento n: BACKOFF_BASE * 2^(n-1), como mucho BACKOFF_MAX
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+
+# Cada cuánto se informa del progreso y se confirma el checkpoint
+PROGRESS_INTERVAL = 5.0
+COMMIT_INTERVAL = 1.0
+
+# Texto del log que se guarda como motivo de un fallo
+ERROR_TAIL = 2000
+
+
+def _warm_worker():
+    import book_cover_cli_v2  # noqa: F401  (cv2, numpy, PIL)
+    import book_cover_simple  # noqa: F401
+
+    apply_worker_threads()
+
+    # El proceso principal gestiona la parada; los workers no reciben Ctrl+C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _stop_on_sigterm(signum, frame):
+    raise KeyboardInterrupt
+
+
+def _process_row(row, extra_args=()):
+    """Worker: procesa una fila escribiendo primero a un archivo temporal"""
+    output_path = Path(row['output'])
+    partial = output_path.with_name(f".{output_path.stem}.partial{output_path.suffix}")
+    argv = [row['mode'], row['input'], str(partial), '--color', row['color'],
+            '--size', str(row['size'][0]), str(row['size'][1])]
+    if row['mode'] != 'digital':
+        argv += ['--min-area', str(row['min_area'])]
+    code, log = run_captured(argv + list(extra_args))
+    if code == 0 and partial.exists():
+        os.replace(partial, output_path)
+    elif partial.exists():
+        partial.unlink()
+    return code, log
+
+
+def read_manifest(path):
+    """Filas del manifiesto como (número de línea, dict); CSV con cabecera o JSONL"""
+    path = Path(path)
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.suffix.lower() in ('.jsonl', '.ndjson'):
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    row = {'_error': f"JSON no válido: {e}"}
+                yield number, row if isinstance(row, dict) else {'_error': 'la línea no es un objeto JSON'}
+        else:
+            for number, row in enumerate(csv.DictReader(f), 2):
+                yield number, row
+
+
+def parse_size(value):
+    """'1920x1080', [1920, 1080] o (1920, 1080) -> (1920, 1080)"""
+    if isinstance(value, str):
+        value = value.lower().replace(' ', '').split('x')
+    width, height = (int(part) for part in value)
+    if width <= 0 or height <= 0:
+        raise ValueError
+    return width, height
+
+
+def normalize_row(raw, base_dir, defaults):
+    """
+    Fila del manifiesto con todos los campos resueltos
+
+    Raises:
+        ValueError: Fila incompleta o con valores no válidos
+    """
+    if '_error' in raw:
+        raise ValueError(raw['_error'])
+    raw = {key.strip().lower(): value for key, value in raw.items()
+           if key and value not in (None, '')}
+    if 'input' not in raw or 'output' not in raw:
+        raise ValueError("faltan las columnas input y/o output")
+
+    try:
+        if 'size' in raw:
+            size = parse_size(raw['size'])
+        elif 'width' in raw or 'height' in raw:
+            size = parse_size((raw.get('width', defaults['size'][0]), raw.get('height', defaults['size'][1])))
+        else:
+            size = tuple(defaults['size'])
+    except (TypeError, ValueError):
+        given = raw.get('size') or f"{raw.get('width', '')}x{raw.get('height', '')}"
+        raise ValueError(f"tamaño de lienzo no válido: {given}")
+
+    try:
+        min_area = float(raw.get('min_area', defaults['min_area']))
+    except (TypeError, ValueError):
+        raise ValueError(f"min_area no válido: {raw.get('min_area')}")
+
+    mode = str(raw.get('mode', defaults['mode'])).lower()
+    if mode not in MODES:
+        raise ValueError(f"modo no válido: {mode} (disponibles: {', '.join(MODES)})")
+
+    return {
+        'input': str(base_dir / str(raw['input'])),
+        'output': str(base_dir / str(raw['output'])),
+        'color': str(raw.get('color', defaults['color'])),
+        'size': size,
+        'min_area': min_area,
+        'mode': mode,
+    }
+
+
+def row_key(row):
+    """Clave de la fila en el checkpoint: si cambian sus parámetros, se reprocesa"""
+    data = json.dumps([row['input'], row['output'], row['mode'], row['color'].upper(),
+                       list(row['size']), row['min_area']])
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()[:32]
+
+
+class Checkpoint:
+    """Estado por fila en SQLite: done / failed, intentos y motivo del último fallo"""
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(str(path))
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS rows (
+                key TEXT PRIMARY KEY,
+                line INTEGER,
+                input TEXT,
+                output TEXT,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                error TEXT,
+                updated REAL NOT NULL
+            )''')
+        self.db.commit()
+        self._last_commit = time.monotonic()
+
+    def done_keys(self):
+        return {key for (key,) in self.db.execute("SELECT key FROM rows WHERE status = 'done'")}
+
+    def record(self, key, line, row, status, attempts, error=None):
+        self.db.execute(
+            'INSERT OR REPLACE INTO rows (key, line, input, output, status, attempts, error, updated) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (key, line, row.get('input'), row.get('output'), status, attempts, error, time.time()))
+        # Confirmar cada fila costaría un fsync por imagen: se agrupan
+        if time.monotonic() - self._last_commit >= COMMIT_INTERVAL:
+            self.commit()
+
+    def commit(self):
+        self.db.commit()
+        self._last_commit = time.monotonic()
+
+    def close(self):
+        self.commit()
+        self.db.close()
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class ManifestRunner:
+    """Filas pendientes del manifiesto → pool de workers → checkpoint"""
+
+    def __init__(self, manifest, checkpoint=None, workers=None, retries=2, mode='detect',
+                 color='#FFFFFF', canvas_size=(1920, 1080), min_area=0.1, use_cache=True):
+        self.manifest = Path(manifest)
+        self.base_dir = self.manifest.resolve().parent
+        self.checkpoint_path = Path(checkpoint or f"{self.manifest}.checkpoint.sqlite")
+        self.workers = workers or available_cpus()
+        self.retries = retries
+        self.defaults = {'mode': mode, 'color': color, 'size': tuple(canvas_size), 'min_area': min_area}
+        self.extra_args = () if use_cache else ('--no-cache',)
+
+        self.in_flight = {}
+        # Reintentos pendientes: (instante, desempate, clave, línea, fila, intentos)
+        self.retry_queue = []
+        self.total = 0
+        self.skipped = 0
+        self.done = 0
+        self.failed = 0
+        self.retried = 0
+        self.started = None
+        self._seq = 0
+
+    def _pending_rows(self, done_keys):
+        """Filas que faltan; las inválidas se anotan como fallidas sin reintento"""
+        for line, raw in read_manifest(self.manifest):
+            try:
+                row = normalize_row(raw, self.base_dir, self.defaults)
+            except ValueError as e:
+                self.failed += 1
+                self.checkpoint.record(f"line:{line}", line, raw if isinstance(raw, dict) else {},
+                                       'failed', 0, f"Fila {line}: {e}")
+                print(f"❌ Fila {line}: {e}")
+                continue
+            key = row_key(row)
+            if key in done_keys:
+                self.skipped += 1
+                continue
+            yield key, line, row
+
+    def _submit(self, executor, key, line, row, attempts):
+        if not Path(row['input']).is_file():
+            # Un archivo que no existe no va a aparecer reintentando
+            self._finish(key, line, row, attempts, 1, f"No se encuentra el archivo '{row['input']}'",
+                         retry=False)
+            return
+        Path(row['output']).parent.mkdir(parents=True, exist_ok=True)
+        future = executor.submit(_process_row, row, self.extra_args)
+        self.in_flight[future] = (key, line, row, attempts)
+
+    def _finish(self, key, line, row, attempts, code, log, retry=True):
+        if code == 0:
+            self.done += 1
+            self.checkpoint.record(key, line, row, 'done', attempts)
+            return
+        error = log[-ERROR_TAIL:].strip()
+        if retry and attempts <= self.retries:
+            self.retried += 1
+            delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+            self._seq += 1
+            heapq.heappush(self.retry_queue,
+                           (time.monotonic() + delay, self._seq, key, line, row, attempts + 1))
+            print(f"↻ Fila {line} ({Path(row['input']).name}): reintento {attempts}/{self.retries} "
+                  f"en {delay:.0f}s")
+            return
+        self.failed += 1
+        self.checkpoint.record(key, line, row, 'failed', attempts, error)
+        # La CLI imprime sugerencias después del error: mostrar la línea con ❌
+        lines = [text.strip() for text in error.splitlines() if text.strip()]
+        marked = [text for text in lines if text.startswith('❌')]
+        last_line = (marked or lines or ['sin salida'])[-1].lstrip('❌ ')
+        print(f"❌ Fila {line} ({Path(row['input']).name}): {last_line}")
+
+    def _collect(self, timeout):
+        if not self.in_flight:
+            time.sleep(timeout)
+            return
+        finished, _ = concurrent.futures.wait(self.in_flight, timeout=timeout,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in finished:
+            key, line, row, attempts = self.in_flight.pop(future)
+            try:
+                code, log = future.result()
+            except Exception as e:  # el worker murió (crash nativo, OOM...)
+                code, log = 1, f"Worker terminado inesperadamente: {e!r}"
+            self._finish(key, line, row, attempts, code, log)
+
+    def progress(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        finished = self.done + self.failed
+        processed = self.skipped + finished
+        rate = self.done / elapsed
+        remaining = self.total - processed
+        eta = format_duration(remaining / rate) if rate > 0 and remaining > 0 else '-'
+        percent = processed / self.total if self.total else 1.0
+        return (f"📊 {processed}/{self.total} ({percent:.1%}) | ✅ {self.done} ❌ {self.failed} "
+                f"↻ {self.retried} ⏭️ {self.skipped} | {rate:.1f} img/s | ETA {eta}")
+
+    def run(self):
+        print(f"📋 Manifiesto: {self.manifest}")
+        self.total = sum(1 for _ in read_manifest(self.manifest))
+        self.checkpoint = Checkpoint(self.checkpoint_path)
+        done_keys = self.checkpoint.done_keys()
+        print(f"   Filas: {self.total} | Checkpoint: {self.checkpoint_path} "
+              f"({len(done_keys)} ya terminadas) | Workers: {self.workers}")
+        print("⏹️  Presiona Ctrl+C para detener (se retoma relanzando el mismo comando)")
+        configure(self.workers, 'manifest')
+
+        signal.signal(signal.SIGTERM, _stop_on_sigterm)
+        rows = self._pending_rows(done_keys)
+        exhausted = False
+        self.started = last_progress = time.monotonic()
+        interrupted = False
+
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers,
+                                                          initializer=_warm_worker)
+        try:
+            while True:
+                # Como mucho 2 trabajos por worker en el executor; los
+                # reintentos cuyo plazo ya venció tienen prioridad
+                while len(self.in_flight) < self.workers * 2:
+                    if self.retry_queue and self.retry_queue[0][0] <= time.monotonic():
+                        _, _, key, line, row, attempts = heapq.heappop(self.retry_queue)
+                    elif not exhausted:
+                        item = next(rows, None)
+                        if item is None:
+                            exhausted = True
+                            continue
+                        key, line, row = item
+                        attempts = 1
+                    else:
+                        break
+                    self._submit(executor, key, line, row, attempts)
+
+                if exhausted and not self.in_flight and not self.retry_queue:
+                    break
+
+                timeout = 0.5
+                if self.retry_queue:
+                    timeout = min(timeout, max(self.retry_queue[0][0] - time.monotonic(), 0.0))
+                self._collect(timeout)
+
+                if time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                    last_progress = time.monotonic()
+                    print(self.progress())
+        except KeyboardInterrupt:
+            interrupted = True
+            print("\n⏹️  Deteniendo: las filas en curso se retomarán en la próxima ejecución")
+        finally:
+            executor.shutdown(wait=not interrupted, cancel_futures=True)
+            self.checkpoint.close()
+
+        print(self.progress())
+        print(f"⏱️  Tiempo: {format_duration(time.monotonic() - self.started)}")
+        if self.failed:
+            print(f"❌ {self.failed} filas fallidas: motivo en {self.checkpoint_path} "
+                  f"(SELECT line, input, error FROM rows WHERE status = 'failed')")
+        return 130 if interrupted else (1 if self.failed else 0)
@@ -0,0 +1,370 @@
+"""
+Índice de hashes perceptuales: fotos casi idénticas sin re-detectar
+
+En una sesión de fotos la misma portada aparece varias veces (ráfagas,
+repeticiones). Cada foto procesada con --dedupe deja en el índice su pHash y
+el cuadrilátero detectado; antes de detectar la siguiente se buscan fotos a
+distancia de Hamming <= DUPLICATE_THRESHOLD y, si el cuadrilátero del vecino
+(escalado a esta imagen) sigue cayendo sobre bordes reales, se endereza con
+él sin pasar por la detección multi-estrategia.
+
+pHash: miniatura 32x32 en grises, DCT, bloque 8x8 de bajas frecuencias y un
+bit por coeficiente (mayor que la mediana) = 64 bits. Tolera recompresión,
+reescalado y pequeños cambios de luz o encuadre.
+
+Índice: SQLite (WAL) con el hash partido en CHUNKS trozos de 8 bits, cada uno
+con su índice (multi-index hashing). Por el principio del palomar, dos hashes
+a distancia < CHUNKS coinciden exactamente en al menos un trozo: basta
+consultar `c0 = ? OR c1 = ? ...` y calcular la distancia de los pocos
+candidatos. El informe de duplicados (find_duplicates) agrupa igual, en
+numpy, y guarda en el índice los hashes de cada archivo (ruta, tamaño,
+mtime): al relanzarlo sobre la misma carpeta solo se hashean los nuevos.
+
+Variable de entorno: BOOKEDITOR_PHASH_INDEX (por defecto <caché>/phash.sqlite)
+"""
+
+import concurrent.futures
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from book_cover_cache import default_cache_dir
+
+
+HASH_BITS = 64
+
+# Trozos del hash indexados por separado: recall garantizado hasta CHUNKS - 1
+CHUNKS = 8
+CHUNK_BITS = HASH_BITS // CHUNKS
+
+# Distancia máxima para considerar dos fotos la misma toma
+DUPLICATE_THRESHOLD = 6
+
+# Vecinos cuyo cuadrilátero se llega a verificar antes de rendirse
+MAX_VERIFY = 3
+
+# Lado aproximado al que se submuestrea con paso antes de INTER_AREA
+HASH_SOURCE_SIDE = 256
+
+# Pares comparados por bloque al agrupar (acota la memoria con grupos grandes)
+PAIR_BLOCK = 1 << 20
+
+_ONE, _TWO, _FOUR, _FIFTY_SIX = (np.uint64(n) for n in (1, 2, 4, 56))
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+
+
+def default_index_path():
+    return os.environ.get('BOOKEDITOR_PHASH_INDEX') or os.path.join(default_cache_dir(), 'phash.sqlite')
+
+
+def phash(img):
+    """pHash de 64 bits (int) de una imagen BGR o en grises"""
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    step = max(1, max(gray.shape[:2]) // HASH_SOURCE_SIDE)
+    small = cv2.resize(gray[::step, ::step], (32, 32), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(small.astype(np.float32))[:8, :8].flatten()
+    bits = np.packbits(low > np.median(low))
+    return int.from_bytes(bits.tobytes(), 'big')
+
+
+def hamming(a, b):
+    # int.bit_count() es de Python 3.10
+    return bin(a ^ b).count('1')
+
+
+def hash_chunks(value):
+    """Los CHUNKS trozos del hash, del más significativo al menos"""
+    mask = (1 << CHUNK_BITS) - 1
+    return [(value >> (CHUNK_BITS * (CHUNKS - 1 - i))) & mask for i in range(CHUNKS)]
+
+
+def _to_sqlite(value):
+    # SQLite guarda enteros con signo de 64 bits
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def _from_sqlite(value):
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+
+def hash_file(path):
+    """
+    pHash de un archivo, o None si no se pudo leer
+
+    Los JPEG se decodifican a 1/8 durante la DCT: el hash solo necesita una
+    miniatura y así leer una carpeta entera cuesta milisegundos por foto.
+    """
+    img = cv2.imread(str(path), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if img is not None and min(img.shape[:2]) < 32:
+        img = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)  # demasiado pequeña reducida
+    return None if img is None else phash(img)
+
+
+class PHashIndex:
+    """
+    Hashes perceptuales y cuadriláteros de las fotos ya procesadas
+
+    Args:
+        path: Archivo SQLite. Default: default_index_path()
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path or default_index_path())
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path), timeout=30)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        chunk_columns = ''.join(f'c{i} INTEGER NOT NULL, ' for i in range(CHUNKS))
+        self.db.execute(f'''
+            CREATE TABLE IF NOT EXISTS images (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime REAL,
+                hash INTEGER NOT NULL,
+                {chunk_columns}
+                width INTEGER,
+                height INTEGER,
+                quad TEXT,
+                updated REAL NOT NULL
+            )''')
+        for i in range(CHUNKS):
+            self.db.execute(f'CREATE INDEX IF NOT EXISTS images_c{i} ON images (c{i})')
+        self.db.commit()
+        self.reused = 0
+        self.detected = 0
+
+    def lookup(self, value, threshold=DUPLICATE_THRESHOLD):
+        """
+        Fotos a distancia <= threshold, de la más cercana a la más lejana
+
+        Returns:
+            Lista de dicts con path, distance, width, height y quad (o None)
+        """
+        if threshold < CHUNKS:
+            where = ' OR '.join(f'c{i} = ?' for i in range(CHUNKS))
+            rows = self.db.execute(f'SELECT path, hash, width, height, quad FROM images WHERE {where}',
+                                   hash_chunks(value))
+        else:
+            # Fuera de la garantía del palomar: recorrido completo
+            rows = self.db.execute('SELECT path, hash, width, height, quad FROM images')
+
+        matches = []
+        for path, stored, width, height, quad in rows:
+            distance = hamming(value, _from_sqlite(stored))
+            if distance <= threshold:
+                matches.append({'path': path, 'distance': distance, 'width': width, 'height': height,
+                                'quad': json.loads(quad) if quad else None})
+        matches.sort(key=lambda match: match['distance'])
+        return matches
+
+    def reuse(self, img, threshold=DUPLICATE_THRESHOLD):
+        """
+        Cuadrilátero de una foto casi idéntica ya procesada
+
+        Se escala a esta imagen y se verifica sobre una miniatura (lados sobre
+        bordes reales, como en el banco fijo) antes de darlo por bueno.
+
+        Returns:
+            (hash de img, cuadrilátero 4x2 en píxeles de img o None, vecino o None)
+        """
+        from book_cover_rig import RigCalibration
+
+        value = phash(img)
+        height, width = img.shape[:2]
+        tried = 0
+        for match in self.lookup(value, threshold):
+            if match['quad'] is None or not match['width'] or not match['height']:
+                continue
+            quad = np.array(match['quad'], dtype=np.float32) * np.float32(
+                [width / match['width'], height / match['height']])
+            if RigCalibration(quad, (width, height)).verify(img):
+                self.reused += 1
+                return value, quad, match
+            tried += 1
+            if tried >= MAX_VERIFY:
+                break
+        self.detected += 1
+        return value, None, None
+
+    def remember(self, path, value, image_size, quad=None):
+        """Anota el hash de `path` y, si lo hay, su cuadrilátero (en píxeles de image_size)"""
+        if quad is not None:
+            quad = json.dumps(np.asarray(quad, dtype=np.float32).reshape(4, 2).round(1).tolist())
+        path = Path(path).resolve()
+        stat = path.stat()
+        self._insert([(str(path), stat.st_size, stat.st_mtime, value, image_size[0], image_size[1], quad)])
+        self.db.commit()
+
+    def _insert(self, rows):
+        placeholders = ', '.join('?' * (CHUNKS + 8))
+        chunk_names = ', '.join(f'c{i}' for i in range(CHUNKS))
+        now = time.time()
+        self.db.executemany(
+            f'INSERT OR REPLACE INTO images (path, size, mtime, hash, {chunk_names}, width, height, quad, '
+            f'updated) VALUES ({placeholders})',
+            [(path, size, mtime, _to_sqlite(value), *hash_chunks(value), width, height, quad, now)
+             for path, size, mtime, value, width, height, quad in rows])
+
+    def known_hashes(self):
+        """{ruta: (tamaño, mtime, hash)} de todo el índice"""
+        return {path: (size, mtime, _from_sqlite(value))
+                for path, size, mtime, value in self.db.execute('SELECT path, size, mtime, hash FROM images')}
+
+    def add_hashes(self, entries):
+        """Anota hashes sin cuadrilátero: [(ruta, tamaño, mtime, hash), ...]"""
+        self._insert([(path, size, mtime, value, None, None, None) for path, size, mtime, value in entries])
+        self.db.commit()
+
+    def stats(self):
+        count, = self.db.execute('SELECT COUNT(*) FROM images').fetchone()
+        return {'path': str(self.path), 'images': count, 'reused': self.reused, 'detected': self.detected}
+
+    def close(self):
+        self.db.close()
+
+
+def _popcount(values):
+    """Bits a 1 de cada uint64 (SWAR: np.bitwise_count es de numpy 2.0)"""
+    values = values - ((values >> _ONE) & _M1)
+    values = (values & _M2) + ((values >> _TWO) & _M2)
+    values = (values + (values >> _FOUR)) & _M4
+    return (values * _H01) >> _FIFTY_SIX
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def group_hashes(hashes, threshold=DUPLICATE_THRESHOLD):
+    """
+    Agrupa los hashes a distancia <= threshold (transitivamente)
+
+    Los hashes idénticos se agrupan sin compararlos. Para el resto,
+    multi-index en numpy: por cada trozo se ordena por su valor y solo se
+    comparan entre sí los hashes con el trozo idéntico (XOR + popcount). Con
+    threshold >= CHUNKS se compara todo con todo.
+
+    Returns:
+        Lista de grupos (listas de índices en `hashes`) con más de un elemento,
+        de mayor a menor
+    """
+    values, inverse = np.unique(np.array(hashes, dtype=np.uint64), return_inverse=True)
+    edges = []
+
+    def compare(members):
+        bucket = values[members]
+        rows_per_block = max(1, PAIR_BLOCK // len(members))
+        for start in range(0, len(members) - 1, rows_per_block):
+            distances = _popcount(bucket[start:start + rows_per_block, None] ^ bucket[None, :])
+            rows, cols = np.nonzero(distances <= threshold)
+            rows += start
+            keep = cols > rows
+            if keep.any():
+                edges.append(np.stack([members[rows[keep]], members[cols[keep]]], axis=1))
+
+    if threshold >= CHUNKS:
+        compare(np.arange(len(values)))
+    else:
+        for i in range(CHUNKS):
+            shift = np.uint64(CHUNK_BITS * (CHUNKS - 1 - i))
+            keys = (values >> shift) & np.uint64((1 << CHUNK_BITS) - 1)
+            order = np.argsort(keys, kind='stable')
+            bounds = np.flatnonzero(np.diff(keys[order])) + 1
+            for members in np.split(order, bounds):
+                if len(members) > 1:
+                    compare(members)
+
+    # Un mismo par aparece en cada trozo que comparte: se une una sola vez
+    parent = list(range(len(values)))
+    if edges:
+        for a, b in np.unique(np.concatenate(edges), axis=0).tolist():
+            a, b = _find(parent, a), _find(parent, b)
+            if a != b:
+                parent[b] = a
+
+    groups = {}
+    for i, unique_index in enumerate(inverse.reshape(-1).tolist()):
+        groups.setdefault(_find(parent, unique_index), []).append(i)
+    return sorted((group for group in groups.values() if len(group) > 1), key=len, reverse=True)
+
+
+def find_duplicates(paths, threshold=DUPLICATE_THRESHOLD, index=None, workers=None):
+    """
+    Hashea `paths` (reutilizando los hashes del índice) y agrupa los duplicados
+
+    Args:
+        index: PHashIndex donde leer y guardar los hashes (None = sin índice)
+        workers: Procesos para hashear los archivos nuevos. Default: nº de CPUs
+
+    Returns:
+        Dict con groups (listas de {'path', 'distance'} respecto a la primera
+        foto del grupo), unreadable, y cuentas y tiempos
+    """
+    from book_cover_threads import apply_worker_threads, available_cpus, configure
+
+    started = time.monotonic()
+    known = index.known_hashes() if index is not None else {}
+    entries, pending, unreadable = [], [], []
+    for path in paths:
+        path = Path(path).resolve()
+        try:
+            stat = path.stat()
+        except OSError:
+            unreadable.append(str(path))
+            continue
+        cached = known.get(str(path))
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime:
+            entries.append((str(path), cached[2]))
+        else:
+            pending.append((str(path), stat.st_size, stat.st_mtime))
+
+    hashed = []
+    if pending:
+        workers = workers or available_cpus()
+        configure(workers, 'duplicates', log=False)
+        names = [path for path, _, _ in pending]
+        if workers > 1 and len(pending) > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                        initializer=apply_worker_threads) as executor:
+                values = list(executor.map(hash_file, names, chunksize=32))
+        else:
+            values = [hash_file(name) for name in names]
+        for (path, size, mtime), value in zip(pending, values):
+            if value is None:
+                unreadable.append(path)
+            else:
+                hashed.append((path, size, mtime, value))
+                entries.append((path, value))
+        if index is not None and hashed:
+            index.add_hashes(hashed)
+    hash_seconds = time.monotonic() - started
+
+    started = time.monotonic()
+    groups = []
+    for members in group_hashes([value for _, value in entries], threshold):
+        members.sort(key=lambda i: entries[i][0])
+        first = entries[members[0]][1]
+        groups.append([{'path': entries[i][0], 'distance': hamming(first, entries[i][1])} for i in members])
+
+    return {
+        'images': len(entries),
+        'hashed': len(hashed),
+        'from_index': len(entries) - len(hashed),
+        'unreadable': unreadable,
+        'groups': groups,
+        'redundant': sum(len(group) - 1 for group in groups),
+        'threshold': threshold,
+        'hash_seconds': round(hash_seconds, 3),
+        'group_seconds': round(time.monotonic() - started, 3),
+    }
@@ -0,0 +1,288 @@
+"""
+Pipeline de una portada: decodificar, detectar, recortar y componer
+
+Lo ejecutan la web (en su hilo o en los workers de book_cover_pool) y el
+calentamiento. No crea la app de Flask, cachés ni pools al importarse: los
+workers del pool solo importan este módulo, así que arrancar o reciclar uno
+no repite nada de eso.
+
+Variables de entorno: BOOKEDITOR_PIPELINE, BOOKEDITOR_ADAPTIVE_STRATEGIES
+"""
+
+import os
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from book_cover_classify import classify_cover
+from book_cover_decode import decode_image
+from book_cover_detect import (DEFAULT_STRATEGIES, FALLBACK_STRATEGY, STRATEGY_COSTS, ContourSet,
+                               prepare_image, quad_points, warp_quad)
+from book_cover_render import (PIPELINES, RENDITIONS, parse_color, render_renditions,
+                               render_renditions_array)
+from book_cover_telemetry import STRATEGY_STATS
+
+
+DEFAULT_CANVAS = (1920, 1080)
+
+# Ruta de composición/codificación: 'pil' (LANCZOS, por defecto) o 'numpy'
+# (cv2 de principio a fin, más rápida); también por petición con `pipeline`
+DEFAULT_PIPELINE = os.environ.get('BOOKEDITOR_PIPELINE', 'pil')
+
+# Orden y poda de estrategias según su historial de victorias (ver
+# book_cover_telemetry); la telemetría se registra siempre
+ADAPTIVE_STRATEGIES = os.environ.get('BOOKEDITOR_ADAPTIVE_STRATEGIES', '').lower() in ('1', 'true', 'on')
+
+
+# Resolución de trabajo de auto_crop_margins y tolerancias del margen
+AUTO_CROP_MAX_SIDE = 512
+MARGIN_COLOR_TOLERANCE = 24     # diferencia máxima por canal con el color del margen
+MARGIN_MIN_BORDER_SHARE = 0.6   # fracción del borde que debe ser del color del margen
+MARGIN_CONTENT_RATIO = 0.005    # contenido acumulado que marca el fin del margen
+
+
+def margin_bounds(content):
+    """
+    Límites (top, bottom, left, right) del contenido en una máscara booleana
+
+    Desde cada lado se avanza hasta que el contenido acumulado supera
+    MARGIN_CONTENT_RATIO del ancho (filas) o del alto (columnas). bottom y
+    right son exclusivos, como en un slice. None si no queda contenido.
+    """
+    sh, sw = content.shape
+    row_content = np.cumsum(content.sum(axis=1))
+    col_content = np.cumsum(content.sum(axis=0))
+    if row_content[-1] == 0:
+        return None
+
+    # Primer índice desde cada lado donde el contenido acumulado supera el
+    # umbral; desde abajo y la derecha se busca sobre la suma invertida (que
+    # incluye la propia fila o columna)
+    row_limit = MARGIN_CONTENT_RATIO * sw
+    col_limit = MARGIN_CONTENT_RATIO * sh
+    top = int(np.searchsorted(row_content, row_limit, side='right'))
+    bottom = sh - int(np.searchsorted(np.cumsum(content.sum(axis=1)[::-1]), row_limit, side='right'))
+    left = int(np.searchsorted(col_content, col_limit, side='right'))
+    right = sw - int(np.searchsorted(np.cumsum(content.sum(axis=0)[::-1]), col_limit, side='right'))
+
+    if top >= bottom or left >= right:
+        return None
+    return top, bottom, left, right
+
+
+def auto_crop_margins(img):
+    """
+    Recorta márgenes de color uniforme (blanco, negro o de color)
+
+    Trabaja sobre una copia reducida: toma como color de margen la mediana del
+    borde, marca como contenido los píxeles que se alejan de él y avanza desde
+    cada lado con sumas acumuladas de contenido por fila y columna. Los límites
+    se escalan de vuelta a la resolución original.
+    """
+    h, w = img.shape[:2]
+
+    # Submuestreo por saltos (sin copiar) y luego INTER_AREA sobre algo ya pequeño:
+    # en imágenes de 8000x8000 el resize directo cuesta más que todo lo demás
+    step = max(1, max(h, w) // (2 * AUTO_CROP_MAX_SIDE))
+    small = img[::step, ::step]
+    target = min(1.0, AUTO_CROP_MAX_SIDE / max(small.shape[:2]))
+    if target < 1.0:
+        small = cv2.resize(small, (max(1, int(small.shape[1] * target)), max(1, int(small.shape[0] * target))),
+                           interpolation=cv2.INTER_AREA)
+    sh, sw = small.shape[:2]
+    scale_y, scale_x = sh / h, sw / w
+
+    # Color del margen: mediana de los píxeles del borde
+    border = np.concatenate([small[0], small[-1], small[:, 0], small[:, -1]])
+    margin_color = np.median(border, axis=0)
+    border_match = (np.abs(border.astype(np.int16) - margin_color).max(axis=1)
+                    <= MARGIN_COLOR_TOLERANCE).mean()
+    if border_match < MARGIN_MIN_BORDER_SHARE:
+        return img  # el borde no es uniforme: no hay margen que recortar
+
+    content = (np.abs(small.astype(np.int16) - margin_color).max(axis=2) > MARGIN_COLOR_TOLERANCE)
+    bounds = margin_bounds(content)
+    if bounds is None:
+        return img
+    top, bottom, left, right = bounds
+
+    # De vuelta a la resolución original (redondeando hacia fuera)
+    top = max(0, int(np.floor(top / scale_y)))
+    left = max(0, int(np.floor(left / scale_x)))
+    bottom = min(h, int(np.ceil(bottom / scale_y)))
+    right = min(w, int(np.ceil(right / scale_x)))
+
+    # Aplicar solo si el recorte es > 2% en algún lado
+    crop_ratio = ((right - left) * (bottom - top)) / (w * h)
+
+    if crop_ratio < 0.98:
+        return img[top:bottom, left:right]
+
+    return img
+
+
+# Presupuestos de tiempo: la detección puede usar como mucho esta fracción
+# del tiempo restante (el resto queda para warp, composición y PNG) y nunca
+# trabaja por debajo de este lado mayor
+DETECTION_BUDGET_SHARE = 0.5
+MIN_DETECTION_SIDE = 480
+
+def detection_scale(img, deadline):
+    """
+    Factor de escala para que la detección quepa en el presupuesto
+
+    Se estima con el coste por megapíxel medido (STRATEGY_COSTS); 1.0 si cabe
+    a resolución completa o no hay presupuesto.
+    """
+    if deadline is None:
+        return 1.0
+    h, w = img.shape[:2]
+    megapixels = h * w / 1e6
+    allowed = (deadline - time.monotonic()) * DETECTION_BUDGET_SHARE
+    expected = STRATEGY_COSTS.estimate(('prepare',) + DEFAULT_STRATEGIES, megapixels)
+    if expected <= allowed:
+        return 1.0
+    scale = (max(allowed, 0.0) / expected) ** 0.5
+    return min(1.0, max(scale, MIN_DETECTION_SIDE / max(h, w)))
+
+
+def detect_book_cover(image_data, min_area_ratio=0.1, deadline=None, report=False, telemetry=True):
+    """
+    Detecta portada usando múltiples estrategias
+
+    Args:
+        deadline: Instante límite (time.monotonic()) o None. Con límite se
+            reduce la resolución de detección y se omiten estrategias si no
+            caben; el resultado se marca como degradado.
+        report: Añadir a info el informe de candidatos (ContourSet.report())
+        telemetry: Anotar el resultado en STRATEGY_STATS (no en el calentamiento)
+
+    Returns:
+        (portada como array BGR, dict con degraded, reasons, method, quad y
+         decode_factor; quad y report en píxeles de la imagen completa)
+    """
+    info = {'degraded': False, 'reasons': [], 'method': None, 'quad': None}
+
+    # Por encima del presupuesto de píxeles los JPEG se decodifican reducidos
+    img, factor = decode_image(image_data)
+    info['decode_factor'] = factor
+
+    original = img.copy()
+
+    # Portadas digitales claras (sin EXIF de cámara, márgenes sólidos o
+    # contenido hasta los bordes...) no pagan la detección: solo márgenes
+    if classify_cover(img, image_data)['kind'] == 'digital':
+        info['method'] = 'digital'
+        if report:
+            info['report'] = {'method': 'digital', 'image_size': [img.shape[1] * factor, img.shape[0] * factor],
+                              'strategies': [], 'skipped': [], 'min_area': min_area_ratio,
+                              'candidates': [], 'chosen': None}
+        return auto_crop_margins(original), info
+
+    # Con poco tiempo la detección trabaja sobre una copia reducida; el
+    # cuadrilátero se reescala y el warp se hace sobre el original
+    scale = detection_scale(img, deadline)
+    if scale < 1.0:
+        img = cv2.resize(img, (max(1, int(img.shape[1] * scale)), max(1, int(img.shape[0] * scale))),
+                         interpolation=cv2.INTER_AREA)
+        info['degraded'] = True
+        info['reasons'].append(f'detección al {scale:.0%} de resolución')
+
+    start = time.perf_counter()
+    blurred = prepare_image(img)
+    STRATEGY_COSTS.observe('prepare', time.perf_counter() - start, img.shape[0] * img.shape[1] / 1e6)
+
+    # Los contornos se calculan una vez; si el área mínima pedida no da
+    # ningún candidato se prueban umbrales menores sin recalcular nada
+    strategies, full = DEFAULT_STRATEGIES, True
+    if ADAPTIVE_STRATEGIES:
+        strategies, full = STRATEGY_STATS.plan(DEFAULT_STRATEGIES)
+    contour_set = ContourSet(blurred).run_all(strategies, deadline=deadline)
+    best, ratio = contour_set.sweep(min_area_ratio, score_on='approx')
+
+    if best is None:
+        # Rescate por segmentos de línea (portada cortada por el encuadre o
+        # por una sombra) antes de asumir portada digital
+        contour_set.run_all((FALLBACK_STRATEGY,), deadline=deadline)
+        best, ratio = contour_set.sweep(min_area_ratio, score_on='approx')
+
+    if contour_set.skipped:
+        info['degraded'] = True
+        info['reasons'].append(f"estrategias omitidas: {', '.join(contour_set.skipped)}")
+
+    if telemetry:
+        STRATEGY_STATS.record(contour_set.strategies,
+                              contour_set.best_scores(ratio or min_area_ratio, score_on='approx'),
+                              best['method'] if best is not None else None,
+                              full and not contour_set.skipped)
+
+    # Sin contorno rectangular se asume portada digital: recortar márgenes
+    info['method'] = best['method'] if best is not None else 'margins'
+    if report:
+        info['report'] = dict(contour_set.report(ratio or min_area_ratio, best, score_on='approx',
+                                                 scale=scale / factor),
+                              method=info['method'],
+                              image_size=[original.shape[1] * factor, original.shape[0] * factor])
+
+    if best is None:
+        return auto_crop_margins(original), info
+
+    # Ordenar puntos y extraer portada
+    quad = best['approx'].astype(np.float32) / scale
+    info['quad'] = quad_points(quad * factor)
+    return warp_quad(original, quad), info
+
+
+def render_cover(input_data, color='#FFFFFF', min_area=0.1, deadline=None, canvas_size=DEFAULT_CANVAS,
+                 renditions=('slide',), pipeline=DEFAULT_PIPELINE, debug=False, telemetry=True):
+    """
+    Pipeline completo: detección + composición sobre el lienzo
+
+    La portada se detecta y endereza una sola vez para todas las renditions.
+    pipeline='numpy' compone y codifica con OpenCV sin pasar por PIL. Con
+    debug, info incluye el informe de candidatos ('report').
+
+    Returns:
+        (dict rendition -> resultado de render_renditions(), dict de detect_book_cover())
+    """
+    # Detectar y recortar portada
+    cover_bgr, info = detect_book_cover(input_data, min_area_ratio=min_area, deadline=deadline, report=debug,
+                                        telemetry=telemetry)
+
+    if pipeline == 'numpy':
+        return render_renditions_array(cover_bgr, renditions, parse_color(color), canvas_size), info
+
+    # Convertir de BGR a RGB
+    cover_img = Image.fromarray(cv2.cvtColor(cover_bgr, cv2.COLOR_BGR2RGB))
+    return render_renditions(cover_img, renditions, parse_color(color), canvas_size), info
+
+
+def warmup_image():
+    """Foto sintética (JPEG 640x480): portada inclinada con texto sobre una mesa clara con grano"""
+    rng = np.random.default_rng(0)
+    img = np.full((480, 640, 3), 200, np.uint8)
+    img = cv2.add(img, rng.integers(0, 10, img.shape, dtype=np.uint8))
+    quad = np.array([[190, 60], [450, 75], [440, 420], [180, 410]], np.int32)
+    cv2.fillConvexPoly(img, quad, (40, 60, 180))
+    cv2.putText(img, 'BookEditor', (215, 200), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (240, 240, 240), 2)
+    cv2.rectangle(img, (230, 260), (400, 360), (200, 190, 60), -1)
+    return cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+def warm_up_pipeline():
+    """
+    render_cover() sobre warmup_image() con todas las renditions y rutas de
+    composición: carga OpenCV, Pillow, los codecs y el clasificador
+
+    La primera ejecución paga la inicialización, así que sus costes medidos
+    se descartan y no se anota en la telemetría de estrategias.
+    """
+    data = warmup_image()
+    costs = STRATEGY_COSTS.snapshot()
+    try:
+        for pipeline in PIPELINES:
+            render_cover(data, renditions=tuple(RENDITIONS), pipeline=pipeline, telemetry=False)
+    finally:
+        STRATEGY_COSTS.restore(costs)
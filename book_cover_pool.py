@@ -0,0 +1,327 @@
+"""
+Pool de procesos para el pipeline de visión del servicio web
+
+Cada worker es un proceso con OpenCV y el pipeline ya cargados. Así la
+parte en Python (bucles de contornos, scoring, composición en PIL) no compite
+por el GIL del proceso de Flask, y un fallo en código nativo solo tumba un
+worker, que se reinicia.
+
+Los datos no viajan por la tubería con pickle: el archivo subido se deja en
+un bloque de multiprocessing.shared_memory y el worker devuelve todas las
+renditions en otro bloque (más una tabla de offsets). Por la tubería solo
+pasan nombres, tamaños y parámetros.
+
+Por la memoria compartida viaja el archivo subido tal cual (JPEG/PNG), no la
+imagen decodificada: el worker decodifica dentro del presupuesto de píxeles
+(book_cover_decode, JPEG reducido) y un buffer BGR pesaría 10-30 veces más
+que el archivo; copiarlo costaría más que volver a decodificar.
+
+Los workers se reinician tras un crash, si no responden a tiempo (bloqueados
+en código nativo: se matan) o después de `max_jobs` trabajos (fugas de
+memoria de librerías nativas). Con `warmup`, cada worker nuevo
+ejecuta el pipeline sobre una imagen sintética antes de aceptar trabajos y
+avisa por la tubería cuando ha terminado.
+"""
+
+import atexit
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+from multiprocessing import shared_memory
+
+
+# Trabajos por worker antes de reciclarlo
+MAX_JOBS_PER_WORKER = 200
+
+# Fallos de calentamiento tolerados en wait_ready()
+WARMUP_ATTEMPTS = 3
+
+# Espera máxima por un trabajo sin plazo y por el calentamiento de un worker
+RENDER_TIMEOUT = 60.0
+WARMUP_TIMEOUT = 120.0
+
+# Con plazo, margen sobre él: el plazo es orientativo (la composición y el
+# PNG van después de la detección)
+DEADLINE_GRACE = 5.0
+
+
+class WorkerCrashed(RuntimeError):
+    """El worker murió mientras procesaba el trabajo"""
+
+
+class WorkerTimeout(WorkerCrashed):
+    """El worker no respondió a tiempo (se mata y se sustituye)"""
+
+
+def _worker_main(conn, warmup):
+    """Bucle del worker: recibe trabajos por la tubería hasta que se cierra"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from book_cover_threads import apply_worker_threads
+    from book_cover_pipeline import render_cover, warm_up_pipeline
+
+    apply_worker_threads()
+    if warmup:
+        warm_up_pipeline()
+        conn.send(('ready',))
+
+    while True:
+        try:
+            shm_name, size, params = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        upload = shared_memory.SharedMemory(name=shm_name)
+        try:
+            input_data = bytes(upload.buf[:size])
+        finally:
+            upload.close()
+
+        try:
+            results, info = render_cover(input_data, **params)
+        except Exception as e:
+            conn.send(('error', type(e).__name__, str(e)))
+            continue
+
+        # Todas las renditions en un solo bloque; el proceso principal lo
+        # copia y lo libera
+        layout, offset = [], 0
+        for name, rendition in results.items():
+            meta = {key: value for key, value in rendition.items() if key != 'data'}
+            layout.append((name, offset, len(rendition['data']), meta))
+            offset += len(rendition['data'])
+        block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        try:
+            for (name, start, length, _), rendition in zip(layout, results.values()):
+                block.buf[start:start + length] = rendition['data']
+            conn.send(('ok', block.name, layout, info))
+        finally:
+            block.close()
+
+
+class _Worker:
+    def __init__(self, context, index, warmup):
+        self.index = index
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, warmup),
+                                       name=f'bookeditor-worker-{index}', daemon=True)
+        self.process.start()
+        # Sin esta copia abierta, recv() da EOFError en cuanto el hijo muere
+        child_conn.close()
+        self.jobs = 0
+        self.ready = not warmup
+
+    def wait_ready(self, timeout=WARMUP_TIMEOUT):
+        """Espera el aviso de fin del calentamiento (EOFError si muere, WorkerTimeout si no llega)"""
+        if not self.ready:
+            if not self.conn.poll(timeout):
+                raise WorkerTimeout(f'El worker no terminó de calentarse en {timeout:.0f}s')
+            self.conn.recv()
+            self.ready = True
+
+    def stop(self):
+        self.conn.close()
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+    def kill(self):
+        """Sin esperar: el worker puede estar bloqueado en código nativo"""
+        self.conn.close()
+        self.process.kill()
+        self.process.join(timeout=1)
+
+
+class CoverPool:
+    """
+    Pool de workers precargados para render_cover()
+
+    Args:
+        workers: Número de procesos (conviene igualarlo a la concurrencia
+            del control de admisión: así nunca hay que esperar un worker)
+        max_jobs: Trabajos por worker antes de reciclarlo
+        warmup: Calentar cada worker nuevo (también los que sustituyen a
+            uno reciclado o caído) antes de darle trabajos
+        timeout: Espera máxima por un trabajo sin `deadline`; con él, hasta
+            el plazo más DEADLINE_GRACE (sin pasar de `timeout`)
+    """
+
+    def __init__(self, workers, max_jobs=MAX_JOBS_PER_WORKER, warmup=False, timeout=RENDER_TIMEOUT):
+        # spawn: el proceso de Flask tiene hilos y fork con hilos puede dejar
+        # locks tomados en el hijo
+        self._context = multiprocessing.get_context('spawn')
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.warmup = warmup
+        self.timeout = timeout
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._next_index = 0
+        self.busy = 0
+        self.jobs = 0
+        self.crashes = 0
+        self.timeouts = 0
+        self.recycled = 0
+        self.busy_seconds = 0.0
+        self.started = time.monotonic()
+        self._all = []
+        for _ in range(workers):
+            self._idle.put(self._spawn())
+        atexit.register(self.close)
+
+    def _spawn(self):
+        with self._lock:
+            worker = _Worker(self._context, self._next_index, self.warmup)
+            self._next_index += 1
+            self._all.append(worker)
+        return worker
+
+    def _replace(self, worker, kill=False):
+        with self._lock:
+            self._all.remove(worker)
+        if kill:
+            worker.kill()
+        else:
+            worker.stop()
+        return self._spawn()
+
+    def job_timeout(self, deadline=None):
+        """Segundos de espera por un trabajo con ese plazo (time.monotonic())"""
+        if deadline is None:
+            return self.timeout
+        return min(self.timeout, max(0.0, deadline - time.monotonic()) + DEADLINE_GRACE)
+
+    def _checkout(self, timeout):
+        """Un worker libre; WorkerTimeout si no queda ninguno en `timeout` segundos"""
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise WorkerTimeout(f'Ningún worker de procesamiento libre en {timeout:.0f}s')
+
+    def render(self, input_data, **params):
+        """
+        Ejecuta render_cover(input_data, **params) en un worker
+
+        El worker vuelve siempre a la cola: tal cual si respondió, o
+        sustituido por uno nuevo si falló de cualquier forma (un worker con un
+        trabajo a medias no se puede reutilizar).
+
+        Returns:
+            Lo mismo que render_cover(): (renditions, info)
+        """
+        worker = self._checkout(self.job_timeout(params.get('deadline')))
+        start = time.monotonic()
+        with self._lock:
+            self.busy += 1
+
+        replied = False
+        upload = None
+        try:
+            upload = shared_memory.SharedMemory(create=True, size=max(len(input_data), 1))
+            upload.buf[:len(input_data)] = input_data
+            worker.wait_ready()
+            worker.conn.send((upload.name, len(input_data), params))
+            # Sin límite, un worker colgado en código nativo bloquearía este
+            # hilo (y su hueco de admisión) para siempre
+            timeout = self.job_timeout(params.get('deadline'))
+            if not worker.conn.poll(timeout):
+                raise WorkerTimeout(f'El worker de procesamiento no respondió en {timeout:.0f}s')
+            reply = worker.conn.recv()
+            replied = True
+        except (EOFError, OSError, WorkerTimeout) as e:
+            timed_out = isinstance(e, WorkerTimeout)
+            with self._lock:
+                self.crashes += 1
+                self.timeouts += timed_out
+            if timed_out:
+                raise
+            raise WorkerCrashed('El worker de procesamiento terminó inesperadamente')
+        finally:
+            if upload is not None:
+                upload.close()
+                upload.unlink()
+            with self._lock:
+                self.busy -= 1
+                self.busy_seconds += time.monotonic() - start
+            self._checkin(worker, replied)
+
+        if reply[0] == 'error':
+            _, error_type, message = reply
+            raise (ValueError if error_type == 'ValueError' else RuntimeError)(message)
+
+        _, block_name, layout, info = reply
+        block = shared_memory.SharedMemory(name=block_name)
+        try:
+            results = {}
+            for name, start, length, meta in layout:
+                results[name] = dict(meta, data=bytes(block.buf[start:start + length]))
+        finally:
+            block.close()
+            block.unlink()
+        return results, info
+
+    def _checkin(self, worker, replied):
+        """Devuelve el worker a la cola, reciclado si toca o sustituido si no respondió"""
+        if not replied:
+            worker = self._replace(worker, kill=True)
+        else:
+            worker.jobs += 1
+            with self._lock:
+                self.jobs += 1
+            if worker.jobs >= self.max_jobs:
+                with self._lock:
+                    self.recycled += 1
+                worker = self._replace(worker)
+        self._idle.put(worker)
+
+    def wait_ready(self):
+        """
+        Bloquea hasta que todos los workers han terminado de calentarse
+
+        Los saca a todos de la cola mientras espera: ninguna petición
+        comparte la tubería con la espera. Un worker que muere calentándose se
+        sustituye por otro (que también se espera), hasta WARMUP_ATTEMPTS
+        fallos: después se lanza WorkerCrashed.
+        """
+        workers = []
+        failures = 0
+        try:
+            for _ in range(self.workers):
+                workers.append(self._checkout(WARMUP_TIMEOUT))
+            for i, worker in enumerate(workers):
+                while True:
+                    try:
+                        worker.wait_ready()
+                        break
+                    except (EOFError, OSError, WorkerTimeout) as e:
+                        failures += 1
+                        with self._lock:
+                            self.crashes += 1
+                        worker = workers[i] = self._replace(worker, kill=isinstance(e, WorkerTimeout))
+                        if failures >= WARMUP_ATTEMPTS:
+                            raise WorkerCrashed('Los workers de procesamiento fallan al calentarse')
+        finally:
+            for worker in workers:
+                self._idle.put(worker)
+
+    def stats(self):
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            return {
+                'workers': self.workers,
+                'ready': sum(worker.ready for worker in self._all),
+                'busy': self.busy,
+                'utilisation': round(self.busy_seconds / (elapsed * self.workers), 3),
+                'jobs': self.jobs,
+                'crashes': self.crashes,
+                'timeouts': self.timeouts,
+                'recycled': self.recycled,
+                'max_jobs_per_worker': self.max_jobs,
+            }
+
+    def close(self):
+        with self._lock:
+            workers, self._all = self._all, []
+        for worker in workers:
+            worker.stop()
@@ -0,0 +1,503 @@
+"""
+Composición de portadas sobre lienzo y renditions
+
+Una portada ya recortada (y enderezada) se puede entregar en varios formatos
+a la vez sin repetir decodificación, detección ni warp:
+
+    slide    lienzo del tamaño pedido (1920x1080 por defecto), PNG
+    square   lienzo 1080x1080, PNG
+    thumb    solo la portada, lado mayor 800 px, JPEG
+    cutout   lienzo como slide pero con fondo transparente, PNG
+
+Los redimensionados van en cascada (cada rendition sale de la anterior más
+grande, no del original) y la codificación se hace en paralelo. Los lienzos
+muy grandes (impresión) se componen y codifican por franjas.
+
+Solo depende de Pillow al importarse: la ruta digital sigue arrancando sin
+OpenCV. La ruta NumPy (render_renditions_array) importa cv2 al usarse.
+"""
+
+import concurrent.futures
+import io
+import math
+import struct
+from pathlib import Path
+
+from PIL import Image
+
+from book_cover_threads import worker_threads
+
+
+COLOR_NAMES = {
+    'white': (255, 255, 255), 'black': (0, 0, 0),
+    'red': (255, 87, 34), 'blue': (33, 150, 243),
+    'green': (76, 175, 80), 'yellow': (255, 193, 7),
+}
+
+# La portada ocupa el 80% del alto del lienzo, o el 90% del ancho si no cabe
+COVER_HEIGHT_RATIO = 0.8
+COVER_MAX_WIDTH_RATIO = 0.9
+
+RENDITIONS = {
+    'slide': {'canvas': None, 'format': 'PNG'},          # canvas None = tamaño pedido
+    'square': {'canvas': (1080, 1080), 'format': 'PNG'},
+    'thumb': {'max_side': 800, 'format': 'JPEG'},
+    'cutout': {'canvas': None, 'format': 'PNG', 'transparent': True},
+}
+
+FORMAT_INFO = {
+    'PNG': ('png', 'image/png'),
+    'JPEG': ('jpg', 'image/jpeg'),
+}
+
+
+def parse_color(color):
+    """Color de fondo a RGB: nombre rápido o #RRGGBB (blanco si no se entiende)"""
+    try:
+        if color.startswith('#'):
+            hex_color = color.lstrip('#')
+            return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+        return COLOR_NAMES.get(color.lower(), (255, 255, 255))
+    except (AttributeError, ValueError):
+        return (255, 255, 255)
+
+
+def parse_renditions(value):
+    """'slide,thumb' -> ['slide', 'thumb'] (ValueError si hay nombres desconocidos)"""
+    names = [name.strip().lower() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in RENDITIONS]
+    if unknown:
+        raise ValueError(f"Rendition desconocida: {', '.join(unknown)} "
+                         f"(disponibles: {', '.join(RENDITIONS)})")
+    return names
+
+
+def fit_cover(cover_size, canvas_size):
+    """
+    Tamaño de la portada escalada dentro del lienzo
+
+    Returns:
+        (ancho, alto, factor de escala)
+    """
+    canvas_width, canvas_height = canvas_size
+    cover_width, cover_height = cover_size
+
+    target_height = int(canvas_height * COVER_HEIGHT_RATIO)
+    scale_ratio = target_height / cover_height
+    new_width = int(cover_width * scale_ratio)
+    new_height = target_height
+
+    # Si el ancho escalado es mayor que el 90% del lienzo, reajustar por ancho
+    if new_width > canvas_width * COVER_MAX_WIDTH_RATIO:
+        target_width = int(canvas_width * COVER_MAX_WIDTH_RATIO)
+        scale_ratio = target_width / cover_width
+        new_width = target_width
+        new_height = int(cover_height * scale_ratio)
+
+    return new_width, new_height, scale_ratio
+
+
+def paste_centered(cover_img, canvas_size, background, mode='RGB'):
+    """Lienzo del color dado con la portada (ya escalada) centrada"""
+    canvas = Image.new(mode, canvas_size, background)
+    x = (canvas_size[0] - cover_img.width) // 2
+    y = (canvas_size[1] - cover_img.height) // 2
+    canvas.paste(cover_img, (x, y))
+    return canvas
+
+
+def compose(cover_img, canvas_size, rgb_color):
+    """Escala la portada (LANCZOS) y la centra en el lienzo"""
+    new_width, new_height, _ = fit_cover(cover_img.size, canvas_size)
+    resized = cover_img.resize((new_width, new_height), Image.LANCZOS)
+    return paste_centered(resized, canvas_size, rgb_color)
+
+
+def rendition_size(name, cover_size, canvas_size):
+    """Tamaño al que hay que escalar la portada para una rendition"""
+    spec = RENDITIONS[name]
+    if 'max_side' in spec:
+        scale = spec['max_side'] / max(cover_size)
+        return max(1, round(cover_size[0] * scale)), max(1, round(cover_size[1] * scale))
+    new_width, new_height, _ = fit_cover(cover_size, spec['canvas'] or canvas_size)
+    return new_width, new_height
+
+
+def encode(image, image_format):
+    output = io.BytesIO()
+    if image_format == 'JPEG':
+        image.save(output, format='JPEG', quality=90, optimize=True)
+    else:
+        image.save(output, format=image_format)
+    return output.getvalue()
+
+
+def _finish_rendition(name, resized, canvas_size, rgb_color):
+    spec = RENDITIONS[name]
+    if 'max_side' in spec:
+        image = resized
+    elif spec.get('transparent'):
+        image = paste_centered(resized.convert('RGBA'), spec['canvas'] or canvas_size,
+                               (0, 0, 0, 0), mode='RGBA')
+    else:
+        image = paste_centered(resized, spec['canvas'] or canvas_size, rgb_color)
+
+    extension, mimetype = FORMAT_INFO[spec['format']]
+    return {
+        'data': encode(image, spec['format']),
+        'extension': extension,
+        'mimetype': mimetype,
+        'size': image.size,
+        'cover_size': resized.size,
+    }
+
+
+def _cascade(names, targets, original_size, original, resize):
+    """
+    Redimensiona en cascada de mayor a menor: cada rendition parte de la
+    anterior si es al menos igual de grande (y no es una ampliación del
+    original); si no, del original
+    """
+    resized = {}
+    source, source_size = original, original_size
+    for name in sorted(names, key=lambda n: targets[n][0] * targets[n][1], reverse=True):
+        target = targets[name]
+        if target[0] > source_size[0] or target[1] > source_size[1]:
+            source, source_size = original, original_size
+        resized[name] = resize(source, target, name) if source_size != target else source
+        if target[0] <= original_size[0] and target[1] <= original_size[1]:
+            source, source_size = resized[name], target
+    return resized
+
+
+def _finish_all(finish, names, resized, canvas_size, rgb_color, workers):
+    # Composición + codificación en paralelo (Pillow y cv2.imencode liberan el
+    # GIL), sin pasar de los hilos que le tocan a este worker
+    workers = workers or min(len(names), worker_threads() or 4, 4) or 1
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {name: executor.submit(finish, name, resized[name], canvas_size, rgb_color)
+                   for name in names}
+        return {name: futures[name].result() for name in names}
+
+
+def render_renditions(cover_img, names, rgb_color, canvas_size=(1920, 1080), workers=None):
+    """
+    Genera varias renditions a partir de una sola portada recortada
+
+    Args:
+        cover_img: Portada (PIL, RGB)
+        names: Renditions a generar (claves de RENDITIONS)
+        rgb_color: Color de fondo de los lienzos opacos
+        canvas_size: Tamaño del lienzo de 'slide' y 'cutout'
+
+    Returns:
+        dict nombre -> {data, extension, mimetype, size, cover_size}
+    """
+    requested = list(dict.fromkeys(names))
+    strips = strip_names(requested, canvas_size)
+    names = [name for name in requested if name not in strips]
+    targets = {name: rendition_size(name, cover_img.size, canvas_size) for name in names}
+    resized = _cascade(names, targets, cover_img.size, cover_img,
+                       lambda image, size, name: image.resize(size, Image.LANCZOS))
+    results = _finish_all(_finish_rendition, names, resized, canvas_size, rgb_color, workers)
+    if strips:
+        import numpy as np
+
+        cover_rgb = np.asarray(cover_img.convert('RGB'))
+        results.update((name, _strip_rendition(name, cover_rgb, canvas_size, rgb_color)) for name in strips)
+    return {name: results[name] for name in requested}
+
+
+# -- Ruta NumPy/OpenCV --------------------------------------------------------
+# La portada llega como array BGR (salida del warp) y no pasa nunca por PIL:
+# el lienzo se preasigna con el color de fondo, cv2.resize escribe la portada
+# directamente en su zona central y se codifica con cv2.imencode. Evita las
+# conversiones BGR->RGB, Image.fromarray y la copia de paste().
+
+PIPELINES = ('pil', 'numpy')
+
+# PNG: nivel 6 como Pillow, pero con estrategia RLE de zlib. En un lienzo
+# (grandes zonas de color liso + foto) da el mismo tamaño y codifica ~2x más
+# rápido que la estrategia por defecto
+PNG_COMPRESSION = 6
+
+
+def resize_array(img, size, dst=None):
+    """INTER_AREA al reducir (sin aliasing); INTER_CUBIC al ampliar"""
+    import cv2
+
+    shrinking = size[0] <= img.shape[1] and size[1] <= img.shape[0]
+    return cv2.resize(img, size, dst=dst, interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_CUBIC)
+
+
+def blank_canvas(canvas_size, rgb_color, transparent=False):
+    """Lienzo preasignado: BGR del color de fondo, o BGRA transparente"""
+    import numpy as np
+
+    width, height = canvas_size
+    canvas = np.empty((height, width, 4 if transparent else 3), np.uint8)
+    canvas[:] = (0, 0, 0, 0) if transparent else rgb_color[::-1]
+    return canvas
+
+
+def centered_region(canvas, size):
+    """Vista de la zona central del lienzo donde va una portada de `size`"""
+    x = (canvas.shape[1] - size[0]) // 2
+    y = (canvas.shape[0] - size[1]) // 2
+    return canvas[y:y + size[1], x:x + size[0]]
+
+
+def paste_centered_array(cover_bgr, canvas_size, rgb_color, transparent=False):
+    """Lienzo con la portada (ya escalada) centrada"""
+    canvas = blank_canvas(canvas_size, rgb_color, transparent)
+    region = centered_region(canvas, (cover_bgr.shape[1], cover_bgr.shape[0]))
+    region[..., :3] = cover_bgr
+    if transparent:
+        region[..., 3] = 255
+    return canvas
+
+
+def compose_array(cover_bgr, canvas_size, rgb_color):
+    """Equivalente NumPy de compose(): devuelve el lienzo BGR"""
+    new_width, new_height, _ = fit_cover((cover_bgr.shape[1], cover_bgr.shape[0]), canvas_size)
+    canvas = blank_canvas(canvas_size, rgb_color)
+    resize_array(cover_bgr, (new_width, new_height), dst=centered_region(canvas, (new_width, new_height)))
+    return canvas
+
+
+def encode_array(img, image_format):
+    import cv2
+
+    if image_format == 'JPEG':
+        ok, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    else:
+        ok, buffer = cv2.imencode('.png', img, [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION,
+                                                cv2.IMWRITE_PNG_STRATEGY, cv2.IMWRITE_PNG_STRATEGY_RLE])
+    if not ok:
+        raise ValueError(f"No se pudo codificar la imagen como {image_format}")
+    return buffer.tobytes()
+
+
+def render_renditions_array(cover_bgr, names, rgb_color, canvas_size=(1920, 1080), workers=None):
+    """render_renditions() sobre un array BGR, sin pasar por PIL"""
+    requested = list(dict.fromkeys(names))
+    strips = strip_names(requested, canvas_size)
+    names = [name for name in requested if name not in strips]
+    cover_size = (cover_bgr.shape[1], cover_bgr.shape[0])
+    targets = {name: rendition_size(name, cover_size, canvas_size) for name in names}
+
+    # Los lienzos opacos se preasignan y la portada se redimensiona dentro de
+    # ellos; esa misma vista sirve de origen para la siguiente de la cascada
+    canvases = {}
+
+    def resize_into(source, size, name):
+        spec = RENDITIONS[name]
+        if 'max_side' in spec or spec.get('transparent'):
+            return resize_array(source, size)
+        canvases[name] = blank_canvas(spec['canvas'] or canvas_size, rgb_color)
+        return resize_array(source, size, dst=centered_region(canvases[name], size))
+
+    resized = _cascade(names, targets, cover_size, cover_bgr, resize_into)
+
+    def finish(name, cover, canvas_size, rgb_color):
+        spec = RENDITIONS[name]
+        if name in canvases:
+            image = canvases[name]
+        elif 'max_side' in spec:
+            image = cover
+        else:
+            image = paste_centered_array(cover, spec['canvas'] or canvas_size, rgb_color,
+                                         transparent=spec.get('transparent', False))
+
+        extension, mimetype = FORMAT_INFO[spec['format']]
+        return {
+            'data': encode_array(image, spec['format']),
+            'extension': extension,
+            'mimetype': mimetype,
+            'size': (image.shape[1], image.shape[0]),
+            'cover_size': (cover.shape[1], cover.shape[0]),
+        }
+
+    results = _finish_all(finish, names, resized, canvas_size, rgb_color, workers)
+    if strips:
+        import cv2
+
+        cover_rgb = cv2.cvtColor(cover_bgr, cv2.COLOR_BGR2RGB)
+        results.update((name, _strip_rendition(name, cover_rgb, canvas_size, rgb_color)) for name in strips)
+    return {name: results[name] for name in requested}
+
+
+# -- Lienzos grandes por franjas ----------------------------------------------
+# Para impresión (8K, A2 a 300 ppp...) el lienzo completo más la portada
+# escalada pueden pasar de 1 GB por trabajo. A partir de STRIP_CANVAS_MEGAPIXELS
+# el lienzo no existe nunca entero: se compone en franjas de STRIP_ROWS filas y
+# cada una se comprime y se escribe en el PNG antes de pasar a la siguiente.
+# Al ampliar, cada franja de portada se interpola (Lanczos) a partir solo de
+# las filas de origen que necesita; al reducir, la portada reducida ya es más
+# pequeña que el original. Pico de memoria: portada + una franja.
+
+STRIP_CANVAS_MEGAPIXELS = 16
+STRIP_ROWS = 256
+
+# Filas de origen extra alrededor de cada franja: soporte de INTER_LANCZOS4
+_LANCZOS_MARGIN = 4
+
+
+class PNGStreamWriter:
+    """
+    PNG de 8 bits (RGB o RGBA) escrito por bloques de filas
+
+    Un chunk IDAT por bloque, con el mismo zlib que encode_array() (nivel
+    PNG_COMPRESSION, estrategia RLE) y filtro Sub en todas las filas.
+    """
+
+    def __init__(self, output, size, channels=3):
+        import zlib
+
+        self.output = output
+        self.width, self.height = size
+        self.channels = channels
+        self.rows = 0
+        self._compressor = zlib.compressobj(PNG_COMPRESSION, zlib.DEFLATED, 15, 8, zlib.Z_RLE)
+        color_type = 6 if channels == 4 else 2
+        output.write(b'\x89PNG\r\n\x1a\n')
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', self.width, self.height, 8, color_type, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        import zlib
+
+        self.output.write(struct.pack('>I', len(data)) + kind + data)
+        self.output.write(struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    def write_rows(self, rows):
+        """Añade filas (array alto x ancho x canales, uint8, RGB/RGBA)"""
+        import numpy as np
+
+        # Filtro Sub: cada byte menos el mismo canal del píxel anterior
+        filtered = np.empty((rows.shape[0], 1 + self.width * self.channels), np.uint8)
+        filtered[:, 0] = 1
+        body = filtered[:, 1:].reshape(rows.shape)
+        body[:, 0] = rows[:, 0]
+        np.subtract(rows[:, 1:], rows[:, :-1], out=body[:, 1:])
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._chunk(b'IDAT', data)
+        self.rows += rows.shape[0]
+
+    def close(self):
+        if self.rows != self.height:
+            raise ValueError(f"PNG incompleto: {self.rows} de {self.height} filas")
+        self._chunk(b'IDAT', self._compressor.flush())
+        self._chunk(b'IEND', b'')
+
+
+def use_strips(canvas_size):
+    return canvas_size[0] * canvas_size[1] >= STRIP_CANVAS_MEGAPIXELS * 1e6
+
+
+def render_canvas_strips(cover, canvas_size, background, output, strip_rows=STRIP_ROWS):
+    """
+    Portada escalada y centrada en un lienzo, escrita como PNG por franjas
+
+    Args:
+        cover: Portada (array RGB alto x ancho x 3)
+        background: Color RGB, o RGBA para un lienzo con transparencia
+        output: Archivo binario abierto para escritura
+
+    Returns:
+        (ancho, alto) de la portada en el lienzo
+    """
+    import cv2
+    import numpy as np
+
+    canvas_width, canvas_height = canvas_size
+    cover_height, cover_width = cover.shape[:2]
+    new_width, new_height, _ = fit_cover((cover_width, cover_height), canvas_size)
+    x0 = (canvas_width - new_width) // 2
+    y0 = (canvas_height - new_height) // 2
+
+    if new_width <= cover_width and new_height <= cover_height:
+        cover = cv2.resize(cover, (new_width, new_height), interpolation=cv2.INTER_AREA)
+        scale_x = scale_y = None
+    else:
+        scale_x, scale_y = cover_width / new_width, cover_height / new_height
+
+    channels = len(background)
+    writer = PNGStreamWriter(output, canvas_size, channels)
+    strip = np.empty((strip_rows, canvas_width, channels), np.uint8)
+    for top in range(0, canvas_height, strip_rows):
+        rows = strip[:min(strip_rows, canvas_height - top)]
+        rows[:] = background
+
+        # Filas de la portada que caen en esta franja (coordenadas de la portada escalada)
+        first, last = max(top, y0) - y0, min(top + len(rows), y0 + new_height) - y0
+        if first < last:
+            region = rows[first + y0 - top:last + y0 - top, x0:x0 + new_width, :3]
+            if scale_x is None:
+                region[:] = cover[first:last]
+            else:
+                # Centros de píxel alineados como en cv2.resize; solo las
+                # filas de origen de esta franja (más el margen del filtro)
+                src_first = (first + 0.5) * scale_y - 0.5
+                src_top = max(0, math.floor(src_first) - _LANCZOS_MARGIN)
+                src_bottom = min(cover_height, math.ceil((last - 0.5) * scale_y - 0.5) + _LANCZOS_MARGIN + 1)
+                matrix = np.array([[scale_x, 0, 0.5 * scale_x - 0.5],
+                                   [0, scale_y, src_first - src_top]])
+                region[:] = cv2.warpAffine(cover[src_top:src_bottom], matrix, (new_width, last - first),
+                                           flags=cv2.INTER_LANCZOS4 | cv2.WARP_INVERSE_MAP,
+                                           borderMode=cv2.BORDER_REPLICATE)
+            if channels == 4:
+                rows[first + y0 - top:last + y0 - top, x0:x0 + new_width, 3] = 255
+        writer.write_rows(rows)
+    writer.close()
+    return new_width, new_height
+
+
+def _strip_rendition(name, cover_rgb, canvas_size, rgb_color):
+    """Rendition de lienzo (slide/cutout) por franjas: mismo dict que _finish_rendition()"""
+    spec = RENDITIONS[name]
+    transparent = spec.get('transparent', False)
+    output = io.BytesIO()
+    cover_size = render_canvas_strips(cover_rgb, canvas_size, (0, 0, 0, 0) if transparent else rgb_color,
+                                      output)
+    extension, mimetype = FORMAT_INFO['PNG']
+    return {
+        'data': output.getvalue(),
+        'extension': extension,
+        'mimetype': mimetype,
+        'size': tuple(canvas_size),
+        'cover_size': cover_size,
+    }
+
+
+def strip_names(names, canvas_size):
+    """Renditions que se generan por franjas: las del lienzo pedido, si es grande"""
+    if not use_strips(canvas_size):
+        return []
+    return [name for name in names
+            if 'max_side' not in RENDITIONS[name] and RENDITIONS[name]['canvas'] is None
+            and RENDITIONS[name]['format'] == 'PNG']
+
+
+def save_canvas_strips(cover_img, output_path, canvas_size, rgb_color):
+    """Guarda el lienzo (PNG) de una portada PIL por franjas; devuelve el tamaño de la portada"""
+    import numpy as np
+
+    with open(output_path, 'wb') as output:
+        return render_canvas_strips(np.asarray(cover_img.convert('RGB')), canvas_size, rgb_color, output)
+
+
+def rendition_path(output_path, name, extension):
+    """salida.png + thumb -> salida_thumb.jpg"""
+    output_path = Path(output_path)
+    return output_path.with_name(f"{output_path.stem}_{name}.{extension}")
+
+
+def save_renditions(cover_img, output_path, names, rgb_color, canvas_size=(1920, 1080)):
+    """Genera las renditions y las guarda junto a `output_path`; devuelve las rutas"""
+    paths = []
+    for name, rendition in render_renditions(cover_img, names, rgb_color, canvas_size).items():
+        path = rendition_path(output_path, name, rendition['extension'])
+        path.write_bytes(rendition['data'])
+        paths.append((name, path, rendition))
+    return paths
@@ -0,0 +1,221 @@
+"""
+Modo banco fijo: calibración de un cuadrilátero conocido
+
+En el banco de escaneo la cámara y el atril no se mueven, así que la portada
+cae casi en el mismo sitio en todas las fotos. Se detecta (o se indica a mano)
+el cuadrilátero una vez y se guarda con su homografía:
+
+    python3 book_cover.py calibrate referencia.jpg --rig banco.json
+    python3 book_cover.py batch fotos/ -o salida/ --rig banco.json
+
+Con cada foto nueva solo se comprueba, sobre una miniatura, que los cuatro
+lados siguen cayendo sobre bordes reales; si es así se endereza directamente
+con la homografía guardada. La detección completa solo se ejecuta cuando la
+verificación falla (libro distinto, mal colocado o banco movido).
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from book_cover_detect import (DEFAULT_STRATEGIES, FALLBACK_STRATEGY, ContourSet, order_points,
+                               prepare_image, quad_homography, quad_points)
+
+
+RIG_FORMAT = 1
+
+# Lado de la miniatura de verificación
+VERIFY_SIDE = 320
+
+# Distancia máxima (px de la miniatura) entre el lado esperado y un borde
+VERIFY_TOLERANCE = 3
+
+# Fracción mínima de puntos de cada lado que deben caer sobre un borde
+VERIFY_MIN_SUPPORT = 0.6
+
+# Puntos muestreados por lado (sin los extremos: las esquinas suelen ser romas)
+VERIFY_SAMPLES = 24
+
+
+def detect_quad(img, min_area_ratio=0.1, strategies=None):
+    """Detección completa: mejor cuadrilátero (float32 4x2) o None"""
+    contour_set = ContourSet(prepare_image(img)).run_all(strategies or DEFAULT_STRATEGIES)
+    best, _ = contour_set.sweep(min_area_ratio)
+    if best is None:
+        contour_set.run_all((FALLBACK_STRATEGY,))
+        best, _ = contour_set.sweep(min_area_ratio)
+    if best is None:
+        return None
+    return order_points(best['approx'].reshape(4, 2).astype(np.float32))
+
+
+def parse_quad(value):
+    """'x1,y1,x2,y2,x3,y3,x4,y4' -> array 4x2 (ValueError si no son 8 números)"""
+    numbers = [float(part) for part in value.replace(';', ',').split(',') if part.strip()]
+    if len(numbers) != 8:
+        raise ValueError(f"El cuadrilátero necesita 8 números (x,y de 4 esquinas): {value}")
+    return order_points(np.array(numbers, dtype=np.float32).reshape(4, 2))
+
+
+class RigCalibration:
+    """
+    Cuadrilátero y homografía de un banco fijo
+
+    Args:
+        quad: Esquinas de la portada (4x2, píxeles de la imagen de referencia)
+        image_size: (ancho, alto) de la imagen de referencia
+    """
+
+    def __init__(self, quad, image_size, source=None, created=None):
+        self.quad = order_points(np.asarray(quad, dtype=np.float32).reshape(4, 2))
+        self.image_size = tuple(image_size)
+        self.homography, self.output_size = quad_homography(self.quad)
+        self.source = source
+        self.created = created or time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.verified = 0
+        self.redetected = 0
+        self.failed = 0
+
+    @classmethod
+    def load(cls, path):
+        data = json.loads(Path(path).read_text())
+        if data.get('format') != RIG_FORMAT:
+            raise ValueError(f"Calibración con formato desconocido: {path}")
+        return cls(data['quad'], data['image_size'], data.get('source'), data.get('created'))
+
+    def save(self, path):
+        Path(path).write_text(json.dumps({
+            'format': RIG_FORMAT,
+            'source': self.source,
+            'created': self.created,
+            'image_size': list(self.image_size),
+            'quad': quad_points(self.quad),
+            # Informativo: se recalcula al cargar a partir del cuadrilátero
+            'homography': [[round(float(value), 8) for value in row] for row in self.homography],
+            'output_size': list(self.output_size),
+        }, indent=2))
+
+    def verify(self, img):
+        """
+        True si los cuatro lados del cuadrilátero siguen sobre bordes reales
+
+        Trabaja sobre una miniatura de VERIFY_SIDE px: Canny + dilatación con
+        la tolerancia y muestreo de VERIFY_SAMPLES puntos por lado.
+        """
+        height, width = img.shape[:2]
+        if (width, height) != self.image_size:
+            return False
+
+        # Submuestreo con paso antes de INTER_AREA: reducir la foto completa
+        # costaría casi tanto como el warp
+        step = max(1, max(width, height) // (2 * VERIFY_SIDE))
+        sampled = img[::step, ::step]
+        scale = min(1.0, VERIFY_SIDE / max(sampled.shape[:2]))
+        thumb = cv2.resize(sampled, (max(1, round(sampled.shape[1] * scale)),
+                                     max(1, round(sampled.shape[0] * scale))),
+                           interpolation=cv2.INTER_AREA)
+        scale = thumb.shape[1] / width
+        gray = cv2.GaussianBlur(cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY), (3, 3), 0)
+        edges = cv2.Canny(gray, 50, 150)
+        size = 2 * VERIFY_TOLERANCE + 1
+        edges = cv2.dilate(edges, np.ones((size, size), np.uint8))
+
+        corners = self.quad * scale
+        steps = np.linspace(0.1, 0.9, VERIFY_SAMPLES)[:, None]
+        for start, end in zip(corners, np.roll(corners, -1, axis=0)):
+            points = np.round(start + steps * (end - start)).astype(int)
+            xs = np.clip(points[:, 0], 0, edges.shape[1] - 1)
+            ys = np.clip(points[:, 1], 0, edges.shape[0] - 1)
+            if np.count_nonzero(edges[ys, xs]) < VERIFY_MIN_SUPPORT * VERIFY_SAMPLES:
+                return False
+        return True
+
+    def warp(self, img):
+        """Endereza con la homografía guardada (sin detección)"""
+        return cv2.warpPerspective(img, self.homography, self.output_size)
+
+    def extract(self, img, min_area_ratio=0.1, strategies=None):
+        """
+        Portada enderezada: homografía guardada si se verifica, si no
+        detección completa
+
+        Returns:
+            (array BGR o None, 'rig' | 'detected' | 'failed')
+        """
+        if self.verify(img):
+            self.verified += 1
+            return self.warp(img), 'rig'
+
+        quad = detect_quad(img, min_area_ratio, strategies)
+        if quad is None:
+            self.failed += 1
+            return None, 'failed'
+        self.redetected += 1
+        M, size = quad_homography(quad)
+        return cv2.warpPerspective(img, M, size), 'detected'
+
+    def stats(self):
+        return {'verified': self.verified, 'redetected': self.redetected, 'failed': self.failed}
+
+
+def calibrate(image_path, rig_path, quad=None, min_area_ratio=0.1, strategies=None):
+    """
+    Crea la calibración a partir de una foto de referencia
+
+    Args:
+        quad: Esquinas indicadas a mano (parse_quad()); sin ellas se detectan
+
+    Returns:
+        RigCalibration o None si no se detectó la portada
+    """
+    img = cv2.imread(str(image_path))
+    if img is None:
+        print(f"❌ Error: No se pudo leer la imagen '{image_path}'")
+        return None
+
+    if quad is None:
+        quad = detect_quad(img, min_area_ratio, strategies)
+        if quad is None:
+            print("❌ No se detectó la portada: indica las esquinas con --quad")
+            return None
+
+    rig = RigCalibration(quad, (img.shape[1], img.shape[0]), source=Path(image_path).name)
+    if not rig.verify(img):
+        print("⚠️  Los lados del cuadrilátero no coinciden con bordes claros en la referencia;")
+        print("   las fotos siguientes probablemente pasarán por la detección completa")
+    rig.save(rig_path)
+
+    print(f"✅ Calibración guardada en: {rig_path}")
+    print(f"   Esquinas: {quad_points(rig.quad)}")
+    print(f"   Portada: {rig.output_size[0]}x{rig.output_size[1]} px")
+    return rig
+
+
+def process_rig_cover(input_path, output_path, rig, bg_color="#FFFFFF", canvas_size=(1920, 1080),
+                      min_area=0.1, strategies=None, renditions=None):
+    """Como process_cover(), pero con la calibración del banco (sys.exit(1) si falla)"""
+    from PIL import Image
+    from book_cover_cli_v2 import save_cover
+
+    print(f"📖 Procesando: {Path(input_path).name}")
+
+    img = cv2.imread(str(input_path))
+    if img is None:
+        print(f"❌ Error: No se pudo leer la imagen '{input_path}'")
+        sys.exit(1)
+
+    warped, method = rig.extract(img, min_area, strategies)
+    if warped is None:
+        print("❌ Verificación fallida y la detección completa no encontró la portada")
+        sys.exit(1)
+    if method == 'rig':
+        print("🎯 Banco verificado: homografía guardada")
+    else:
+        print("🔍 Verificación fallida: portada re-detectada")
+
+    save_cover(Image.fromarray(cv2.cvtColor(warped, cv2.COLOR_BGR2RGB)), output_path, bg_color,
+               canvas_size, renditions)
@@ -10,10 +10,16 @@ import argparse
 import sys
 from pathlib import Path
 
+from book_cover_decode import MAX_MEGAPIXELS, ImageTooLarge, open_image
+from book_cover_render import (fit_cover, parse_color, paste_centered, save_canvas_strips, save_renditions,
+                                use_strips)
 
-def process_digital_cover(input_path, output_path, bg_color="#FFFFFF", canvas_size=(1920, 1080)):
+
+def process_digital_cover(input_path, output_path, bg_color="#FFFFFF", canvas_size=(1920, 1080), renditions=None):
     """
     Procesa portada digital: escala y centra sin detección
+
+    Con `renditions` se generan todas a partir de la misma imagen cargada.
     """
 
     print(f"📖 Procesando portada digital: {Path(input_path).name}")
@@ -23,8 +29,11 @@ def process_digital_cover(input_path, output_path, bg_color="#FFFFFF", canvas_si
         sys.exit(1)
 
     try:
-        # Cargar imagen
-        cover_img = Image.open(input_path)
+        # Cargar imagen (dentro del presupuesto de píxeles: los JPEG enormes
+        # se cargan reducidos, el resto se rechaza)
+        cover_img, factor = open_image(input_path)
+        if factor > 1:
+            print(f"🔽 Imagen de más de {MAX_MEGAPIXELS:g} MP: se carga reducida a 1/{factor}")
 
         # Convertir a RGB si es necesario
         if cover_img.mode != 'RGB':
@@ -33,48 +42,37 @@ def process_digital_cover(input_path, output_path, bg_color="#FFFFFF", canvas_si
         cover_width, cover_height = cover_img.size
         print(f"📐 Imagen original: {cover_width}x{cover_height} px")
 
-        # Convertir color de fondo
-        try:
-            if bg_color.startswith('#'):
-                hex_color = bg_color.lstrip('#')
-                rgb_color = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-            else:
-                color_map = {
-                    'white': (255, 255, 255), 'black': (0, 0, 0),
-                    'red': (255, 87, 34), 'blue': (33, 150, 243),
-                    'green': (76, 175, 80), 'yellow': (255, 193, 7),
-                }
-                rgb_color = color_map.get(bg_color.lower(), (255, 255, 255))
-        except:
-            rgb_color = (255, 255, 255)
+        rgb_color = parse_color(bg_color)
+
+        if renditions:
+            print(f"🖼️  Generando renditions: {', '.join(renditions)}")
+            for name, path, rendition in save_renditions(cover_img, output_path, renditions, rgb_color,
+                                                         canvas_size):
+                width, height = rendition['size']
+                print(f"   • {name}: {path} ({width}x{height} px)")
+            print("\n✅ ¡Completado!")
+            return
+
+        # Lienzo de impresión: nunca entero en memoria
+        if use_strips(canvas_size) and Path(output_path).suffix.lower() == '.png':
+            print(f"🧱 Lienzo {canvas_size[0]}x{canvas_size[1]}: composición y codificación por franjas...")
+            new_width, new_height = save_canvas_strips(cover_img, output_path, canvas_size, rgb_color)
+            print(f"\n✅ ¡Completado! Guardado en: {output_path}")
+            print(f"   Portada: {new_width}x{new_height} px")
+            return
 
         # Crear lienzo
         print(f"🎨 Creando lienzo {canvas_size[0]}x{canvas_size[1]} con color {bg_color}...")
-        canvas = Image.new('RGB', canvas_size, rgb_color)
-        canvas_width, canvas_height = canvas.size
-
-        # Escalar portada al 80% del alto del lienzo
-        target_height = int(canvas_height * 0.8)
-        scale_ratio = target_height / cover_height
-        new_width = int(cover_width * scale_ratio)
-        new_height = target_height
-
-        # Si el ancho escalado es mayor que el 90% del lienzo, reajustar por ancho
-        if new_width > canvas_width * 0.9:
-            target_width = int(canvas_width * 0.9)
-            scale_ratio = target_width / cover_width
-            new_width = target_width
-            new_height = int(cover_height * scale_ratio)
+
+        # Escalar portada al 80% del alto del lienzo (90% del ancho como máximo)
+        new_width, new_height, scale_ratio = fit_cover(cover_img.size, canvas_size)
 
         print(f"📐 Escalando de {cover_width}x{cover_height} a {new_width}x{new_height} ({int(scale_ratio*100)}%)")
         cover_img_resized = cover_img.resize((new_width, new_height), Image.LANCZOS)
 
         # Centrar
-        x = (canvas_width - new_width) // 2
-        y = (canvas_height - new_height) // 2
-
         print(f"📍 Centrando portada en el lienzo...")
-        canvas.paste(cover_img_resized, (x, y))
+        canvas = paste_centered(cover_img_resized, canvas_size, rgb_color)
 
         # Guardar
         canvas.save(output_path, quality=95)
@@ -83,6 +81,10 @@ def process_digital_cover(input_path, output_path, bg_color="#FFFFFF", canvas_si
         print(f"   Lienzo: {canvas_size[0]}x{canvas_size[1]} px")
         print(f"   Portada: {new_width}x{new_height} px (escalada al 80%)")
 
+    except ImageTooLarge as e:
+        print(f"\n❌ Error: {str(e)}")
+        print("💡 Sube el límite con BOOKEDITOR_MAX_MEGAPIXELS")
+        sys.exit(1)
     except Exception as e:
         print(f"\n❌ Error: {str(e)}")
         import traceback
@@ -0,0 +1,199 @@
+"""
+Coalescencia de peticiones idénticas simultáneas ("single-flight")
+
+Si llegan a la vez varias peticiones con la misma clave (mismo archivo y
+mismos parámetros: doble clic en "Procesar", la misma foto subida desde dos
+pestañas...), solo la primera ejecuta el trabajo; el resto espera y recibe
+el mismo resultado.
+
+    • Entre hilos de un mismo proceso: diccionario clave -> llamada en curso.
+    • Entre procesos (varios workers de gunicorn, por ejemplo): opcional, con
+      un directorio de locks local. El proceso que consigue el flock calcula y
+      deja los bytes del resultado en <clave>.<n>.bin y el resto en
+      <clave>.result (JSON); los demás esperan al lock y lo leen.
+
+Entre procesos no se usa pickle: quien pueda escribir en el directorio no
+debe poder ejecutar código en el servidor. Además el directorio tiene que ser
+del usuario y sin permisos para nadie más; si no, la coalescencia entre
+procesos se desactiva.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+# Vida de los resultados compartidos en disco: solo sirven para peticiones
+# que coinciden en el tiempo, no son una caché
+RESULT_TTL = 30.0
+
+
+def request_key(data, *params):
+    """Clave de coalescencia: hash del contenido subido + parámetros"""
+    digest = hashlib.sha256(data)
+    for param in params:
+        digest.update(b'\0' + str(param).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def private_dir(path):
+    """Crea `path` (0700) si no existe; True si es del usuario y nadie más tiene acceso"""
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    st = os.stat(path)
+    return st.st_uid == os.getuid() and st.st_mode & 0o077 == 0
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Ejecuta como mucho una llamada por clave a la vez
+
+    Args:
+        lock_dir: Directorio para coalescer también entre procesos (opcional).
+            Se crea solo accesible para el usuario; uno ya existente debe
+            serlo también.
+        encode: resultado -> (dict nombre -> bytes, dict serializable en JSON).
+            Necesario (con `decode`) para coalescer entre procesos
+        decode: (blobs, dict) -> resultado; la inversa de `encode`
+    """
+
+    def __init__(self, lock_dir=None, encode=None, decode=None):
+        self.lock_dir = Path(lock_dir) if lock_dir and encode and decode else None
+        self.encode = encode
+        self.decode = decode
+        if self.lock_dir:
+            try:
+                import fcntl  # noqa: F401  (solo Unix)
+            except ImportError:
+                self.lock_dir = None
+            else:
+                if not private_dir(self.lock_dir):
+                    print(f"⚠️  {self.lock_dir} no es un directorio privado de este usuario (dueño y "
+                          f"permisos 0700): coalescencia solo dentro de cada proceso")
+                    self.lock_dir = None
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """
+        Ejecuta fn() o espera a la ejecución en curso con la misma clave
+
+        Returns:
+            (resultado, True si se reutilizó el de otra petición)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        shared = False
+        try:
+            if self.lock_dir:
+                call.result, shared = self._do_across_processes(key, fn)
+            else:
+                call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if not shared and call.error is None:
+                    self.executed += 1
+            call.event.set()
+        return call.result, shared
+
+    def _do_across_processes(self, key, fn):
+        import fcntl
+
+        lock_path = self.lock_dir / f"{key}.lock"
+        result_path = self.lock_dir / f"{key}.result"
+        with open(lock_path, 'a+b') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Otro proceso lo calculó mientras esperábamos el lock
+                try:
+                    if time.time() - result_path.stat().st_mtime < RESULT_TTL:
+                        return self._read_shared(key, result_path), True
+                except (FileNotFoundError, ValueError, KeyError):
+                    pass
+
+                result = fn()
+                self._write_shared(key, result_path, result)
+                return result, False
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                self._purge_expired()
+
+    def _write_shared(self, key, result_path, result):
+        """Blobs primero y el JSON al final: quien ve <clave>.result tiene todo"""
+        blobs, meta = self.encode(result)
+        names = list(blobs)
+        for i, name in enumerate(names):
+            self._replace(self.lock_dir / f"{key}.{i}.bin", blobs[name])
+        self._replace(result_path, json.dumps({'blobs': names, 'meta': meta}).encode('utf-8'))
+
+    def _read_shared(self, key, result_path):
+        shared = json.loads(result_path.read_text(encoding='utf-8'))
+        blobs = {name: (self.lock_dir / f"{key}.{i}.bin").read_bytes()
+                 for i, name in enumerate(shared['blobs'])}
+        return self.decode(blobs, shared['meta'])
+
+    @staticmethod
+    def _replace(path, data):
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def _purge_expired(self):
+        """
+        Borra resultados caducados y sus locks si nadie los tiene tomados
+
+        En el peor caso (un proceso abrió el lock justo antes de borrarlo) dos
+        procesos calculan lo mismo; nunca se devuelve un resultado incorrecto.
+        """
+        import fcntl
+
+        now = time.time()
+        for result_path in self.lock_dir.glob('*.result'):
+            try:
+                if now - result_path.stat().st_mtime <= RESULT_TTL:
+                    continue
+                result_path.unlink()
+                for blob_path in self.lock_dir.glob(f"{result_path.stem}.*.bin"):
+                    blob_path.unlink()
+                lock_path = result_path.with_suffix('.lock')
+                with open(lock_path, 'a+b') as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    lock_path.unlink()
+            except (FileNotFoundError, BlockingIOError):
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'cross_process': self.lock_dir is not None,
+            }
@@ -0,0 +1,240 @@
+"""
+Telemetría de estrategias de detección y modo adaptativo
+
+Cada detección anota qué estrategia produjo el candidato ganador y a qué
+distancia quedó el mejor candidato de cada una de las demás. Los contadores
+se acumulan en memoria y se vuelcan cada cierto tiempo a un JSON compartido
+(<caché>/strategy_stats.json, o BOOKEDITOR_STRATEGY_STATS), sumándolos bajo un
+flock: varios procesos (pool web, watch, manifest) escriben en el mismo
+archivo sin perder cuentas.
+
+Por estrategia:
+    runs        veces que se ejecutó
+    wins        veces que dio el candidato elegido
+    full_runs   ejecuciones en las que corrieron todas las estrategias
+    near_wins   (en ejecuciones completas) su mejor candidato quedó a menos
+                de CLOSE_MARGIN del ganador: ella sola habría bastado. No
+                depende del orden, a diferencia de wins (los empates se los
+                lleva la primera)
+    decisive    victorias (en ejecuciones completas) sin ninguna otra
+                estrategia a menos de CLOSE_MARGIN: sin ella se habría
+                elegido algo peor
+    gap_sum / gap_count   distancia al ganador cuando no ganó
+
+Modo adaptativo (opcional): ordena las estrategias por tasa de victorias y
+omite las que casi nunca bastan ni son decisivas. Una fracción EXPLORE_RATE
+de las imágenes ejecuta siempre todas, para que las estadísticas sigan siendo
+representativas y una estrategia podada pueda volver.
+"""
+
+import json
+import multiprocessing.util
+import os
+import random
+import threading
+import time
+
+from book_cover_cache import default_cache_dir
+
+
+# Un candidato de otra estrategia a menos de este score "casi gana"
+CLOSE_MARGIN = 0.02
+
+# Poda: solo con al menos MIN_SAMPLES ejecuciones completas, si la estrategia
+# habría bastado en menos de MIN_WIN_RATE de las imágenes y fue la única
+# solución en menos de MIN_DECISIVE_RATE
+MIN_SAMPLES = 50
+MIN_WIN_RATE = 0.05
+MIN_DECISIVE_RATE = 0.01
+
+# Fracción de imágenes que ejecutan todas las estrategias en modo adaptativo
+EXPLORE_RATE = 0.1
+
+# Volcado a disco cada FLUSH_EVERY detecciones o FLUSH_INTERVAL segundos
+FLUSH_EVERY = 20
+FLUSH_INTERVAL = 30.0
+
+_FIELDS = ('runs', 'wins', 'full_runs', 'near_wins', 'decisive', 'gap_sum', 'gap_count')
+
+
+def default_stats_path():
+    return (os.environ.get('BOOKEDITOR_STRATEGY_STATS')
+            or os.path.join(default_cache_dir(), 'strategy_stats.json'))
+
+
+def _empty():
+    return {'images': 0, 'strategies': {}}
+
+
+def _merge(total, delta):
+    total['images'] += delta['images']
+    for strategy, counters in delta['strategies'].items():
+        target = total['strategies'].setdefault(strategy, dict.fromkeys(_FIELDS, 0))
+        for field in _FIELDS:
+            target[field] += counters.get(field, 0)
+    return total
+
+
+class StrategyStats:
+    """Contadores por estrategia: en memoria y volcados a un JSON compartido"""
+
+    def __init__(self, path=None):
+        self.path = path or default_stats_path()
+        self._lock = threading.Lock()
+        self._pending = _empty()
+        self._records = 0
+        self._last_flush = time.monotonic()
+        self._snapshot = None
+        self._snapshot_at = 0.0
+        # Como atexit, pero también en los procesos de multiprocessing y
+        # concurrent.futures (que terminan con os._exit)
+        multiprocessing.util.Finalize(self, self.flush, exitpriority=10)
+
+    def record(self, strategies, best_scores, winner, full):
+        """
+        Anota una detección
+
+        Args:
+            strategies: Estrategias que se ejecutaron
+            best_scores: Estrategia -> mejor score de sus candidatos
+                (ContourSet.best_scores(); sin entrada si no dio ninguno)
+            winner: Estrategia del candidato elegido, o None
+            full: Si se ejecutaron todas (sin poda ni presupuesto de tiempo)
+        """
+        with self._lock:
+            pending = self._pending
+            pending['images'] += 1
+            for strategy in strategies:
+                counters = pending['strategies'].setdefault(strategy, dict.fromkeys(_FIELDS, 0))
+                counters['runs'] += 1
+                counters['full_runs'] += full
+
+            if winner is not None:
+                top = best_scores[winner]
+                counters = pending['strategies'][winner]
+                counters['wins'] += 1
+                if full:
+                    for strategy, score in best_scores.items():
+                        if top - score <= CLOSE_MARGIN:
+                            pending['strategies'][strategy]['near_wins'] += 1
+                    rivals = [score for strategy, score in best_scores.items() if strategy != winner]
+                    if all(top - score > CLOSE_MARGIN for score in rivals):
+                        counters['decisive'] += 1
+                for strategy, score in best_scores.items():
+                    if strategy != winner:
+                        pending['strategies'][strategy]['gap_sum'] += top - score
+                        pending['strategies'][strategy]['gap_count'] += 1
+
+            self._records += 1
+            due = (self._records >= FLUSH_EVERY
+                   or time.monotonic() - self._last_flush >= FLUSH_INTERVAL)
+        if due:
+            self.flush()
+
+    def _read(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            return _merge(_empty(), data)
+        except (OSError, ValueError, KeyError, TypeError):
+            return _empty()
+
+    def flush(self):
+        """Suma lo pendiente al archivo compartido (bajo flock)"""
+        with self._lock:
+            pending, self._pending = self._pending, _empty()
+            self._records = 0
+            self._last_flush = time.monotonic()
+        if not pending['images']:
+            return
+
+        try:
+            import fcntl
+
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(f"{self.path}.lock", 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                data = _merge(self._read(), pending)
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=1, sort_keys=True)
+                os.replace(tmp_path, self.path)
+        except (OSError, ImportError):
+            pass  # la telemetría nunca debe romper el procesamiento
+
+    def reset(self):
+        with self._lock:
+            self._pending = _empty()
+            self._records = 0
+            self._snapshot = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def totals(self):
+        """Contadores del archivo + lo pendiente de este proceso"""
+        data = self._read()
+        with self._lock:
+            return _merge(data, self._pending)
+
+    def summary(self):
+        """Tasas por estrategia: win_rate, near_win_rate, decisive_rate, avg_gap y si se podaría"""
+        data = self.totals()
+        strategies = {}
+        for strategy, counters in sorted(data['strategies'].items()):
+            strategies[strategy] = {
+                'runs': counters['runs'],
+                'win_rate': round(counters['wins'] / counters['runs'], 4) if counters['runs'] else None,
+                'near_win_rate': (round(counters['near_wins'] / counters['full_runs'], 4)
+                                  if counters['full_runs'] else None),
+                'decisive_rate': (round(counters['decisive'] / counters['full_runs'], 4)
+                                  if counters['full_runs'] else None),
+                'avg_gap': (round(counters['gap_sum'] / counters['gap_count'], 4)
+                            if counters['gap_count'] else None),
+                'prunable': self._prunable(counters),
+            }
+        return {'images': data['images'], 'path': self.path, 'strategies': strategies}
+
+    @staticmethod
+    def _prunable(counters):
+        if not counters or counters['full_runs'] < MIN_SAMPLES:
+            return False
+        return (counters['near_wins'] / counters['full_runs'] < MIN_WIN_RATE
+                and counters['decisive'] / counters['full_runs'] < MIN_DECISIVE_RATE)
+
+    def _current(self):
+        # plan() se llama en cada imagen: el archivo se relee como mucho
+        # cada FLUSH_INTERVAL segundos
+        now = time.monotonic()
+        if self._snapshot is None or now - self._snapshot_at >= FLUSH_INTERVAL:
+            self._snapshot = self.totals()
+            self._snapshot_at = now
+        return self._snapshot['strategies']
+
+    def plan(self, strategies, rng=random):
+        """
+        Estrategias a ejecutar en modo adaptativo
+
+        La más ganadora nunca se poda, aunque cumpla el criterio.
+
+        Returns:
+            (estrategias ordenadas por tasa de victorias y sin las podadas,
+             True si se ejecutan todas: muestra completa)
+        """
+        stats = self._current()
+
+        def win_rate(strategy):
+            counters = stats.get(strategy)
+            # Sin historial: delante, para que acumule muestras
+            return counters['wins'] / counters['runs'] if counters and counters['runs'] else 1.0
+
+        ordered = sorted(strategies, key=win_rate, reverse=True)
+        if rng.random() < EXPLORE_RATE:
+            return ordered, True
+        kept = ordered[:1] + [strategy for strategy in ordered[1:] if not self._prunable(stats.get(strategy))]
+        return kept, len(kept) == len(ordered)
+
+
+# Compartido por todo el proceso
+STRATEGY_STATS = StrategyStats()
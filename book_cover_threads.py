@@ -0,0 +1,186 @@
+"""
+Hilos de OpenCV y BLAS/OpenMP por worker
+
+OpenCV (y numpy con OpenBLAS/MKL) abre por defecto un hilo por núcleo. Con
+varios workers (pool web, batch, watch, manifest, daemon) cada uno abriría
+los suyos y N workers × N hilos compiten por los mismos núcleos: más cambios
+de contexto y peor latencia que con un solo hilo por worker.
+
+configure(workers) reparte los núcleos disponibles entre los workers y fija
+el resultado antes de arrancarlos:
+
+    • cv2.setNumThreads() en este proceso, si OpenCV ya está cargado
+    • OPENCV_FOR_THREADS_NUM y las variables de OpenMP/BLAS (OMP_NUM_THREADS,
+      OPENBLAS_NUM_THREADS, MKL_NUM_THREADS...), que heredan los procesos
+      worker y que esas librerías leen al cargarse
+    • con numpy ya cargado en este proceso (la web importa numpy y cv2 antes
+      de llamar a configure), las variables llegan tarde para él: el límite
+      de BLAS/OpenMP se fija en tiempo de ejecución con threadpoolctl si
+      está instalado, y si no se informa como no aplicado
+
+Núcleos disponibles: afinidad del proceso, recortada por la cuota de CPU del
+cgroup (contenedores con `--cpus`, límites de Kubernetes).
+
+Variables de entorno:
+    BOOKEDITOR_THREADS_PER_WORKER   fija los hilos por worker
+    OMP_NUM_THREADS, etc.           si ya vienen definidas se respetan
+"""
+
+import math
+import os
+import sys
+
+
+# Variables que leen OpenCV y las librerías de OpenMP/BLAS al cargarse
+THREAD_ENV_VARS = ('OPENCV_FOR_THREADS_NUM', 'OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                   'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+# Las definidas por el usuario antes de arrancar (configure() escribe en
+# os.environ y no debe confundir sus propios valores con los del usuario)
+_USER_ENV = {name: os.environ[name] for name in THREAD_ENV_VARS if name in os.environ}
+
+
+def cpu_quota():
+    """Cuota de CPU del cgroup en núcleos (p.ej. 1.5), o None sin límite"""
+    # cgroup v2: "<cuota> <periodo>" o "max <periodo>"
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()[:2]
+        if quota != 'max' and int(period) > 0:
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    # cgroup v1: cuota -1 = sin límite
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_cpus():
+    """Núcleos utilizables: afinidad del proceso recortada por la cuota del cgroup"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return max(1, cpus)
+
+
+def threads_per_worker(workers):
+    """Hilos de OpenCV/BLAS para cada uno de `workers` procesos simultáneos"""
+    forced = os.environ.get('BOOKEDITOR_THREADS_PER_WORKER')
+    if forced:
+        return max(1, int(forced))
+    return max(1, available_cpus() // max(1, workers))
+
+
+def worker_threads():
+    """Hilos por worker fijados por configure() (None si no se llamó)"""
+    value = os.environ.get('OPENCV_FOR_THREADS_NUM')
+    return int(value) if value and value.isdigit() else None
+
+
+def _env_threads(name, default):
+    value = os.environ.get(name, '')
+    return int(value) if value.isdigit() else default
+
+
+def limit_loaded_libraries(threads):
+    """
+    Límite de hilos para las librerías ya cargadas en este proceso
+
+    OpenCV con cv2.setNumThreads(); BLAS/OpenMP (cargados con numpy) con
+    threadpoolctl, dependencia opcional. Lo que aún no está cargado leerá
+    las variables de entorno al cargarse.
+
+    Returns:
+        {'opencv': ..., 'blas': ...}: 'entorno' (se aplicará al cargarse),
+        'aplicado' o 'no aplicado' (cargado antes y sin forma de cambiarlo)
+    """
+    status = {}
+    cv2 = sys.modules.get('cv2')
+    if cv2 is None:
+        status['opencv'] = 'entorno'
+    else:
+        cv2.setNumThreads(threads)
+        status['opencv'] = 'aplicado'
+
+    if 'numpy' not in sys.modules:
+        status['blas'] = 'entorno'
+        return status
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        status['blas'] = 'no aplicado'
+        return status
+    threadpool_limits(_env_threads('OPENBLAS_NUM_THREADS', threads), user_api='blas')
+    threadpool_limits(_env_threads('OMP_NUM_THREADS', threads), user_api='openmp')
+    status['blas'] = 'aplicado'
+    return status
+
+
+def configure(workers, label=None, log=True):
+    """
+    Reparte los núcleos entre `workers` procesos (o hilos) del pipeline
+
+    Llamar antes de crear el pool: los workers heredan las variables de
+    entorno. Las que el usuario ya había definido no se tocan.
+
+    Returns:
+        Dict con cpus, cuota del cgroup, workers, hilos por worker, el valor
+        de cada variable y, en `process`, si el límite llegó a las librerías
+        ya cargadas en este proceso (ver limit_loaded_libraries())
+    """
+    threads = threads_per_worker(workers)
+    for name in THREAD_ENV_VARS:
+        if name not in _USER_ENV:
+            os.environ[name] = str(threads)
+
+    opencv_threads = int(os.environ['OPENCV_FOR_THREADS_NUM'])
+    # Lo ya cargado leyó las variables antes de escribirlas: se fija a mano
+    process = limit_loaded_libraries(opencv_threads)
+
+    quota = cpu_quota()
+    config = {
+        'cpus': available_cpus(),
+        'cpu_quota': round(quota, 2) if quota is not None else None,
+        'workers': workers,
+        'threads_per_worker': opencv_threads,
+        'env': {name: os.environ[name] for name in THREAD_ENV_VARS},
+        'user_env': sorted(_USER_ENV),
+        'process': process,
+    }
+    if log:
+        quota_text = f" (cuota cgroup {config['cpu_quota']})" if quota is not None else ''
+        user_text = f" | respetadas: {', '.join(config['user_env'])}" if _USER_ENV else ''
+        print(f"🧵 {label + ': ' if label else ''}{config['cpus']} núcleos{quota_text}, "
+              f"{workers} workers × {opencv_threads} hilos OpenCV/BLAS{user_text}")
+        if process['blas'] == 'no aplicado':
+            print("⚠️  numpy ya estaba cargado: el límite de BLAS/OpenMP solo llega a los "
+                  "procesos worker, no a este (instala threadpoolctl para fijarlo aquí)")
+    return config
+
+
+def apply_worker_threads():
+    """
+    Inicializador de workers: fija cv2.setNumThreads con el valor heredado
+
+    OpenCV lee OPENCV_FOR_THREADS_NUM al crear su pool de hilos; se fija
+    también explícitamente, igual que BLAS/OpenMP, por si el worker los
+    cargó antes (fork).
+    """
+    threads = worker_threads()
+    if threads is not None:
+        import cv2  # noqa: F401
+
+        limit_loaded_libraries(threads)
@@ -0,0 +1,366 @@
+"""
+Modo carpeta vigilada de BookEditor
+Vigila una carpeta de entrada (inotify en Linux, sondeo periódico en el resto),
+espera a que cada archivo deje de crecer y lo procesa con process_cover en un
+pool acotado de procesos.
+
+    entrada/              fotos nuevas
+    entrada/procesadas/   originales ya procesados
+    entrada/fallidas/     originales que fallaron + <nombre>.motivo.txt
+    salida/               resultados: <nombre>_<ext>.png (a.jpg y a.png no se pisan)
+    salida/.watch_status.json   estado de la cola (pendientes, en curso...)
+
+Los originales solo se mueven al terminar, así que tras un reinicio basta con
+volver a escanear la carpeta de entrada para retomar el trabajo.
+
+Si un worker muere (crash nativo, OOM) el pool entero queda roto: se crea uno
+nuevo y los archivos que estaban en curso vuelven a la cola, una sola vez y
+de uno en uno. Solo el que vuelve a tumbar al worker estando aislado se da
+por fallido.
+"""
+
+import concurrent.futures
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import signal
+import struct
+import time
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from book_cover import IMAGE_EXTENSIONS, run_captured
+from book_cover_threads import apply_worker_threads, available_cpus, configure
+
+
+DONE_DIRNAME = 'procesadas'
+FAILED_DIRNAME = 'fallidas'
+STATUS_FILENAME = '.watch_status.json'
+
+# Re-escaneo completo periódico aunque haya inotify (eventos perdidos, NFS/SMB)
+RESCAN_INTERVAL = 30.0
+
+
+class InotifyWatcher:
+    """Eventos de creación/escritura/renombrado en una carpeta vía inotify (Linux)"""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self, path):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 falló')
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        if self._libc.inotify_add_watch(self.fd, os.fsencode(str(path)), mask) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch falló en {path}')
+
+    def read(self, timeout):
+        """
+        Espera eventos hasta `timeout` segundos
+
+        Returns:
+            (nombres de archivo afectados, True si la cola del kernel desbordó)
+        """
+        names, overflow = set(), False
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return names, overflow
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return names, overflow
+
+        offset = 0
+        while offset + self._EVENT.size <= len(data):
+            _, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                overflow = True
+            elif name:
+                names.add(os.fsdecode(name))
+        return names, overflow
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _warm_worker():
+    import book_cover_cli_v2  # noqa: F401
+
+    apply_worker_threads()
+
+    # El proceso principal gestiona la parada; los workers no reciben Ctrl+C
+    # y SIGTERM (al desechar un pool roto) los termina sin más
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def _stop_on_sigterm(signum, frame):
+    raise KeyboardInterrupt
+
+
+def output_name(name, output_format):
+    """foto.jpg -> foto_jpg.png: la extensión original evita que a.jpg y a.png se pisen"""
+    path = Path(name)
+    return f"{path.stem}_{path.suffix[1:]}.{output_format}"
+
+
+def _process_one(input_path, output_path, color, size, min_area):
+    """Worker: procesa una imagen escribiendo primero a un archivo temporal"""
+    output_path = Path(output_path)
+    partial = output_path.with_name(f".{output_path.stem}.partial{output_path.suffix}")
+    argv = ['detect', str(input_path), str(partial), '--color', color,
+            '--size', str(size[0]), str(size[1]), '--min-area', str(min_area)]
+    code, log = run_captured(argv)
+    if code == 0 and partial.exists():
+        os.replace(partial, output_path)
+    elif partial.exists():
+        partial.unlink()
+    return code, log
+
+
+class FolderWatcher:
+    """Cola de archivos estables → pool de workers → mover a procesadas/fallidas"""
+
+    def __init__(self, input_dir, output_dir, workers=None, color='#FFFFFF', canvas_size=(1920, 1080),
+                 min_area=0.1, settle=2.0, poll_interval=1.0, output_format='png', use_inotify=True):
+        self.input_dir = Path(input_dir)
+        self.output_dir = Path(output_dir)
+        self.done_dir = self.input_dir / DONE_DIRNAME
+        self.failed_dir = self.input_dir / FAILED_DIRNAME
+        self.workers = workers or available_cpus()
+        self.color = color
+        self.canvas_size = tuple(canvas_size)
+        self.min_area = min_area
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.output_format = output_format
+        self.use_inotify = use_inotify
+
+        # Archivos vistos que aún pueden estar creciendo: nombre -> (tamaño, mtime, estable_desde)
+        self.pending = {}
+        # Archivos estables esperando un worker libre (FIFO)
+        self.queue = []
+        self.in_flight = {}
+        # En curso cuando se rompió el pool: se reintentan una vez, aislados
+        self.suspects = set()
+        self.executor = None
+        self.restarts = 0
+        self.done = 0
+        self.failed = 0
+        self._last_status = None
+
+    # -- descubrimiento ------------------------------------------------------
+
+    def _is_candidate(self, name):
+        return not name.startswith('.') and Path(name).suffix.lower() in IMAGE_EXTENSIONS
+
+    def _track(self, name):
+        if not self._is_candidate(name):
+            return
+        if name in self.pending or name in self.in_flight or name in self.queue:
+            return
+        self.pending[name] = (-1, -1, None)
+
+    def scan(self):
+        """Escaneo completo de la carpeta de entrada (arranque, sondeo o desbordamiento)"""
+        with os.scandir(self.input_dir) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    self._track(entry.name)
+
+    def _check_stable(self):
+        """Pasa a la cola los archivos cuyo tamaño y mtime no cambian desde hace `settle` s"""
+        now = time.monotonic()
+        for name, (size, mtime, stable_since) in list(self.pending.items()):
+            try:
+                st = os.stat(self.input_dir / name)
+            except FileNotFoundError:
+                del self.pending[name]
+                continue
+            if (st.st_size, st.st_mtime) != (size, mtime) or st.st_size == 0:
+                self.pending[name] = (st.st_size, st.st_mtime, now)
+            elif now - stable_since >= self.settle:
+                del self.pending[name]
+                self.queue.append(name)
+
+    # -- procesamiento -------------------------------------------------------
+
+    def _new_executor(self):
+        return concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+
+    def _restart_pool(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = self._new_executor()
+        self.restarts += 1
+
+    def _submit(self):
+        # Como mucho 2 trabajos por worker en el executor: el resto espera en
+        # self.queue, que es lo que se publica como profundidad de cola. Un
+        # sospechoso (ver _pool_broken) solo se envía con el pool vacío y
+        # ocupa el pool él solo
+        while self.queue and len(self.in_flight) < self.workers * 2:
+            if any(name in self.suspects for name in self.in_flight):
+                return
+            name = self.queue[0]
+            if name in self.suspects and self.in_flight:
+                return
+            output_path = self.output_dir / output_name(name, self.output_format)
+            try:
+                future = self.executor.submit(_process_one, str(self.input_dir / name), str(output_path),
+                                              self.color, self.canvas_size, self.min_area)
+            except BrokenProcessPool:
+                # Roto desde la última recogida: si hay trabajos en curso lo
+                # gestiona _collect al ver sus futures; si no, se recrea aquí
+                if not self.in_flight:
+                    self._restart_pool()
+                    continue
+                return
+            self.queue.pop(0)
+            self.in_flight[name] = future
+
+    def _collect(self, timeout):
+        if not self.in_flight:
+            return
+        futures = {future: name for name, future in self.in_flight.items()}
+        finished, _ = concurrent.futures.wait(futures, timeout=timeout,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+        broken = False
+        for future in finished:
+            name = futures[future]
+            try:
+                code, log = future.result()
+            except BrokenProcessPool:
+                broken = True
+                continue
+            except Exception as e:
+                code, log = 1, f"Error en el worker: {e!r}\n"
+            del self.in_flight[name]
+            self._finish(name, code, log)
+        if broken:
+            self._pool_broken()
+
+    def _pool_broken(self):
+        """
+        Un worker murió y el pool quedó roto: no se sabe qué archivo fue
+
+        Los que estaban en curso vuelven a la cabeza de la cola como
+        sospechosos y se procesan de uno en uno; solo falla el que rompe el
+        pool estando aislado.
+        """
+        names = list(self.in_flight)
+        self.in_flight.clear()
+        requeued = []
+        for name in names:
+            if name in self.suspects:
+                self._finish(name, 1, "Worker terminado inesperadamente (también procesando este "
+                                      "archivo solo): crash nativo u OOM\n")
+            else:
+                self.suspects.add(name)
+                requeued.append(name)
+        self.queue[:0] = requeued
+        self._restart_pool()
+        if requeued:
+            print(f"⚠️  Un worker murió: pool reiniciado; se reintentan de uno en uno: {', '.join(requeued)}")
+
+    def _finish(self, name, code, log):
+        self.suspects.discard(name)
+        source = self.input_dir / name
+        if not source.exists():
+            return
+        if code == 0:
+            self.done += 1
+            os.replace(source, self.done_dir / name)
+            print(f"✅ {name}")
+        else:
+            self.failed += 1
+            os.replace(source, self.failed_dir / name)
+            reason_path = self.failed_dir / f"{name}.motivo.txt"
+            reason_path.write_text(log, encoding='utf-8')
+            print(f"❌ {name} (motivo en {reason_path})")
+
+    def status(self):
+        return {
+            'pending': len(self.pending),
+            'queued': len(self.queue),
+            'in_progress': len(self.in_flight),
+            'done': self.done,
+            'failed': self.failed,
+            'workers': self.workers,
+            'restarts': self.restarts,
+        }
+
+    def _publish_status(self):
+        status = self.status()
+        if status == self._last_status:
+            return
+        self._last_status = dict(status)
+        status['updated'] = time.time()
+        tmp_path = self.output_dir / f"{STATUS_FILENAME}.tmp"
+        tmp_path.write_text(json.dumps(status), encoding='utf-8')
+        os.replace(tmp_path, self.output_dir / STATUS_FILENAME)
+        print(f"📊 Cola: {status['queued']} en espera, {status['in_progress']} en curso, "
+              f"{status['pending']} copiándose | ✅ {status['done']} ❌ {status['failed']}")
+
+    # -- bucle principal -----------------------------------------------------
+
+    def run(self):
+        for path in (self.output_dir, self.done_dir, self.failed_dir):
+            path.mkdir(parents=True, exist_ok=True)
+
+        watcher = None
+        if self.use_inotify:
+            try:
+                watcher = InotifyWatcher(self.input_dir)
+            except (OSError, AttributeError):
+                watcher = None
+
+        print(f"👀 Vigilando {self.input_dir} → {self.output_dir}")
+        print(f"   Workers: {self.workers} | Detección de cambios: "
+              f"{'inotify' if watcher else f'sondeo cada {self.poll_interval}s'}")
+        print("⏹️  Presiona Ctrl+C para detener")
+        configure(self.workers, 'watch')
+
+        signal.signal(signal.SIGTERM, _stop_on_sigterm)
+        self.scan()  # retomar lo que quedó pendiente antes de un reinicio
+        last_rescan = time.monotonic()
+
+        self.executor = self._new_executor()
+        try:
+            while True:
+                if watcher:
+                    # Con archivos pendientes de estabilizarse se despierta a menudo
+                    timeout = 0.25 if (self.pending or self.in_flight) else self.poll_interval
+                    names, overflow = watcher.read(timeout)
+                    for name in names:
+                        self._track(name)
+                    if overflow or time.monotonic() - last_rescan > RESCAN_INTERVAL:
+                        self.scan()
+                        last_rescan = time.monotonic()
+                else:
+                    self.scan()
+                    if not self.in_flight:
+                        time.sleep(self.poll_interval)
+
+                self._check_stable()
+                self._submit()
+                self._collect(timeout=0 if watcher else min(self.poll_interval, 0.25))
+                self._publish_status()
+        except KeyboardInterrupt:
+            print("\n⏹️  Deteniendo: los archivos en curso se retomarán en el próximo arranque")
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            if watcher:
+                watcher.close()
+        return 0
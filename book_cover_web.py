@@ -4,16 +4,97 @@ Herramienta web para detectar y recortar portadas de libros físicos
 Versión 2: Usa detección de contornos en lugar de eliminación de fondo
 """
 
-from flask import Flask, render_template_string, request, send_file, jsonify
-from PIL import Image
+from flask import Flask, render_template_string, request, send_file, jsonify, redirect, url_for
 import cv2
 import numpy as np
 import io
+import multiprocessing
+import os
+import re
 import base64
+import threading
+import time
+import zipfile
+
+from book_cover_admission import AdmissionController, Overloaded
+from book_cover_cache import default_cache, default_debug_store, default_result_store
+from book_cover_decode import MAX_MEGAPIXELS, ImageTooLarge, check_pixel_budget
+from book_cover_detect import DEBUG_MAX_SIDE, render_overlay
+from book_cover_pipeline import (ADAPTIVE_STRATEGIES, DEFAULT_CANVAS, DEFAULT_PIPELINE, render_cover,
+                                  warm_up_pipeline)
+from book_cover_pool import MAX_JOBS_PER_WORKER, RENDER_TIMEOUT, CoverPool, WorkerTimeout
+from book_cover_render import PIPELINES, parse_renditions
+from book_cover_singleflight import SingleFlight, request_key
+from book_cover_telemetry import STRATEGY_STATS
+from book_cover_threads import configure as configure_threads
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
 
+
+MAX_CANVAS_SIDE = 8000
+
+
+def encode_shared(result):
+    """(renditions, info) -> blobs + JSON, para la caché de disco y para compartirlo entre procesos"""
+    results, info = result
+    return ({name: rendition['data'] for name, rendition in results.items()},
+            {'renditions': {name: {k: v for k, v in rendition.items() if k != 'data'}
+                            for name, rendition in results.items()},
+             'info': info})
+
+
+def decode_shared(blobs, meta):
+    results = {name: dict(meta['renditions'][name], data=data) for name, data in blobs.items()}
+    return results, meta['info']
+
+
+# Coalescencia de peticiones idénticas; con BOOKEDITOR_SINGLEFLIGHT_DIR también
+# entre workers (gunicorn -w N) a través de un directorio de locks local
+single_flight = SingleFlight(os.environ.get('BOOKEDITOR_SINGLEFLIGHT_DIR'), encode_shared, decode_shared)
+
+# Límite de detecciones simultáneas y de peticiones en espera (ver
+# BOOKEDITOR_MAX_CONCURRENT / BOOKEDITOR_MAX_QUEUE)
+admission = AdmissionController()
+
+# Caché persistente de resultados (BOOKEDITOR_CACHE_DIR, BOOKEDITOR_CACHE_MAX_MB)
+result_cache = default_cache()
+
+# Resultados publicados en /results/<sha256>.<ext>: la URL depende solo del
+# contenido, así que navegador, CDN y proxy pueden cachearla para siempre
+result_store = default_result_store()
+RESULT_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+RESULT_DIGEST = re.compile(r'[0-9a-f]{64}')
+
+# Peticiones con debug=1: entrada + informe de candidatos en /debug/<id>; el
+# overlay se dibuja solo cuando se pide /debug/<id>.jpg
+debug_store = default_debug_store()
+
+# Pool de procesos para el pipeline de visión, del mismo tamaño que la
+# concurrencia admitida. BOOKEDITOR_POOL_WORKERS=0 procesa en el hilo de la
+# petición, como antes. Un trabajo que no responde en BOOKEDITOR_POOL_TIMEOUT
+# segundos (o pasado su plazo) mata al worker y responde 504
+POOL_WORKERS = int(os.environ.get('BOOKEDITOR_POOL_WORKERS', admission.max_concurrent))
+POOL_MAX_JOBS = int(os.environ.get('BOOKEDITOR_POOL_MAX_JOBS', MAX_JOBS_PER_WORKER))
+POOL_TIMEOUT = float(os.environ.get('BOOKEDITOR_POOL_TIMEOUT', RENDER_TIMEOUT))
+_cover_pool = None
+_cover_pool_lock = threading.Lock()
+
+# Calentamiento al arrancar: pipeline completo sobre una imagen sintética (en
+# cada worker del pool) antes de dar el servicio por listo en /ready.
+# BOOKEDITOR_WARMUP=0 lo desactiva
+WARMUP = os.environ.get('BOOKEDITOR_WARMUP', '1').lower() not in ('0', 'false', 'off')
+warmup_state = {'ready': not WARMUP, 'seconds': None, 'error': None}
+
+# Hilos de OpenCV/BLAS: los núcleos se reparten entre todo lo que ejecuta el
+# pipeline a la vez (los workers del pool o, sin pool, las peticiones
+# admitidas) en cada proceso del servidor (WEB_CONCURRENCY, como gunicorn).
+# Los workers del pool heredan las variables de entorno y no repiten el log
+WEB_PROCESSES = int(os.environ.get('WEB_CONCURRENCY', 1))
+THREAD_CONFIG = configure_threads((POOL_WORKERS if POOL_WORKERS > 0 else admission.max_concurrent)
+                                  * WEB_PROCESSES, 'web',
+                                  log=multiprocessing.parent_process() is None)
+
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html lang="es">
@@ -510,8 +591,11 @@ HTML_TEMPLATE = """
                     throw new Error(error.error || 'Error al procesar la imagen');
                 }
 
-                const blob = await response.blob();
-                const url = URL.createObjectURL(blob);
+                // Con almacén de resultados, fetch sigue la redirección a
+                // /results/...: esa URL es cacheable y se puede compartir
+                const url = response.redirected
+                    ? response.url
+                    : URL.createObjectURL(await response.blob());
 
                 resultImage.src = url;
                 downloadBtn.href = url;
@@ -540,216 +624,239 @@ HTML_TEMPLATE = """
 """
 
 
-def order_points(pts):
-    """Ordena puntos del contorno"""
-    rect = np.zeros((4, 2), dtype="float32")
-    s = pts.sum(axis=1)
-    rect[0] = pts[np.argmin(s)]
-    rect[2] = pts[np.argmax(s)]
-    diff = np.diff(pts, axis=1)
-    rect[1] = pts[np.argmin(diff)]
-    rect[3] = pts[np.argmax(diff)]
-    return rect
-
-
-def score_contour_web(contour, total_area, img_width, img_height):
-    """Calcula score para determinar la mejor portada"""
-    area = cv2.contourArea(contour)
-    area_ratio = area / total_area
-    x, y, w, h = cv2.boundingRect(contour)
-    aspect_ratio = h / w if w > 0 else 0
-
-    center_x, center_y = x + w/2, y + h/2
-    center_dist = np.sqrt((center_x - img_width/2)**2 + (center_y - img_height/2)**2)
-    max_dist = np.sqrt((img_width/2)**2 + (img_height/2)**2)
-    center_score = 1 - (center_dist / max_dist)
-
-    if area_ratio > 0.95:
-        area_score = 0.3
-    elif area_ratio > 0.85:
-        area_score = 0.6
-    else:
-        area_score = min(area_ratio / 0.5, 1.0)
-
-    if 1.2 <= aspect_ratio <= 1.8:
-        aspect_score = 1.0
-    elif 0.55 <= aspect_ratio <= 0.85:
-        aspect_score = 0.9
-    elif 1.0 <= aspect_ratio <= 2.0:
-        aspect_score = 0.7
-    else:
-        aspect_score = 0.3
-
-    peri = cv2.arcLength(contour, True)
-    complexity = peri / (2 * (w + h)) if (w + h) > 0 else 999
-    complexity_score = 1.0 if complexity < 1.1 else (0.5 if complexity < 1.3 else 0.2)
-
-    total_score = (area_score * 0.35 + aspect_score * 0.30 +
-                   center_score * 0.20 + complexity_score * 0.15)
-
-    return total_score
-
-
-def auto_crop_margins(img):
-    """Recorta márgenes uniformes detectando cambios de color significativos"""
-    h, w = img.shape[:2]
-
-    # Convertir a escala de grises
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
-    # Calcular varianza en cada fila y columna
-    row_var = np.var(gray, axis=1)
-    col_var = np.var(gray, axis=0)
+# Contadores de peticiones con presupuesto de tiempo
+deadline_stats = {'with_budget': 0, 'degraded': 0, 'overruns': 0}
+deadline_lock = threading.Lock()
 
-    # Umbral: si la varianza es muy baja, probablemente es margen uniforme
-    row_threshold = np.percentile(row_var, 25)  # 25% más bajo = márgenes
-    col_threshold = np.percentile(col_var, 25)
 
-    # Encontrar primeras y últimas filas/columnas con contenido
-    content_rows = np.where(row_var > row_threshold)[0]
-    content_cols = np.where(col_var > col_threshold)[0]
+_index_html = None
 
-    if len(content_rows) > 0 and len(content_cols) > 0:
-        top = content_rows[0]
-        bottom = content_rows[-1] + 1
-        left = content_cols[0]
-        right = content_cols[-1] + 1
 
-        # Aplicar solo si el recorte es > 2% en algún lado
-        crop_ratio = ((right - left) * (bottom - top)) / (w * h)
-
-        if crop_ratio < 0.98:
-            cropped = img[top:bottom, left:right]
-            return cropped
-
-    return img
-
-
-def detect_book_cover(image_data, min_area_ratio=0.1):
-    """Detecta portada usando múltiples estrategias"""
+@app.route('/')
+def index():
+    # La plantilla no tiene variables: se compila una sola vez
+    global _index_html
+    if _index_html is None:
+        _index_html = render_template_string(HTML_TEMPLATE)
+    return _index_html
+
+
+def cached_result(cache_key):
+    """
+    Resultado de la caché de disco, o None si no está
+
+    Returns:
+        (renditions, info)
+    """
+    if result_cache is None:
+        return None
+    cached = result_cache.get(cache_key)
+    return None if cached is None else decode_shared(*cached)
+
+
+def cached_pipeline(cache_key, input_data, **params):
+    """
+    run_pipeline() con turno de admisión, guardando el resultado en la caché
+
+    Los resultados degradados por presupuesto de tiempo no se guardan: la
+    siguiente petición sin prisa debe obtener el resultado completo.
+
+    Returns:
+        (renditions, info)
+    """
+    results, info = admission.run(lambda: run_pipeline(input_data, **params))
+    if result_cache is not None and not info['degraded']:
+        result_cache.put(cache_key, *encode_shared((results, info)))
+    return results, info
+
+
+def get_cover_pool():
+    """Pool de workers (se arranca con la primera petición), o None si está desactivado"""
+    global _cover_pool
+    if POOL_WORKERS <= 0:
+        return None
+    with _cover_pool_lock:
+        if _cover_pool is None:
+            _cover_pool = CoverPool(POOL_WORKERS, POOL_MAX_JOBS, warmup=WARMUP, timeout=POOL_TIMEOUT)
+    return _cover_pool
+
+
+def run_pipeline(input_data, **params):
+    """render_cover() en un worker del pool o, sin pool, en este hilo"""
+    pool = get_cover_pool()
+    if pool is None:
+        return render_cover(input_data, **params)
+    return pool.render(input_data, **params)
+
+
+def warm_up():
+    """Calentamiento del arranque (hilo aparte); /ready responde 503 hasta que termina"""
+    start = time.monotonic()
+    try:
+        with app.test_request_context('/'):
+            index()
+        pool = get_cover_pool()
+        if pool is None:
+            warm_up_pipeline()
+        else:
+            pool.wait_ready()
+    except Exception as e:
+        warmup_state['error'] = f"{type(e).__name__}: {e}"
+        print(f"❌ Calentamiento fallido: {warmup_state['error']}")
+        return
+    warmup_state['seconds'] = round(time.monotonic() - start, 2)
+    warmup_state['ready'] = True
+    print(f"🔥 Calentamiento completado en {warmup_state['seconds']}s")
 
-    nparr = np.frombuffer(image_data, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
 
+def parse_canvas_size():
+    """Tamaño del lienzo de los campos width/height (1920x1080 por defecto)"""
+    try:
+        width = int(request.form.get('width', DEFAULT_CANVAS[0]))
+        height = int(request.form.get('height', DEFAULT_CANVAS[1]))
+    except ValueError:
+        raise ValueError("width/height deben ser números enteros")
+    if not (0 < width <= MAX_CANVAS_SIDE and 0 < height <= MAX_CANVAS_SIDE):
+        raise ValueError(f"El lienzo debe medir entre 1 y {MAX_CANVAS_SIDE} px por lado")
+    return width, height
+
+
+def rendition_download(results):
+    """
+    Una rendition se entrega tal cual; varias, en un ZIP
+
+    Returns:
+        (bytes, mimetype, extensión, nombre de descarga)
+    """
+    if len(results) == 1:
+        name, rendition = next(iter(results.items()))
+        suffix = '' if name == 'slide' else f'_{name}'
+        return (rendition['data'], rendition['mimetype'], rendition['extension'],
+                f"portada_procesada{suffix}.{rendition['extension']}")
+
+    archive = io.BytesIO()
+    # PNG y JPEG ya van comprimidos: ZIP sin compresión
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as zf:
+        for name, rendition in results.items():
+            zf.writestr(f"portada_{name}.{rendition['extension']}", rendition['data'])
+    return archive.getvalue(), 'application/zip', 'zip', 'portada_procesada.zip'
+
+
+def rendition_response(results, debug_url=None):
+    """
+    Respuesta de /process
+
+    Con almacén de resultados se publica el archivo y se redirige (303) a
+    /results/<hash>.<ext>; con `Accept: application/json` se devuelve la URL
+    en JSON. Sin almacén, el archivo va en el cuerpo de la respuesta.
+    """
+    data, mimetype, extension, download_name = rendition_download(results)
+    if result_store is None:
+        return send_file(io.BytesIO(data), mimetype=mimetype, as_attachment=True,
+                         download_name=download_name)
+
+    digest = result_store.publish(data, extension, mimetype, download_name)
+    url = url_for('result', digest=digest, extension=extension)
+    if request.accept_mimetypes.best == 'application/json':
+        response = jsonify({'url': url, 'etag': digest, 'mimetype': mimetype, 'size': len(data),
+                            'debug': debug_url})
+        response.headers['Location'] = url
+        return response
+    return redirect(url, code=303)
+
+
+@app.route('/results/<digest>.<extension>')
+def result(digest, extension):
+    """Resultado publicado: ETag fuerte (el propio hash) y caché inmutable"""
+    if result_store is None or not RESULT_DIGEST.fullmatch(digest):
+        return jsonify({'error': 'Resultado no encontrado'}), 404
+
+    # El contenido de una URL nunca cambia: si el cliente ya tiene este ETag,
+    # no hace falta ni leerlo del disco
+    if request.if_none_match.contains(digest):
+        response = app.response_class(status=304)
+        response.set_etag(digest)
+        response.headers['Cache-Control'] = RESULT_CACHE_CONTROL
+        return response
+
+    entry = result_store.get(digest)
+    if entry is None or entry[1]['extension'] != extension:
+        return jsonify({'error': 'Resultado no encontrado (puede haber caducado)'}), 404
+
+    data, meta = entry
+    response = send_file(io.BytesIO(data), mimetype=meta['mimetype'],
+                         download_name=meta['download_name'], etag=digest)
+    response.headers['Cache-Control'] = RESULT_CACHE_CONTROL
+    return response
+
+
+def publish_debug(debug_id, input_data, report):
+    """Guarda entrada + informe para /debug/<id> y devuelve su URL (o None)"""
+    if debug_store is None or report is None:
+        return None
+    if not debug_store.contains(debug_id):
+        debug_store.put(debug_id, {'input': input_data}, report)
+    return url_for('debug_report', debug_id=debug_id)
+
+
+def debug_entry(debug_id):
+    if debug_store is None or not RESULT_DIGEST.fullmatch(debug_id):
+        return None
+    return debug_store.get(debug_id)
+
+
+@app.route('/debug/<debug_id>')
+def debug_report(debug_id):
+    """Informe de candidatos de una petición con debug=1"""
+    entry = debug_entry(debug_id)
+    if entry is None:
+        return jsonify({'error': 'Informe no encontrado (puede haber caducado)'}), 404
+    _, report = entry
+    return jsonify(dict(report, overlay=url_for('debug_overlay', debug_id=debug_id)))
+
+
+@app.route('/debug/<debug_id>.jpg')
+def debug_overlay(debug_id):
+    """Overlay de candidatos, dibujado al pedirlo y a resolución reducida"""
+    entry = debug_entry(debug_id)
+    if entry is None:
+        return jsonify({'error': 'Informe no encontrado (puede haber caducado)'}), 404
+    blobs, report = entry
+
+    # JPEG: el decodificador ya reduce 2/4/8 veces (DCT) sin decodificar todo
+    flag = cv2.IMREAD_COLOR
+    for factor, reduced in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                            (2, cv2.IMREAD_REDUCED_COLOR_2)):
+        if max(report['image_size']) / factor >= DEBUG_MAX_SIDE:
+            flag = reduced
+            break
+    img = cv2.imdecode(np.frombuffer(blobs['input'], np.uint8), flag)
     if img is None:
-        raise ValueError("No se pudo leer la imagen")
-
-    original = img.copy()
-    height, width = img.shape[:2]
-    total_area = height * width
-
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-    kernel = np.ones((5, 5), np.uint8)
-
-    candidates = []
-
-    # Estrategia 1: Canny estándar
-    edges1 = cv2.Canny(blurred, 30, 100)
-    dilated1 = cv2.dilate(edges1, kernel, iterations=2)
-    contours1, _ = cv2.findContours(dilated1, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    for contour in sorted(contours1, key=cv2.contourArea, reverse=True)[:10]:
-        peri = cv2.arcLength(contour, True)
-        approx = cv2.approxPolyDP(contour, 0.02 * peri, True)
-        if len(approx) == 4 and cv2.contourArea(contour) / total_area > min_area_ratio:
-            candidates.append(approx)
-
-    # Estrategia 2: Canny sensible
-    edges2 = cv2.Canny(blurred, 50, 150)
-    dilated2 = cv2.dilate(edges2, kernel, iterations=3)
-    contours2, _ = cv2.findContours(dilated2, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    for contour in sorted(contours2, key=cv2.contourArea, reverse=True)[:10]:
-        peri = cv2.arcLength(contour, True)
-        approx = cv2.approxPolyDP(contour, 0.02 * peri, True)
-        if len(approx) == 4 and cv2.contourArea(contour) / total_area > min_area_ratio:
-            candidates.append(approx)
-
-    # Estrategia 3: Umbralización adaptativa
-    thresh = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                   cv2.THRESH_BINARY_INV, 11, 2)
-    dilated3 = cv2.dilate(thresh, kernel, iterations=2)
-    contours3, _ = cv2.findContours(dilated3, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    for contour in sorted(contours3, key=cv2.contourArea, reverse=True)[:10]:
-        peri = cv2.arcLength(contour, True)
-        approx = cv2.approxPolyDP(contour, 0.02 * peri, True)
-        if len(approx) == 4 and cv2.contourArea(contour) / total_area > min_area_ratio:
-            candidates.append(approx)
-
-    # Estrategia 4: Otsu
-    _, thresh_otsu = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-    dilated4 = cv2.dilate(thresh_otsu, kernel, iterations=2)
-    contours4, _ = cv2.findContours(dilated4, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    for contour in sorted(contours4, key=cv2.contourArea, reverse=True)[:10]:
-        peri = cv2.arcLength(contour, True)
-        approx = cv2.approxPolyDP(contour, 0.02 * peri, True)
-        if len(approx) == 4 and cv2.contourArea(contour) / total_area > min_area_ratio:
-            candidates.append(approx)
-
-    if not candidates:
-        # No se encontraron contornos rectangulares - asumir portada digital
-        # Intentar recortar márgenes automáticamente
-        cropped = auto_crop_margins(original)
-        img_rgb = cv2.cvtColor(cropped, cv2.COLOR_BGR2RGB)
-        return Image.fromarray(img_rgb)
-
-    # Evaluar candidatos con scoring
-    best_score = 0
-    book_contour = None
-
-    for approx in candidates:
-        contour_full = approx.reshape(-1, 1, 2)
-        score = score_contour_web(contour_full, total_area, width, height)
-        if score > best_score:
-            best_score = score
-            book_contour = approx
-
-    if book_contour is None:
-        # No se encontró un contorno con score adecuado - asumir portada digital
-        # Intentar recortar márgenes automáticamente
-        cropped = auto_crop_margins(original)
-        img_rgb = cv2.cvtColor(cropped, cv2.COLOR_BGR2RGB)
-        return Image.fromarray(img_rgb)
-
-    # Ordenar puntos y extraer portada
-    pts = book_contour.reshape(4, 2)
-    rect = order_points(pts)
-
-    (tl, tr, br, bl) = rect
-    widthA = np.linalg.norm(br - bl)
-    widthB = np.linalg.norm(tr - tl)
-    maxWidth = max(int(widthA), int(widthB))
-
-    heightA = np.linalg.norm(tr - br)
-    heightB = np.linalg.norm(tl - bl)
-    maxHeight = max(int(heightA), int(heightB))
-
-    dst = np.array([
-        [0, 0],
-        [maxWidth - 1, 0],
-        [maxWidth - 1, maxHeight - 1],
-        [0, maxHeight - 1]
-    ], dtype="float32")
-
-    M = cv2.getPerspectiveTransform(rect, dst)
-    warped = cv2.warpPerspective(original, M, (maxWidth, maxHeight))
-
-    # Convertir de BGR a RGB
-    warped_rgb = cv2.cvtColor(warped, cv2.COLOR_BGR2RGB)
-
-    return Image.fromarray(warped_rgb)
+        return jsonify({'error': 'No se pudo leer la imagen'}), 500
 
+    ok, encoded = cv2.imencode('.jpg', render_overlay(img, report), [cv2.IMWRITE_JPEG_QUALITY, 85])
+    if not ok:
+        return jsonify({'error': 'No se pudo codificar el overlay'}), 500
+    return send_file(io.BytesIO(encoded.tobytes()), mimetype='image/jpeg')
 
-@app.route('/')
-def index():
-    return render_template_string(HTML_TEMPLATE)
+
+def parse_time_budget():
+    """Presupuesto en segundos del campo time_budget o la cabecera X-Time-Budget"""
+    value = request.form.get('time_budget') or request.headers.get('X-Time-Budget')
+    if not value:
+        return None
+    try:
+        budget = float(value)
+    except ValueError:
+        raise ValueError(f"time_budget no válido: {value}")
+    if budget <= 0:
+        raise ValueError("time_budget debe ser mayor que 0")
+    return budget
 
 
 @app.route('/process', methods=['POST'])
 def process():
+    received = time.monotonic()
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No se envió ningún archivo'}), 400
@@ -757,68 +864,107 @@ def process():
         file = request.files['file']
         color = request.form.get('color', '#FFFFFF')
         min_area = float(request.form.get('min_area', 0.1))
+        time_budget = parse_time_budget()
+        canvas_size = parse_canvas_size()
+        # Varias renditions (slide,square,thumb,cutout) con una sola detección
+        renditions = tuple(parse_renditions(request.form.get('renditions', 'slide'))) or ('slide',)
+        pipeline = request.form.get('pipeline', DEFAULT_PIPELINE)
+        if pipeline not in PIPELINES:
+            raise ValueError(f"pipeline no válido: {pipeline} (disponibles: {', '.join(PIPELINES)})")
+        debug = request.form.get('debug', '').lower() in ('1', 'true', 'on')
+        # El plazo cuenta desde que llega la petición (incluye la espera en cola)
+        deadline = received + time_budget if time_budget else None
 
         if file.filename == '':
             return jsonify({'error': 'No se seleccionó ningún archivo'}), 400
 
-        # Leer imagen
+        # Leer imagen; las que superan el presupuesto de píxeles (y no se
+        # pueden decodificar reducidas) se rechazan antes de pedir turno
         input_data = file.read()
+        check_pixel_budget(input_data)
+
+        # La caché ignora el presupuesto de tiempo: un resultado completo sirve
+        # a todos. El de píxeles sí cuenta (decide si se decodifica reducida)
+        cache_key = request_key(input_data, color.upper(), min_area, canvas_size, renditions, pipeline, debug,
+                                MAX_MEGAPIXELS)
+        key = request_key(cache_key.encode(), time_budget)
+
+        # Un acierto de caché es leer un archivo: no espera turno ni cuenta en la cola
+        hit = cached_result(cache_key)
+        cached = hit is not None
+        if cached:
+            (results, info), shared = hit, False
+        else:
+            # Subidas idénticas simultáneas (doble clic, varias pestañas)
+            # comparten una sola ejecución del pipeline, que pide turno
+            (results, info), shared = single_flight.do(
+                key, lambda: cached_pipeline(cache_key, input_data, color=color, min_area=min_area,
+                                             deadline=deadline, canvas_size=canvas_size,
+                                             renditions=renditions, pipeline=pipeline, debug=debug))
+
+        if time_budget:
+            with deadline_lock:
+                deadline_stats['with_budget'] += 1
+                deadline_stats['degraded'] += info['degraded']
+                deadline_stats['overruns'] += time.monotonic() > deadline
+
+        debug_url = publish_debug(key, input_data, info.get('report')) if debug else None
+        response = rendition_response(results, debug_url)
+        if debug_url:
+            response.headers['X-Debug-Report'] = debug_url
+        response.headers['X-Coalesced'] = '1' if shared else '0'
+        response.headers['X-Cache'] = 'HIT' if cached else 'MISS'
+        if info['degraded']:
+            response.headers['X-Degraded'] = '; '.join(info['reasons'])
+        return response
+
+    except Overloaded as e:
+        response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 503
+    except WorkerTimeout as e:
+        return jsonify({'error': str(e)}), 504
+    except ImageTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error al procesar: {str(e)}'}), 500
 
-        # Detectar y recortar portada
-        cover_img = detect_book_cover(input_data, min_area_ratio=min_area)
-
-        # Convertir color
-        hex_color = color.lstrip('#')
-        rgb_color = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-
-        # Crear lienzo 1920x1080
-        canvas = Image.new('RGB', (1920, 1080), rgb_color)
-
-        # Escalar portada al 80% del alto del lienzo
-        canvas_width, canvas_height = canvas.size
-        cover_width, cover_height = cover_img.size
-
-        target_height = int(canvas_height * 0.8)
-        scale_ratio = target_height / cover_height
-        new_width = int(cover_width * scale_ratio)
-        new_height = target_height
 
-        # Si el ancho escalado es mayor que el lienzo, reajustar por ancho
-        if new_width > canvas_width * 0.9:
-            target_width = int(canvas_width * 0.9)
-            scale_ratio = target_width / cover_width
-            new_width = target_width
-            new_height = int(cover_height * scale_ratio)
+@app.route('/status')
+def status():
+    return jsonify({
+        'admission': admission.stats(),
+        'single_flight': single_flight.stats(),
+        'deadlines': dict(deadline_stats),
+        'pool': _cover_pool.stats() if _cover_pool else {'workers': POOL_WORKERS, 'started': False},
+        'cache': result_cache.stats() if result_cache else None,
+        'strategies': dict(STRATEGY_STATS.summary(), adaptive=ADAPTIVE_STRATEGIES),
+        'results': result_store.stats() if result_store else None,
+        'threads': THREAD_CONFIG,
+        'warmup': warmup_state,
+    })
 
-        cover_img = cover_img.resize((new_width, new_height), Image.LANCZOS)
 
-        # Centrar portada escalada
-        x = (canvas_width - new_width) // 2
-        y = (canvas_height - new_height) // 2
+@app.route('/healthz')
+def healthz():
+    """Liveness: el proceso responde (aunque siga calentándose)"""
+    return jsonify({'status': 'ok'})
 
-        canvas.paste(cover_img, (x, y))
 
-        # Guardar
-        output = io.BytesIO()
-        canvas.save(output, format='PNG', quality=95)
-        output.seek(0)
+@app.route('/ready')
+def ready():
+    """Readiness: 503 hasta que termina el calentamiento (o si falló)"""
+    return jsonify(warmup_state), 200 if warmup_state['ready'] else 503
 
-        return send_file(
-            output,
-            mimetype='image/png',
-            as_attachment=True,
-            download_name='portada_procesada.png'
-        )
 
-    except ValueError as e:
-        return jsonify({'error': str(e)}), 400
-    except Exception as e:
-        return jsonify({'error': f'Error al procesar: {str(e)}'}), 500
+# Los workers del pool también importan este módulo: se calientan ellos mismos
+if WARMUP and multiprocessing.parent_process() is None:
+    threading.Thread(target=warm_up, name='bookeditor-warmup', daemon=True).start()
 
 
 if __name__ == '__main__':
-    import os
-
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('DEBUG', 'False').lower() == 'true'
 
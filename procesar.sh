@@ -32,7 +32,9 @@ if [ "$tipo" = "3" ]; then
     echo "   • El libro está sobre una mesa/superficie"
     echo "   • Necesitas recortar el fondo"
     echo ""
-    read -p "¿Cuál es tu caso? [1-2]: " tipo
+    echo "   ¿Sigues sin saberlo? Elige 'a' y la herramienta lo decidirá"
+    echo ""
+    read -p "¿Cuál es tu caso? [1-2, a = automático]: " tipo
 fi
 
 echo ""
@@ -57,7 +59,7 @@ color=${color:-white}
 if [ "$tipo" = "1" ]; then
     echo ""
     echo "🚀 Procesando portada DIGITAL (sin detección)..."
-    python3 book_cover_simple.py "$input_path" "$output_path" --color "$color"
+    python3 book_cover.py client digital "$input_path" "$output_path" --color "$color"
 
 elif [ "$tipo" = "2" ]; then
     echo ""
@@ -66,10 +68,14 @@ elif [ "$tipo" = "2" ]; then
     read -p "¿Activar modo debug? (ver contornos detectados) [s/N]: " debug
 
     if [[ "$debug" =~ ^[Ss]$ ]]; then
-        python3 book_cover_cli_v2.py "$input_path" "$output_path" --color "$color" --debug
+        python3 book_cover.py client detect "$input_path" "$output_path" --color "$color" --debug
     else
-        python3 book_cover_cli_v2.py "$input_path" "$output_path" --color "$color"
+        python3 book_cover.py client detect "$input_path" "$output_path" --color "$color"
     fi
+elif [ "$tipo" = "a" ]; then
+    echo ""
+    echo "🧭 Clasificando la imagen (digital o foto)..."
+    python3 book_cover.py client auto "$input_path" "$output_path" --color "$color"
 else
     echo "❌ Opción no válida"
     exit 1
@@ -48,7 +48,7 @@ case $opcion in
         ;;
     2)
         echo ""
-        python3 book_cover_cli.py --help
+        python3 book_cover.py --help
         ;;
     3)
         echo ""
@@ -0,0 +1,23 @@
+"""
+Tests de BookEditor: python -m pytest -q (desde la raíz del proyecto)
+
+Los módulos book_cover_*.py viven en la raíz, sin paquete: se añade al path.
+"""
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# La web, importada en los tests: sin calentamiento, sin pool de procesos y
+# con la caché en un directorio temporal
+os.environ.setdefault('BOOKEDITOR_WARMUP', '0')
+os.environ.setdefault('BOOKEDITOR_POOL_WORKERS', '0')
+if 'BOOKEDITOR_CACHE_DIR' not in os.environ:
+    os.environ['BOOKEDITOR_CACHE_DIR'] = tempfile.mkdtemp(prefix='bookeditor-tests-')
+    atexit.register(shutil.rmtree, os.environ['BOOKEDITOR_CACHE_DIR'], True)
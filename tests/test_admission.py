@@ -0,0 +1,101 @@
+"""Control de admisión con cola acotada (book_cover_admission)"""
+
+import threading
+import time
+
+import pytest
+
+from book_cover_admission import AdmissionController, Overloaded
+
+
+def _hold(admission, started, release):
+    def run():
+        admission.run(lambda: (started.set(), release.wait(5)))
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert started.wait(5)
+    return thread
+
+
+def test_full_queue_rejects_immediately():
+    admission = AdmissionController(max_concurrent=1, max_queue=0, max_wait=5)
+    release = threading.Event()
+    holder = _hold(admission, threading.Event(), release)
+
+    start = time.monotonic()
+    with pytest.raises(Overloaded) as info:
+        admission.acquire()
+    assert time.monotonic() - start < 1
+    assert info.value.retry_after >= 1
+
+    release.set()
+    holder.join(5)
+    stats = admission.stats()
+    assert (stats['active'], stats['admitted'], stats['rejected']) == (0, 1, 1)
+
+
+def test_wait_times_out():
+    admission = AdmissionController(max_concurrent=1, max_queue=2, max_wait=0.2)
+    release = threading.Event()
+    holder = _hold(admission, threading.Event(), release)
+
+    start = time.monotonic()
+    with pytest.raises(Overloaded):
+        admission.acquire()
+    assert 0.15 < time.monotonic() - start < 2
+    assert admission.stats()['queued'] == 0
+
+    release.set()
+    holder.join(5)
+
+
+def test_waiter_gets_slot_when_released():
+    admission = AdmissionController(max_concurrent=1, max_queue=1, max_wait=5)
+    release = threading.Event()
+    holder = _hold(admission, threading.Event(), release)
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(admission.run(lambda: 'hecho')))
+    waiter.start()
+    while admission.stats()['queued'] < 1:
+        time.sleep(0.01)
+
+    release.set()
+    holder.join(5)
+    waiter.join(5)
+    assert results == ['hecho']
+    assert admission.stats()['admitted'] == 2
+
+
+def test_exception_releases_slot():
+    admission = AdmissionController(max_concurrent=1, max_queue=0)
+    with pytest.raises(RuntimeError):
+        admission.run(lambda: (_ for _ in ()).throw(RuntimeError('falla')))
+    assert admission.run(lambda: 'ok') == 'ok'
+    assert admission.stats()['active'] == 0
+
+
+def test_slots_are_handed_out_in_arrival_order():
+    admission = AdmissionController(max_concurrent=1, max_queue=3, max_wait=5)
+    release = threading.Event()
+    holder = _hold(admission, threading.Event(), release)
+    order = []
+
+    def request(name):
+        admission.run(lambda: order.append(name))
+
+    waiters = []
+    for name in ('primero', 'segundo'):
+        waiters.append(threading.Thread(target=request, args=(name,)))
+        waiters[-1].start()
+        while admission.stats()['queued'] < len(waiters):
+            time.sleep(0.01)
+
+    release.set()
+    holder.join(5)
+    # Una llegada nueva justo al liberarse el hueco no adelanta a la cola
+    request('recién llegado')
+    for waiter in waiters:
+        waiter.join(5)
+    assert order == ['primero', 'segundo', 'recién llegado']
+    stats = admission.stats()
+    assert (stats['active'], stats['queued'], stats['admitted']) == (0, 0, 4)
@@ -0,0 +1,96 @@
+"""Caché de resultados en disco (book_cover_cache)"""
+
+import os
+import time
+
+import book_cover_cache
+from book_cover_cache import ResultCache, ResultStore
+
+
+def _age(path, seconds):
+    stamp = time.time() - seconds
+    os.utime(path, (stamp, stamp))
+
+
+def test_roundtrip_and_miss(tmp_path):
+    cache = ResultCache(tmp_path, 1 << 20)
+    assert cache.get('ab' * 32) is None
+    cache.put('ab' * 32, {'png': b'\x89PNG', 'thumb': b''}, {'detected': True})
+    assert cache.get('ab' * 32) == ({'png': b'\x89PNG', 'thumb': b''}, {'detected': True})
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = ResultCache(tmp_path, 1 << 20)
+    cache.put('cd' * 32, {'data': b'x'})
+    cache._path('cd' * 32).write_bytes(b'basura')
+    assert cache.get('cd' * 32) is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(tmp_path, 10_000)
+    keys = [f'{i:02x}' * 32 for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, {'data': b'x' * 3000})
+        _age(cache._path(key), 100 - i)
+    cache.get(keys[0])  # el más antiguo pasa a ser el más reciente
+
+    cache.put('ff' * 32, {'data': b'x' * 3000})
+    assert cache.contains(keys[0])
+    assert not cache.contains(keys[1])
+    assert cache.stats()['evicted'] >= 1
+
+
+def test_other_versions_survive_but_count_and_go_first(tmp_path, monkeypatch):
+    monkeypatch.setattr(book_cover_cache, '_version', 'antigua00000')
+    old = ResultCache(tmp_path, 10_000)
+    old.put('aa' * 32, {'data': b'x' * 4000})
+    old.put('bb' * 32, {'data': b'x' * 4000})
+    _age(old._path('aa' * 32), 60)
+    _age(old._path('bb' * 32), (book_cover_cache.STALE_VERSION_DAYS + 1) * 86400)
+
+    monkeypatch.setattr(book_cover_cache, '_version', 'nueva0000000')
+    new = ResultCache(tmp_path, 10_000)
+    # La entrada reciente de la otra versión sigue (otro proceso puede usarla);
+    # la que lleva más de STALE_VERSION_DAYS sin uso se borra al arrancar
+    assert old.contains('aa' * 32)
+    assert not old._path('bb' * 32).exists()
+
+    new.put('cc' * 32, {'data': b'x' * 7000})
+    assert new.contains('cc' * 32)
+    assert not old._path('aa' * 32).exists()
+
+
+def test_put_recreates_removed_directory(tmp_path):
+    cache = ResultCache(tmp_path, 1 << 20)
+    cache.put('ee' * 32, {'data': b'1'})
+    cache._path('ee' * 32).unlink()
+    os.rmdir(cache._path('ee' * 32).parent)
+    cache.put('ee' * 32, {'data': b'2'})
+    assert cache.get('ee' * 32)[0] == {'data': b'2'}
+
+
+def test_result_store_is_content_addressed(tmp_path):
+    store = ResultStore(tmp_path, 1 << 20)
+    digest = store.publish(b'png', 'png', 'image/png', 'portada.png')
+    assert store.publish(b'png', 'png', 'image/png', 'otra.png') == digest
+    data, meta = store.get(digest)
+    assert data == b'png' and meta['download_name'] == 'portada.png'
+    assert store.get('0' * 64) is None
+
+
+def test_budget_is_split_across_stores(tmp_path, monkeypatch):
+    monkeypatch.setenv('BOOKEDITOR_CACHE_DIR', str(tmp_path))
+    monkeypatch.setenv('BOOKEDITOR_CACHE_MAX_MB', '512')
+    budget = book_cover_cache.cache_budget()
+    assert sum(budget.values()) == 512 * 1024 * 1024
+    assert budget['debug'] == book_cover_cache.DEBUG_MAX_MB * 1024 * 1024
+
+    stores = (book_cover_cache.default_cache(), book_cover_cache.default_result_store(),
+              book_cover_cache.default_debug_store())
+    assert sum(store.stats()['max_mb'] for store in stores) == 512
+
+    monkeypatch.setenv('BOOKEDITOR_CACHE_MAX_MB', '0')
+    assert book_cover_cache.cache_budget() is None
+    assert book_cover_cache.default_debug_store() is None
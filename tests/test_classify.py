@@ -0,0 +1,35 @@
+"""Pre-clasificador digital / foto (book_cover_classify)"""
+
+import cv2
+import numpy as np
+
+from book_cover_classify import classify_cover
+
+
+def _png(img):
+    return cv2.imencode('.png', img)[1].tobytes()
+
+
+def test_small_png_photo_is_not_digital_on_format_and_size_alone():
+    # Foto exportada a PNG pequeño, sin EXIF: mesa con degradado y grano
+    rng = np.random.default_rng(0)
+    h, w = 600, 700
+    y, x = np.mgrid[0:h, 0:w]
+    img = np.dstack([120 + 40 * x / w, 110 + 30 * y / h, 100 + 0 * x]).astype(np.float32)
+    img += rng.normal(0, 2, img.shape)
+    img[150:450, 250:450] += 25
+    img = np.clip(img, 0, 255).astype(np.uint8)
+
+    result = classify_cover(img, _png(img))
+    assert result['score'] <= -2.0
+    assert result['kind'] == 'unknown'
+
+
+def test_small_png_with_solid_margin_is_digital():
+    rng = np.random.default_rng(1)
+    img = np.full((600, 700, 3), 255, np.uint8)
+    img[60:540, 100:600] = rng.integers(0, 255, (480, 500, 3))
+
+    result = classify_cover(img, _png(img))
+    assert result['kind'] == 'digital'
+    assert 'margen de color sólido' in result['signals']
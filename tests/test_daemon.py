@@ -0,0 +1,77 @@
+"""Daemon de workers precargados (book_cover_daemon): socket, plazos y cliente"""
+
+import multiprocessing
+import os
+import socket
+import stat
+import threading
+
+import pytest
+
+import book_cover_daemon
+from book_cover_daemon import CoverDaemonServer, submit
+
+
+def _hang_on_request(argv, cwd):
+    if argv[1:] == ['hang']:
+        threading.Event().wait()
+    return 0, 'ok\n'
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    # Con fork los workers heredan el _run_job sustituido
+    if multiprocessing.get_start_method() != 'fork':
+        pytest.skip('el pool del daemon no hereda el parche sin fork')
+    monkeypatch.setattr(book_cover_daemon, '_run_job', _hang_on_request)
+    monkeypatch.setattr(book_cover_daemon, '_warm_worker', lambda: None)
+    monkeypatch.setattr(book_cover_daemon, 'REPLY_GRACE', 2.0)
+    server = CoverDaemonServer(str(tmp_path / 'daemon.sock'), 1, job_timeout=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    server.pool.terminate()
+
+
+def test_socket_is_private_from_bind(daemon):
+    assert stat.S_IMODE(os.stat(daemon.server_address).st_mode) == 0o600
+
+
+def test_hung_worker_is_killed_and_replaced(daemon):
+    code, output = submit(['detect', 'hang'], daemon.server_address, timeout=30)
+    assert code == 1 and 'no terminó' in output
+    # El pool sustituye al worker muerto y el siguiente trabajo responde
+    assert submit(['detect', 'ok'], daemon.server_address, timeout=30) == (0, 'ok\n')
+
+
+def test_submit_without_daemon_falls_back(tmp_path):
+    assert submit(['detect'], str(tmp_path / 'nadie.sock')) is None
+
+
+def test_submit_times_out_on_silent_daemon(tmp_path):
+    path = str(tmp_path / 'mudo.sock')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+        listener.bind(path)
+        listener.listen(1)
+        code, output = submit(['detect'], path, timeout=0.2)
+    assert code == 1 and 'no respondió' in output
+
+
+def test_submit_reports_reset_connection(tmp_path):
+    path = str(tmp_path / 'corta.sock')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+        listener.bind(path)
+        listener.listen(1)
+
+        def accept_and_close():
+            conn, _ = listener.accept()
+            conn.recv(4096)
+            conn.close()
+
+        thread = threading.Thread(target=accept_and_close)
+        thread.start()
+        code, output = submit(['detect'], path, timeout=5)
+        thread.join()
+    assert code == 1 and 'sin responder' in output
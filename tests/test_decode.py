@@ -0,0 +1,56 @@
+"""Presupuesto de píxeles al decodificar (book_cover_decode)"""
+
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from book_cover_decode import (ImageTooLarge, check_pixel_budget, decode_image, header_size,
+                               reduction_factor)
+
+
+def _jpeg_header(width, height):
+    """Solo SOI + APP0 + SOF0: suficiente para leer el tamaño sin decodificar"""
+    app0 = b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\x00' + b'\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+    sof0 = b'\xff\xc0' + struct.pack('>HBHHB', 17, 8, height, width, 3) + b'\x00' * 9
+    return b'\xff\xd8' + app0 + sof0
+
+
+def _png_header(width, height):
+    return b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + struct.pack('>II', width, height)
+
+
+def test_header_size_without_decoding():
+    assert header_size(_jpeg_header(8000, 6000)) == (8000, 6000)
+    assert header_size(_png_header(300, 200)) == (300, 200)
+    assert header_size(b'no es una imagen') is None
+
+
+def test_reduction_factor():
+    assert reduction_factor((4000, 3000), 'jpeg', 50) == 1
+    assert reduction_factor((8000, 8000), 'jpeg', 50) == 2
+    assert reduction_factor((20000, 20000), 'jpeg', 50) == 4
+    assert reduction_factor((8000, 8000), 'jpeg', 0) == 1  # 0 = sin límite
+    with pytest.raises(ImageTooLarge):
+        reduction_factor((8000, 8000), 'png', 50)  # solo JPEG se reduce al decodificar
+    with pytest.raises(ImageTooLarge):
+        reduction_factor((60000, 60000), 'jpeg', 50)
+
+
+def test_check_pixel_budget_rejects_png_bomb_from_header():
+    with pytest.raises(ImageTooLarge):
+        check_pixel_budget(_png_header(30000, 30000), 50)
+    assert check_pixel_budget(b'desconocido', 50) == 1
+
+
+def test_decode_image_reduces_large_jpeg():
+    img = np.random.default_rng(0).integers(0, 256, (400, 600, 3), dtype=np.uint8)
+    ok, jpeg = cv2.imencode('.jpg', img)
+    assert ok
+    decoded, factor = decode_image(jpeg.tobytes(), max_megapixels=0.1)
+    assert factor == 2
+    assert decoded.shape[:2] == (200, 300)
+
+    with pytest.raises(ValueError):
+        decode_image(b'\xff\xd8\xff' + b'\x00' * 20)
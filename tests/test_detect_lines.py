@@ -0,0 +1,50 @@
+"""Estrategia de rescate por segmentos (book_cover_detect._line_quads)"""
+
+import cv2
+import numpy as np
+import pytest
+
+from book_cover_detect import ContourSet, _line_quads, prepare_image
+
+
+ANGLES = (-2.0, -1.0, -0.5, 0.0, 0.5, 1.0, 2.0)
+
+
+def _cover(angle, seed, edge=None):
+    """Portada lisa sobre fondo con ruido; con `edge`, un 20% queda fuera del encuadre por ese lado"""
+    rng = np.random.default_rng(seed)
+    height, width = 768, 1024
+    cover_w, cover_h = 448, 576
+    img = np.clip(rng.normal(175, 8, (height, width, 3)), 0, 255).astype(np.uint8)
+    out_x = (width + cover_w) / 2 - 0.8 * cover_w
+    out_y = (height + cover_h) / 2 - 0.8 * cover_h
+    dx, dy = {None: (0, 0), 'top': (0, -out_y), 'bottom': (0, out_y),
+              'left': (-out_x, 0), 'right': (out_x, 0)}[edge]
+    box = cv2.boxPoints(((width / 2 + dx, height / 2 + dy), (cover_w, cover_h), angle)).astype(np.int32)
+    cv2.fillPoly(img, [box], (60, 40, 120))
+    img = np.clip(img + rng.normal(0, 6, img.shape), 0, 255).astype(np.uint8)
+    mask = np.zeros((height, width), np.uint8)
+    cv2.fillPoly(mask, [box], 255)
+    return img, mask
+
+
+def _best_iou(img, mask):
+    quads = _line_quads(ContourSet(prepare_image(img)))
+    if not quads:
+        return 0.0
+    found = np.zeros_like(mask)
+    cv2.fillPoly(found, [quads[0].reshape(-1, 2)], 255)
+    return np.count_nonzero(found & mask) / np.count_nonzero(found | mask)
+
+
+@pytest.mark.parametrize('edge', ['top', 'bottom', 'left', 'right'])
+def test_cover_cut_by_frame(edge):
+    # HoughLinesP deja los lados decenas de píxeles antes del marco: el borde
+    # del encuadre tiene que cerrar la portada igualmente, por cualquier lado
+    ious = {angle: _best_iou(*_cover(angle, seed, edge)) for seed, angle in enumerate(ANGLES)}
+    assert all(iou > 0.9 for iou in ious.values()), ious
+
+
+def test_cover_inside_frame_is_not_closed_by_frame():
+    ious = {angle: _best_iou(*_cover(angle, seed)) for seed, angle in enumerate(ANGLES)}
+    assert all(iou > 0.9 for iou in ious.values()), ious
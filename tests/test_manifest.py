@@ -0,0 +1,32 @@
+"""Checkpoint del procesado por manifiesto (book_cover_manifest)"""
+
+from book_cover_manifest import Checkpoint, row_key
+
+
+ROW = {'input': 'fotos/a.jpg', 'output': 'salida/a.png', 'mode': 'detect', 'color': 'white',
+       'size': (1920, 1080), 'min_area': 0.1}
+
+
+def test_row_key_changes_with_parameters():
+    assert row_key(ROW) == row_key(dict(ROW, color='WHITE'))
+    assert row_key(ROW) != row_key(dict(ROW, size=(1080, 1080)))
+    assert row_key(ROW) != row_key(dict(ROW, output='salida/b.png'))
+
+
+def test_checkpoint_survives_reopen(tmp_path):
+    path = tmp_path / 'manifest.checkpoint.sqlite'
+    checkpoint = Checkpoint(path)
+    checkpoint.record('k1', 2, ROW, 'done', 1)
+    checkpoint.record('k2', 3, ROW, 'failed', 3, error='sin portada')
+    checkpoint.close()
+
+    checkpoint = Checkpoint(path)
+    assert checkpoint.done_keys() == {'k1'}
+    checkpoint.record('k2', 3, ROW, 'done', 4)  # reintento con éxito
+    checkpoint.close()
+
+    checkpoint = Checkpoint(path)
+    assert checkpoint.done_keys() == {'k1', 'k2'}
+    attempts, error = checkpoint.db.execute("SELECT attempts, error FROM rows WHERE key = 'k2'").fetchone()
+    assert (attempts, error) == (4, None)
+    checkpoint.close()
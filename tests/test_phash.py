@@ -0,0 +1,81 @@
+"""Agrupado de pHash e índice SQLite (book_cover_phash)"""
+
+import random
+
+import numpy as np
+
+from book_cover_phash import (CHUNKS, HASH_BITS, PHashIndex, _popcount, group_hashes, hamming,
+                              hash_chunks)
+
+
+def _flip(value, bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def _brute_force(hashes, threshold):
+    parent = list(range(len(hashes)))
+
+    def find(i):
+        while parent[i] != i:
+            i = parent[i]
+        return i
+
+    for i in range(len(hashes)):
+        for j in range(i + 1, len(hashes)):
+            if hamming(hashes[i], hashes[j]) <= threshold:
+                parent[find(j)] = find(i)
+    groups = {}
+    for i in range(len(hashes)):
+        groups.setdefault(find(i), []).append(i)
+    return sorted(sorted(group) for group in groups.values() if len(group) > 1)
+
+
+def test_popcount_matches_python():
+    rng = random.Random(0)
+    values = [rng.getrandbits(HASH_BITS) for _ in range(1000)] + [0, (1 << HASH_BITS) - 1]
+    counts = _popcount(np.array(values, dtype=np.uint64))
+    assert counts.tolist() == [bin(v).count('1') for v in values]
+
+
+def test_hash_chunks_cover_the_hash():
+    value = 0x0123456789ABCDEF
+    chunks = hash_chunks(value)
+    assert len(chunks) == CHUNKS
+    assert int(''.join(f'{c:02x}' for c in chunks), 16) == value
+
+
+def test_group_threshold_boundary_and_duplicates():
+    base = 0xF0F0F0F0F0F0F0F0
+    hashes = [base, _flip(base, range(6)), _flip(base, range(40, 47)), base]
+    assert group_hashes(hashes, threshold=6) == [[0, 1, 3]]
+    assert group_hashes(hashes, threshold=7) == [[0, 1, 2, 3]]
+
+
+def test_group_is_transitive():
+    base = 0
+    chain = [base, _flip(base, range(0, 5)), _flip(base, range(0, 10))]
+    assert hamming(chain[0], chain[2]) > 6
+    assert group_hashes(chain, threshold=6) == [[0, 1, 2]]
+
+
+def test_group_matches_brute_force():
+    rng = random.Random(1)
+    seeds = [rng.getrandbits(HASH_BITS) for _ in range(30)]
+    hashes = [_flip(rng.choice(seeds), rng.sample(range(HASH_BITS), rng.randint(0, 8))) for _ in range(300)]
+    for threshold in (3, 6, CHUNKS):
+        assert sorted(sorted(g) for g in group_hashes(hashes, threshold)) == _brute_force(hashes, threshold)
+
+
+def test_index_lookup_and_signed_roundtrip(tmp_path):
+    index = PHashIndex(tmp_path / 'phash.sqlite')
+    high = (1 << 63) | 0x1234  # no cabe en un entero con signo de SQLite
+    index.add_hashes([('/fotos/a.jpg', 10, 1.0, high), ('/fotos/b.jpg', 10, 1.0, _flip(high, range(20)))])
+
+    assert index.known_hashes()['/fotos/a.jpg'] == (10, 1.0, high)
+    near = _flip(high, (1, 2, 3))
+    assert [(m['path'], m['distance']) for m in index.lookup(near)] == [('/fotos/a.jpg', 3)]
+    assert index.lookup(near, threshold=2) == []
+    assert index.stats()['images'] == 2
+    index.close()
@@ -0,0 +1,45 @@
+"""Pool de workers del pipeline (book_cover_pool), con procesos reales"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from book_cover_pipeline import warmup_image
+from book_cover_pool import CoverPool, WorkerTimeout
+
+
+@pytest.fixture
+def pool():
+    pool = CoverPool(1, timeout=60)
+    yield pool
+    pool.close()
+
+
+def test_worker_survives_a_job_that_fails_before_reaching_it(pool):
+    data = warmup_image()
+    # Un parámetro que no se puede enviar por la tubería falla en conn.send()
+    with pytest.raises(Exception):
+        pool.render(data, color=lambda: None)
+    results, info = pool.render(data, renditions=('thumb',))
+    assert results['thumb']['data'] and info['method']
+    assert pool._idle.qsize() == 1
+
+
+def test_no_idle_worker_times_out(pool):
+    taken = pool._checkout(5)
+    try:
+        pool.timeout = 0.2
+        with pytest.raises(WorkerTimeout):
+            pool.render(warmup_image())
+    finally:
+        pool._idle.put(taken)
+
+
+def test_worker_module_has_no_web_side_effects():
+    # Los workers solo importan book_cover_pipeline: ni Flask ni las cachés de la web
+    code = "import sys, book_cover_pipeline; print(','.join(m for m in ('flask', 'book_cover_web') if m in sys.modules))"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result.stdout.strip() == ''
@@ -0,0 +1,121 @@
+"""Coalescencia de peticiones idénticas (book_cover_singleflight)"""
+
+import os
+import threading
+import time
+
+import pytest
+
+from book_cover_singleflight import SingleFlight, private_dir, request_key
+
+
+def _encode(result):
+    return {'data': result['data']}, {'name': result['name']}
+
+
+def _decode(blobs, meta):
+    return {'data': blobs['data'], 'name': meta['name']}
+
+
+def test_request_key_depends_on_data_and_params():
+    key = request_key(b'foto', 'white', 0.1)
+    assert key == request_key(b'foto', 'white', 0.1)
+    assert key != request_key(b'foto', 'black', 0.1)
+    assert key != request_key(b'otra', 'white', 0.1)
+    # Los separadores evitan colisiones al concatenar parámetros
+    assert request_key(b'x', 'ab', 'c') != request_key(b'x', 'a', 'bc')
+
+
+def test_concurrent_calls_run_once():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'resultado'
+
+    def request():
+        results.append(flight.do('clave', work))
+
+    threads = [threading.Thread(target=request) for _ in range(5)]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while flight.stats()['coalesced'] < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert all(result == 'resultado' for result, _ in results)
+    assert flight.stats() == {'in_flight': 0, 'executed': 1, 'coalesced': 4, 'cross_process': False}
+
+
+def test_error_reaches_waiters_and_next_call_retries():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise ValueError('falla')
+
+    def request():
+        try:
+            flight.do('clave', failing)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=request)
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=request)
+    follower.start()
+    while flight.stats()['coalesced'] < 1:
+        time.sleep(0.01)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert len(errors) == 2
+    assert flight.do('clave', lambda: 'ok') == ('ok', False)
+
+
+def test_cross_process_result_is_shared_without_pickle(tmp_path):
+    lock_dir = tmp_path / 'locks'
+    first = SingleFlight(lock_dir, _encode, _decode)
+    second = SingleFlight(lock_dir, _encode, _decode)  # otro proceso con el mismo directorio
+    assert first.stats()['cross_process']
+
+    result = {'data': b'\x89PNG...', 'name': 'portada.png'}
+    assert first.do('clave', lambda: result) == (result, False)
+    assert second.do('clave', lambda: pytest.fail('no debe recalcularse')) == (result, True)
+
+    names = sorted(path.name for path in lock_dir.iterdir())
+    assert 'clave.0.bin' in names and 'clave.result' in names
+    assert not any(name.endswith('.pickle') for name in names)
+
+
+def test_cross_process_disabled_on_shared_directory(tmp_path):
+    lock_dir = tmp_path / 'compartido'
+    lock_dir.mkdir()
+    os.chmod(lock_dir, 0o777)
+    assert not private_dir(lock_dir)
+
+    flight = SingleFlight(lock_dir, _encode, _decode)
+    assert not flight.stats()['cross_process']
+    assert flight.do('clave', lambda: 1) == (1, False)
+    assert list(lock_dir.iterdir()) == []
+
+
+def test_private_dir_creates_0700(tmp_path):
+    path = tmp_path / 'nuevo'
+    assert private_dir(path)
+    assert os.stat(path).st_mode & 0o777 == 0o700
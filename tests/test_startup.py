@@ -0,0 +1,16 @@
+"""Presupuesto de arranque de la CLI unificada (mismo criterio que `book_cover.py bench`)"""
+
+import statistics
+import sys
+
+from book_cover_bench import CLI_PATH, STARTUP_LIMIT_MS, heavy_modules_loaded, time_command
+
+
+def test_cli_does_not_import_heavy_modules():
+    assert heavy_modules_loaded() == []
+
+
+def test_help_within_startup_budget():
+    time_command([sys.executable, str(CLI_PATH), '--help'], 1)  # calienta la caché de disco
+    help_ms = statistics.median(time_command([sys.executable, str(CLI_PATH), '--help'], 5))
+    assert help_ms <= STARTUP_LIMIT_MS, f"--help tarda {help_ms:.0f} ms (límite {STARTUP_LIMIT_MS:.0f} ms)"
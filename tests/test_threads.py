@@ -0,0 +1,34 @@
+"""Reparto de hilos de OpenCV/BLAS (book_cover_threads)"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import book_cover_threads
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_blas_limit_not_reported_when_numpy_was_loaded_first(monkeypatch):
+    pytest.importorskip('numpy')
+    monkeypatch.setitem(sys.modules, 'threadpoolctl', None)
+    # configure() escribe las variables: que no se queden para otros tests
+    monkeypatch.setattr(os, 'environ', {k: v for k, v in os.environ.items()
+                                        if k not in book_cover_threads.THREAD_ENV_VARS})
+    config = book_cover_threads.configure(2, log=False)
+    assert config['process']['blas'] == 'no aplicado'
+
+
+def test_env_applies_to_libraries_loaded_afterwards():
+    code = ('import json, sys, book_cover_threads as t; '
+            'c = t.configure(1, log=False); '
+            'print(json.dumps([c["process"], "numpy" in sys.modules, "cv2" in sys.modules]))')
+    env = {k: v for k, v in os.environ.items() if k not in book_cover_threads.THREAD_ENV_VARS}
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    process, numpy_loaded, cv2_loaded = json.loads(out)
+    assert not numpy_loaded and not cv2_loaded
+    assert process == {'opencv': 'entorno', 'blas': 'entorno'}
@@ -0,0 +1,52 @@
+"""Rutas de la web con el cliente de pruebas de Flask (sin pool de procesos)"""
+
+import io
+
+import pytest
+
+import book_cover_web as web
+from book_cover_admission import AdmissionController
+from book_cover_pipeline import warmup_image
+
+
+@pytest.fixture
+def client():
+    return web.app.test_client()
+
+
+def _post(client, data, **form):
+    form['file'] = (io.BytesIO(data), 'portada.jpg')
+    return client.post('/process', data=form, content_type='multipart/form-data')
+
+
+def test_cache_hit_does_not_wait_for_admission(client, monkeypatch):
+    data = warmup_image()
+    first = _post(client, data, color='#2196F3')
+    assert first.status_code == 303  # redirige al resultado en /results/<sha256>
+    assert first.headers['X-Cache'] == 'MISS'
+
+    # Sin huecos ni cola: lo que necesite el pipeline se rechaza, un acierto no
+    admission = AdmissionController(max_concurrent=1, max_queue=0)
+    monkeypatch.setattr(web, 'admission', admission)
+    admission.acquire()
+
+    hit = _post(client, data, color='#2196F3')
+    assert hit.status_code == 303
+    assert hit.headers['X-Cache'] == 'HIT'
+    assert hit.headers['Location'] == first.headers['Location']
+
+    miss = _post(client, data, color='#FF5722')
+    assert miss.status_code == 503
+    assert 'Retry-After' in miss.headers
+    assert admission.stats()['admitted'] == 1
+
+
+def test_debug_overlay_reports_encode_failure(client, monkeypatch):
+    response = _post(client, warmup_image(), color='#4CAF50', debug='1')
+    overlay = response.headers['X-Debug-Report'] + '.jpg'
+    assert client.get(overlay).mimetype == 'image/jpeg'
+
+    monkeypatch.setattr(web.cv2, 'imencode', lambda *args, **kwargs: (False, None))
+    failed = client.get(overlay)
+    assert failed.status_code == 500
+    assert 'error' in failed.get_json()